@@ -4,31 +4,67 @@ Class for plotting a quadrotor
 Author: Daniel Ingram (daniel-s-ingram)
 """
 
+import time
 from math import cos, sin
 import numpy as np
 import matplotlib.pyplot as plt
+from mpl_toolkits.mplot3d.art3d import Poly3DCollection
+from collision import box_faces
+from const import DEFAULT_FPS
+
+# most poses kept in the history ring buffer, and the most recent ones drawn as the tail
+DEFAULT_HISTORY = 100000
+DEFAULT_TAIL = 1000
 
 class Quadrotor():
-    def __init__(self, x=0, y=0, z=0, roll=0, pitch=0, yaw=0, size=0.25, show_animation=True, obstacles = []):
+    def __init__(self, x=0, y=0, z=0, roll=0, pitch=0, yaw=0, size=0.25, show_animation=True, obstacles = [],
+                 history=DEFAULT_HISTORY, tail=DEFAULT_TAIL, decimation=1, fps=DEFAULT_FPS):
+        """history is the capacity of the pose ring buffer, allocated once and overwritten from
+        the oldest pose once it is full, tail the number of recorded poses
+        drawn behind the quadrotor (None for all of them) and decimation records every n-th pose.
+        Poses arriving faster than fps frames per second are not drawn (None draws every pose)."""
         self.p1 = np.array([size / 2, 0, 0, 1]).T
         self.p2 = np.array([-size / 2, 0, 0, 1]).T
         self.p3 = np.array([0, size / 2, 0, 1]).T
         self.p4 = np.array([0, -size / 2, 0, 1]).T
 
         self.obstacles = obstacles
-        self.x_data = []
-        self.y_data = []
-        self.z_data = []
+        self.history = np.empty((history, 3))
+        self.tail = tail
+        self.decimation = decimation
+        # poses recorded so far, and update_pose calls so far
+        self.recorded = 0
+        self.updates = 0
         self.show_animation = show_animation
 
+        self.fps = fps
+        self.last_frame = -np.inf
+        self.background = None
+
         if self.show_animation:
             plt.ion()
             fig = plt.figure()
+            self.fig = fig
             # for stopping simulation with the esc key.
             fig.canvas.mpl_connect('key_release_event',
                     lambda event: [exit(0) if event.key == 'escape' else None])
 
             self.ax = fig.add_subplot(111, projection='3d')
+            self.ax.set_xlim(0, 10)
+            self.ax.set_ylim(0, 10)
+            self.ax.set_zlim(0, 10)
+            # the obstacles never move, they are drawn into the background once
+            if len(obstacles):
+                self.ax.add_collection3d(Poly3DCollection(box_faces(obstacles), facecolor='r', edgecolor='r', alpha=0.2))
+            # the moving artists are only drawn by plot, on top of the saved background
+            self.rotors, = self.ax.plot([], [], [], 'k.', animated=True)
+            self.arm1, = self.ax.plot([], [], [], 'r-', animated=True)
+            self.arm2, = self.ax.plot([], [], [], 'r-', animated=True)
+            self.trail, = self.ax.plot([], [], [], 'b:', animated=True)
+            self.artists = (self.rotors, self.arm1, self.arm2, self.trail)
+            # full redraws (first show, resize, rotating the view) save a new background
+            fig.canvas.mpl_connect('draw_event', self.on_draw)
+            fig.canvas.draw()
 
         self.update_pose(x, y, z, roll, pitch, yaw)
 
@@ -39,13 +75,46 @@ class Quadrotor():
         self.roll = roll
         self.pitch = pitch
         self.yaw = yaw
-        self.x_data.append(x)
-        self.y_data.append(y)
-        self.z_data.append(z)
+        if self.updates % self.decimation == 0:
+            self.history[self.recorded % len(self.history)] = x, y, z
+            self.recorded += 1
+        self.updates += 1
 
-        if self.show_animation:
+        # skip the frame if the last one was drawn less than 1 / fps seconds ago
+        if self.show_animation and (self.fps is None or time.perf_counter() - self.last_frame >= 1 / self.fps):
             self.plot()
 
+    def on_draw(self, event):
+        canvas = self.fig.canvas
+        self.background = canvas.copy_from_bbox(self.fig.bbox) if canvas.supports_blit else None
+        for artist in self.artists:
+            self.ax.draw_artist(artist)
+
+    def path(self, length=None):
+        """The most recent recorded positions, oldest first, as an (n, 3) array
+
+        Args:
+            length (int): at most this many positions, all of the buffer by default
+        """
+        count = min(self.recorded, len(self.history))
+        if length is not None:
+            count = min(count, length)
+        return self.history[(self.recorded - count + np.arange(count)) % len(self.history)]
+
+    # The recorded coordinates used to be lists that could be appended to. They are read-only
+    # arrays now, record poses with update_pose and read them with path.
+    @property
+    def x_data(self):
+        return self.path()[:, 0]
+
+    @property
+    def y_data(self):
+        return self.path()[:, 1]
+
+    @property
+    def z_data(self):
+        return self.path()[:, 2]
+
     def transformation_matrix(self):
         x = self.x
         y = self.y
@@ -68,30 +137,27 @@ class Quadrotor():
         p3_t = np.matmul(T, self.p3)
         p4_t = np.matmul(T, self.p4)
 
-        plt.cla()
-
-        self.ax.plot([p1_t[0], p2_t[0], p3_t[0], p4_t[0]],
-                     [p1_t[1], p2_t[1], p3_t[1], p4_t[1]],
-                     [p1_t[2], p2_t[2], p3_t[2], p4_t[2]], 'k.')
-
-        self.ax.plot([p1_t[0], p2_t[0]], [p1_t[1], p2_t[1]],
-                     [p1_t[2], p2_t[2]], 'r-')
-        self.ax.plot([p3_t[0], p4_t[0]], [p3_t[1], p4_t[1]],
-                     [p3_t[2], p4_t[2]], 'r-')
-
-        self.ax.plot(self.x_data, self.y_data, self.z_data, 'b:')
-        
-        for obstacle in self.obstacles:
-            x_range = np.array([obstacle[0], obstacle[3]])
-            y_range = np.array([obstacle[1], obstacle[4]])
-            z_range = np.array([obstacle[2], obstacle[5]])
-           # self.rect_prism(x_range, y_range, z_range)
-
-        plt.xlim(0, 10)
-        plt.ylim(0, 10)
-        self.ax.set_zlim(0, 10)
+        self.rotors.set_data_3d([p1_t[0], p2_t[0], p3_t[0], p4_t[0]],
+                                [p1_t[1], p2_t[1], p3_t[1], p4_t[1]],
+                                [p1_t[2], p2_t[2], p3_t[2], p4_t[2]])
+        self.arm1.set_data_3d([p1_t[0], p2_t[0]], [p1_t[1], p2_t[1]], [p1_t[2], p2_t[2]])
+        self.arm2.set_data_3d([p3_t[0], p4_t[0]], [p3_t[1], p4_t[1]], [p3_t[2], p4_t[2]])
+
+        # only the tail is drawn, so a frame costs the same however long the flight
+        tail = self.path(self.tail)
+        self.trail.set_data_3d(tail[:, 0], tail[:, 1], tail[:, 2])
+
+        canvas = self.fig.canvas
+        if self.background is not None:
+            canvas.restore_region(self.background)
+            for artist in self.artists:
+                self.ax.draw_artist(artist)
+            canvas.blit(self.fig.bbox)
+        else:
+            canvas.draw_idle()
+        canvas.flush_events()
+        self.last_frame = time.perf_counter()
 
-        plt.pause(0.001)
     def rect_prism(self, x_range, y_range, z_range):
         xx, yy = np.meshgrid(x_range, y_range)
         print(xx, yy)
@@ -4,7 +4,14 @@ Generates a quintic polynomial trajectory.
 Author: Daniel Ingram (daniel-s-ingram)
 """
 
+from functools import lru_cache
+from collections import namedtuple
 import numpy as np
+from scipy.sparse import csc_matrix
+from scipy.sparse.linalg import splu
+
+# desired state along a trajectory, each (N, K, 3) for N segments at K times
+TrajectoryState = namedtuple('TrajectoryState', ['position', 'velocity', 'acceleration', 'jerk', 'snap'])
 
 class TrajectoryGenerator():
     def __init__(self, start_pos, des_pos, T, start_vel=[0,0,0], des_vel=[0,0,0], start_acc=[0,0,0], des_acc=[0,0,0]):
@@ -35,42 +42,182 @@ class TrajectoryGenerator():
         self.T = T
 
     def solve(self):
-        A = np.array(
-            [[0, 0, 0, 0, 0, 1],
-             [self.T**5, self.T**4, self.T**3, self.T**2, self.T, 1],
-             [0, 0, 0, 0, 1, 0],
-             [5*self.T**4, 4*self.T**3, 3*self.T**2, 2*self.T, 1, 0],
-             [0, 0, 0, 2, 0, 0],
-             [20*self.T**3, 12*self.T**2, 6*self.T, 2, 0, 0]
-            ])
-
-        b_x = np.array(
-            [[self.start_x],
-             [self.des_x],
-             [self.start_x_vel],
-             [self.des_x_vel],
-             [self.start_x_acc],
-             [self.des_x_acc]
-            ])
-
-        b_y = np.array(
-            [[self.start_y],
-             [self.des_y],
-             [self.start_y_vel],
-             [self.des_y_vel],
-             [self.start_y_acc],
-             [self.des_y_acc]
-            ])
-
-        b_z = np.array(
-            [[self.start_z],
-             [self.des_z],
-             [self.start_z_vel],
-             [self.des_z_vel],
-             [self.start_z_acc],
-             [self.des_z_acc]
-            ])
-
-        self.x_c = np.linalg.solve(A, b_x)
-        self.y_c = np.linalg.solve(A, b_y)
-        self.z_c = np.linalg.solve(A, b_z)
\ No newline at end of file
+        b = np.array(
+            [[self.start_x, self.start_y, self.start_z],
+             [self.des_x, self.des_y, self.des_z],
+             [self.start_x_vel, self.start_y_vel, self.start_z_vel],
+             [self.des_x_vel, self.des_y_vel, self.des_z_vel],
+             [self.start_x_acc, self.start_y_acc, self.start_z_acc],
+             [self.des_x_acc, self.des_y_acc, self.des_z_acc]
+            ], dtype=np.float64)
+
+        # one solve for the three axes with the factored constraint matrix
+        c = constraint_inverse(self.T) @ b
+        self.x_c = c[:, 0:1]
+        self.y_c = c[:, 1:2]
+        self.z_c = c[:, 2:3]
+
+
+def constraint_matrix(T):
+    """Boundary conditions of a quintic over [0, T]: position, velocity and acceleration at both ends"""
+    return np.array(
+        [[0, 0, 0, 0, 0, 1],
+         [T**5, T**4, T**3, T**2, T, 1],
+         [0, 0, 0, 0, 1, 0],
+         [5*T**4, 4*T**3, 3*T**2, 2*T, 1, 0],
+         [0, 0, 0, 2, 0, 0],
+         [20*T**3, 12*T**2, 6*T, 2, 0, 0]
+        ], dtype=np.float64)
+
+
+@lru_cache(maxsize=256)
+def constraint_inverse(T):
+    """Inverse of the constraint matrix, factored once per distinct segment duration"""
+    inverse = np.linalg.inv(constraint_matrix(T))
+    inverse.flags.writeable = False
+    return inverse
+
+
+def solve_segments(waypoints, T, velocities=None, accelerations=None):
+    """Quintic coefficients of every segment between consecutive waypoints at once
+
+    The boundary conditions of all segments and axes form one (6, 3N) right-hand side,
+    solved with one product per distinct duration.
+
+    Args:
+        waypoints: (N + 1, 3) positions
+        T: duration of every segment, a float or (N,) array
+        velocities: (N + 1, 3) velocities at the waypoints, zero by default
+        accelerations: (N + 1, 3) accelerations at the waypoints, zero by default
+
+    Returns:
+        Contiguous (N, 3, 6) array of coefficients, highest power first like x_c
+    """
+    waypoints = np.asarray(waypoints, dtype=np.float64).reshape(-1, 3)
+    n = len(waypoints) - 1
+    velocities = np.zeros_like(waypoints) if velocities is None else np.asarray(velocities, dtype=np.float64).reshape(-1, 3)
+    accelerations = np.zeros_like(waypoints) if accelerations is None else np.asarray(accelerations, dtype=np.float64).reshape(-1, 3)
+    durations = np.broadcast_to(np.asarray(T, dtype=np.float64), (n,))
+
+    # rows in the order of the constraint matrix, columns are (segment, axis)
+    b = np.stack([waypoints[:-1], waypoints[1:], velocities[:-1], velocities[1:],
+                  accelerations[:-1], accelerations[1:]]).reshape(6, 3 * n)
+    c = np.empty((6, 3 * n))
+    columns = np.repeat(durations, 3)
+    for duration in np.unique(durations):
+        group = columns == duration
+        c[:, group] = constraint_inverse(float(duration)) @ b[:, group]
+    return np.ascontiguousarray(c.reshape(6, n, 3).transpose(1, 2, 0))
+
+
+def derivative_rows(T, k):
+    """Coefficients multiplying each quintic coefficient in the k-th derivative at times T
+
+    Args:
+        T: (n,) times
+        k (int): order of the derivative
+
+    Returns:
+        (n, 6) array, highest power first
+    """
+    powers = np.arange(5, -1, -1)
+    factor = np.ones(6)
+    for i in range(k):
+        factor *= powers - i
+    exponents = np.maximum(powers - k, 0)
+    return factor * np.asarray(T, dtype=np.float64)[:, None] ** exponents
+
+
+def minimum_jerk(waypoints, T):
+    """Minimum jerk trajectory through all waypoints, without stopping at the interior ones
+
+    Quintic segments minimizing the integrated squared jerk are continuous up to the
+    fourth derivative at the interior waypoints. Together with the waypoint positions
+    and rest at both ends, this gives 6N equations for the 6N coefficients, solved as
+    one sparse system, so long paths stay cheap.
+
+    Args:
+        waypoints: (N + 1, 3) positions
+        T: duration of every segment, a float or (N,) array
+
+    Returns:
+        Contiguous (N, 3, 6) array of coefficients, highest power first like x_c
+    """
+    waypoints = np.asarray(waypoints, dtype=np.float64).reshape(-1, 3)
+    n = len(waypoints) - 1
+    durations = np.broadcast_to(np.asarray(T, dtype=np.float64), (n,))
+    segments = np.arange(n)
+    zero, end = derivative_rows(np.zeros(n), 0), derivative_rows(durations, 0)
+    rows, cols, values, rhs = [], [], [], []
+
+    def add(equations, segment, coefficients, b):
+        # one equation per entry of segment, on the 6 coefficients of that segment
+        rows.append(np.repeat(equations, 6))
+        cols.append((6 * segment[:, None] + np.arange(6)).ravel())
+        values.append(coefficients.ravel())
+        rhs.append((equations, b))
+
+    # positions at both ends of every segment
+    add(segments, segments, zero, waypoints[:-1])
+    add(n + segments, segments, end, waypoints[1:])
+    # derivatives 1 to 4 of consecutive segments agree at the interior waypoints
+    equation = 2 * n
+    interior = segments[:-1]
+    for k in range(1, 5):
+        equations = equation + interior
+        add(equations, interior, derivative_rows(durations[:-1], k), np.zeros((n - 1, 3)))
+        add(equations, interior + 1, -derivative_rows(np.zeros(n - 1), k), np.zeros((n - 1, 3)))
+        equation += n - 1
+    # rest to rest: no velocity or acceleration at the first and last waypoint
+    for k in (1, 2):
+        add(np.array([equation]), segments[:1], derivative_rows(np.zeros(1), k), np.zeros((1, 3)))
+        add(np.array([equation + 1]), segments[-1:], derivative_rows(durations[-1:], k), np.zeros((1, 3)))
+        equation += 2
+
+    A = csc_matrix((np.concatenate(values), (np.concatenate(rows), np.concatenate(cols))), shape=(6 * n, 6 * n))
+    b = np.zeros((6 * n, 3))
+    for equations, block in rhs:
+        b[equations] += block
+    c = splu(A).solve(b)
+    return np.ascontiguousarray(c.reshape(n, 6, 3).transpose(0, 2, 1))
+
+
+def stack_coefficients(x_coeffs, y_coeffs, z_coeffs):
+    """Stack per-axis coefficient lists from TrajectoryGenerator into an (N, 3, 6) array"""
+    return np.stack([np.asarray(x_coeffs, dtype=np.float64).reshape(-1, 6),
+                     np.asarray(y_coeffs, dtype=np.float64).reshape(-1, 6),
+                     np.asarray(z_coeffs, dtype=np.float64).reshape(-1, 6)], axis=1)
+
+
+def polyval(coeffs, t):
+    """Evaluate polynomials with highest-power-first coefficients (..., k) at times t (...) by Horner's scheme"""
+    result = coeffs[..., 0]
+    for k in range(1, coeffs.shape[-1]):
+        result = result * t + coeffs[..., k]
+    return result
+
+
+def derivative(coeffs):
+    """Coefficients of the derivative of highest-power-first polynomials (..., k)"""
+    powers = np.arange(coeffs.shape[-1] - 1, 0, -1)
+    return coeffs[..., :-1] * powers
+
+
+def evaluate(coeffs, t):
+    """Position and its first four derivatives of every segment at every time
+
+    Args:
+        coeffs: (N, 3, 6) coefficients, see solve_segments
+        t: (K,) times since the start of each segment, or (N, K) times of every segment
+
+    Returns:
+        TrajectoryState of (N, K, 3) arrays
+    """
+    coeffs = np.asarray(coeffs, dtype=np.float64).reshape(-1, 3, 6)[:, None]
+    t = np.asarray(t, dtype=np.float64)
+    t = t[:, :, None] if t.ndim == 2 else t.reshape(-1)[None, :, None]
+    values = []
+    for _ in TrajectoryState._fields:
+        values.append(polyval(coeffs, t))
+        coeffs = derivative(coeffs)
+    return TrajectoryState(*values)
@@ -0,0 +1,137 @@
+# async_search.py
+# ---------------
+
+"""
+This file contains the asyncio front end of the search, for planning from an event loop.
+"""
+
+import asyncio
+import threading
+import time
+import weakref
+from collections import namedtuple
+from search import DEFAULT_CHECK_EVERY, SearchCancelled, SearchTimeout, astar
+
+# Partial result of a running search: the expanded state closest to a goal so far,
+# the number of expansions and the seconds since the search was submitted
+Progress = namedtuple('Progress', ['best_state', 'expansions', 'elapsed'])
+
+# seconds between two cancellation/deadline checks of a job waiting for another search of its maze
+LOCK_POLL = 0.05
+
+
+class PlanningJob:
+    def __init__(self, maze, priority, deadline, loop):
+        """A search submitted to an AsyncPlanner
+
+        Await the job for the path, or iterate over it with `async for` to receive
+        Progress updates until the search ends.
+
+        Args:
+            maze (Maze): maze to search
+            priority (int): higher priorities preempt lower ones
+            deadline (float): time.monotonic() after which the search gives up, or None
+            loop (AbstractEventLoop): event loop progress updates are delivered to
+        """
+        self.maze = maze
+        self.priority = priority
+        self.deadline = deadline
+        self.future = None
+        self.__loop = loop
+        self.__cancelled = threading.Event()
+        self.__updates = asyncio.Queue()
+        self.__submitted = time.monotonic()
+
+    def cancel(self):
+        """Ask the search to stop at its next check, awaiting the job then raises SearchCancelled"""
+        self.__cancelled.set()
+
+    def cancelled(self):
+        return self.__cancelled.is_set()
+
+    def check(self, best_state=None, expansions=0):
+        """Called from the worker thread: publish progress and stop the search if needed"""
+        if best_state is not None:
+            update = Progress(best_state, expansions, time.monotonic() - self.__submitted)
+            self.__loop.call_soon_threadsafe(self.__updates.put_nowait, update)
+        if self.__cancelled.is_set():
+            raise SearchCancelled('search was cancelled or preempted')
+        if self.deadline is not None and time.monotonic() > self.deadline:
+            raise SearchTimeout('search ran past its deadline after {0} expansions'.format(expansions))
+
+    def __await__(self):
+        return self.__wait().__await__()
+
+    async def __wait(self):
+        try:
+            return await self.future
+        except asyncio.CancelledError:
+            # cancelling the awaiting task (or asyncio.wait_for timing out) only cancels the
+            # future, the search in the executor has to be told to stop as well
+            self.cancel()
+            raise
+
+    async def __aiter__(self):
+        while True:
+            update = asyncio.ensure_future(self.__updates.get())
+            await asyncio.wait({update, self.future}, return_when=asyncio.FIRST_COMPLETED)
+            if not update.done():
+                update.cancel()
+                break
+            yield update.result()
+        # updates published right before the search ended
+        while not self.__updates.empty():
+            yield self.__updates.get_nowait()
+
+
+class AsyncPlanner:
+    def __init__(self, executor=None, check_every=DEFAULT_CHECK_EVERY):
+        """Plan paths from asyncio code
+
+        Args:
+            executor (Executor): where searches run, defaults to the loop's default thread pool
+            check_every (int): expansions between two cancellation/deadline checks
+        """
+        self.executor = executor
+        self.check_every = check_every
+        self.running = set()
+        # one lock per maze, searches of a maze share its states_explored and peak_states
+        self.__locks = weakref.WeakKeyDictionary()
+
+    def plan(self, maze, priority=0, timeout=None):
+        """Start searching a maze, must be called from a running event loop (part 1 only)
+
+        Running jobs of the same maze with a lower priority are preempted, jobs of other mazes
+        keep running. Searches of the same maze run one after the other, a job waits for the
+        running one before it starts.
+
+        Args:
+            maze (Maze): maze to search
+            priority (int): priority of the job
+            timeout (float): seconds the search may run, None for no deadline
+
+        Returns:
+            PlanningJob: awaiting it returns the path, or raises SearchCancelled / SearchTimeout
+        """
+        loop = asyncio.get_running_loop()
+        for job in list(self.running):
+            if job.maze is maze and job.priority < priority:
+                job.cancel()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        job = PlanningJob(maze, priority, deadline, loop)
+        lock = self.__locks.setdefault(maze, threading.Lock())
+        job.future = loop.run_in_executor(self.executor, self.__search, job, lock)
+        self.running.add(job)
+        job.future.add_done_callback(lambda _: self.running.discard(job))
+        return job
+
+    def __search(self, job, lock):
+        # a job preempted while waiting for a worker or for its maze never starts
+        job.check()
+        while not lock.acquire(timeout=LOCK_POLL):
+            job.check()
+        try:
+            job.check()
+            return astar(job.maze, ispart1=True, progress=job.check, check_every=self.check_every)
+        finally:
+            lock.release()
@@ -0,0 +1,222 @@
+# collision.py
+# ---------------
+
+"""
+This file contains batched collision tests between the drone and box obstacles.
+"""
+
+import numpy as np
+
+# number of golden section steps of capsule_aabb_distance, each shrinks the bracket by 0.618
+GOLDEN_STEPS = 60
+GOLDEN_RATIO = (np.sqrt(5) - 1) / 2
+# corners of the 6 faces of a box, picking the min (False) or max (True) corner on every axis
+BOX_FACES = np.array([[[0, 0, 0], [1, 0, 0], [1, 1, 0], [0, 1, 0]],
+                      [[0, 0, 1], [1, 0, 1], [1, 1, 1], [0, 1, 1]],
+                      [[0, 0, 0], [1, 0, 0], [1, 0, 1], [0, 0, 1]],
+                      [[0, 1, 0], [1, 1, 0], [1, 1, 1], [0, 1, 1]],
+                      [[0, 0, 0], [0, 1, 0], [0, 1, 1], [0, 0, 1]],
+                      [[1, 0, 0], [1, 1, 0], [1, 1, 1], [1, 0, 1]]], dtype=bool)
+
+
+def as_boxes(obstacles):
+    """Convert obstacles [(x1, y1, z1, x2, y2, z2), ...] to an (M, 6) array of [min corner, max corner]"""
+    boxes = np.asarray(obstacles, dtype=np.float64).reshape(-1, 6)
+    return np.concatenate([np.minimum(boxes[:, :3], boxes[:, 3:]), np.maximum(boxes[:, :3], boxes[:, 3:])], axis=1)
+
+
+def expand_boxes(boxes, half_extents):
+    """Grow boxes by the half extents of the drone, so testing the drone's center against the
+    grown boxes is the same as testing the drone's box against the original ones
+
+    Args:
+        boxes: (M, 6) boxes
+        half_extents: (3,) half length, width and height of the drone
+
+    Returns:
+        (M, 6) array of grown boxes
+    """
+    boxes = as_boxes(boxes)
+    half_extents = np.asarray(half_extents, dtype=np.float64)
+    return np.concatenate([boxes[:, :3] - half_extents, boxes[:, 3:] + half_extents], axis=1)
+
+
+def box_faces(boxes):
+    """Faces of every box as a (6 M, 4, 3) array of quads, e.g. for a Poly3DCollection"""
+    boxes = as_boxes(boxes)
+    return np.where(BOX_FACES[None], boxes[:, None, None, 3:], boxes[:, None, None, :3]).reshape(-1, 4, 3)
+
+
+def drone_box(drone):
+    """Returns the (6,) box the drone occupies"""
+    return as_boxes(drone.get_coords())[0]
+
+
+def aabb_overlap(boxes1, boxes2):
+    """Determine whether every box in boxes1 overlaps every box in boxes2, touching counts
+
+    Args:
+        boxes1: (N, 6) boxes
+        boxes2: (M, 6) boxes
+
+    Returns:
+        (N, M) boolean array
+    """
+    boxes1, boxes2 = as_boxes(boxes1), as_boxes(boxes2)
+    return ((boxes1[:, None, :3] <= boxes2[None, :, 3:]) & (boxes2[None, :, :3] <= boxes1[:, None, 3:])).all(axis=-1)
+
+
+def segment_aabb_intersect(starts, ends, boxes):
+    """Slab test of every segment against every box
+
+    Args:
+        starts: (N, 3) segment start points
+        ends: (N, 3) segment end points
+        boxes: (M, 6) boxes
+
+    Returns:
+        (N, M) boolean array, True where the segment touches the box
+    """
+    starts = np.asarray(starts, dtype=np.float64).reshape(-1, 3)
+    direction = np.asarray(ends, dtype=np.float64).reshape(-1, 3) - starts
+    boxes = as_boxes(boxes)
+    lo = boxes[None, :, :3] - starts[:, None]
+    hi = boxes[None, :, 3:] - starts[:, None]
+    parallel = direction == 0
+    with np.errstate(divide='ignore', invalid='ignore'):
+        inverse = 1 / np.where(parallel, 1, direction)[:, None]
+        t0, t1 = lo * inverse, hi * inverse
+    # a segment parallel to a slab is inside it everywhere or nowhere
+    inside = (lo <= 0) & (hi >= 0)
+    enter = np.where(parallel[:, None], np.where(inside, -np.inf, np.inf), np.minimum(t0, t1)).max(axis=-1)
+    leave = np.where(parallel[:, None], np.where(inside, np.inf, -np.inf), np.maximum(t0, t1)).min(axis=-1)
+    return (enter <= leave) & (enter <= 1) & (leave >= 0)
+
+
+def sphere_aabb_distance(centers, boxes):
+    """Distance from every point to every box, 0 inside. Subtract the radius for spheres.
+
+    Args:
+        centers: (N, 3) points
+        boxes: (M, 6) boxes
+
+    Returns:
+        (N, M) array of distances
+    """
+    centers = np.asarray(centers, dtype=np.float64).reshape(-1, 3)
+    boxes = as_boxes(boxes)
+    closest = np.clip(centers[:, None], boxes[None, :, :3], boxes[None, :, 3:])
+    return np.linalg.norm(centers[:, None] - closest, axis=-1)
+
+
+def capsule_aabb_distance(starts, ends, boxes):
+    """Distance from every segment to every box, 0 where they touch. Subtract the radius for capsules.
+
+    The distance from a point moving along a segment to a convex box is convex in the
+    segment parameter, so a golden section search finds the closest point.
+
+    Args:
+        starts: (N, 3) segment start points
+        ends: (N, 3) segment end points
+        boxes: (M, 6) boxes
+
+    Returns:
+        (N, M) array of distances
+    """
+    starts = np.asarray(starts, dtype=np.float64).reshape(-1, 3)
+    direction = np.asarray(ends, dtype=np.float64).reshape(-1, 3) - starts
+    boxes = as_boxes(boxes)
+
+    def distance(t):
+        points = starts[:, None] + t[..., None] * direction[:, None]
+        closest = np.clip(points, boxes[None, :, :3], boxes[None, :, 3:])
+        return np.linalg.norm(points - closest, axis=-1)
+
+    a = np.zeros((len(starts), len(boxes)))
+    b = np.ones_like(a)
+    c, d = b - GOLDEN_RATIO * (b - a), a + GOLDEN_RATIO * (b - a)
+    fc, fd = distance(c), distance(d)
+    for _ in range(GOLDEN_STEPS):
+        # the probe on the kept side becomes the opposite probe of the new bracket,
+        # so only one new probe is evaluated per step
+        left = fc < fd
+        a, b = np.where(left, a, c), np.where(left, d, b)
+        probe = np.where(left, b - GOLDEN_RATIO * (b - a), a + GOLDEN_RATIO * (b - a))
+        value = distance(probe)
+        c, d = np.where(left, probe, d), np.where(left, c, probe)
+        fc, fd = np.where(left, value, fd), np.where(left, fc, value)
+    closest = np.minimum.reduce([distance(a), distance(b), distance(np.zeros_like(a)), distance(np.ones_like(a))])
+    return np.where(segment_aabb_intersect(starts, starts + direction, boxes), 0.0, closest)
+
+
+class BVH:
+    def __init__(self, boxes, leaf_size=4):
+        """Bounding volume hierarchy over obstacle boxes
+
+        Nodes are split at the median of their longest axis until they hold at most
+        leaf_size boxes. The tree is stored in flat arrays so many query boxes can walk
+        it together.
+
+        Args:
+            boxes: (M, 6) obstacle boxes
+            leaf_size (int): maximum number of boxes in a leaf
+        """
+        self.boxes = as_boxes(boxes)
+        nodes, children, ranges = [], [], []
+        order = []
+        stack = [(np.arange(len(self.boxes)), -1, 0)]
+        while stack:
+            indices, parent, side = stack.pop()
+            node = len(nodes)
+            if parent >= 0:
+                children[parent][side] = node
+            group = self.boxes[indices]
+            nodes.append(np.concatenate([group[:, :3].min(axis=0), group[:, 3:].max(axis=0)]) if len(indices)
+                         else np.array([np.inf] * 3 + [-np.inf] * 3))
+            children.append([-1, -1])
+            if len(indices) <= leaf_size:
+                ranges.append((len(order), len(order) + len(indices)))
+                order.extend(indices.tolist())
+                continue
+            ranges.append((0, 0))
+            centers = group[:, :3] + group[:, 3:]
+            axis = np.argmax(np.ptp(centers, axis=0))
+            split = np.argsort(centers[:, axis], kind='stable')
+            half = len(indices) // 2
+            stack.append((indices[split[half:]], node, 1))
+            stack.append((indices[split[:half]], node, 0))
+        self.nodes = np.array(nodes).reshape(-1, 6)
+        self.children = np.array(children, dtype=np.int64).reshape(-1, 2)
+        self.ranges = np.array(ranges, dtype=np.int64).reshape(-1, 2)
+        self.order = np.array(order, dtype=np.int64)
+
+    def query(self, queries):
+        """Find every pair of query box and obstacle box that overlap
+
+        Args:
+            queries: (N, 6) query boxes
+
+        Returns:
+            query_indices, box_indices: int arrays of the overlapping pairs
+        """
+        queries = as_boxes(queries)
+        found_queries, found_boxes = [], []
+        q = np.arange(len(queries))
+        node = np.zeros(len(queries), dtype=np.int64)
+        while len(q):
+            overlap = ((queries[q, :3] <= self.nodes[node, 3:]) & (self.nodes[node, :3] <= queries[q, 3:])).all(axis=1)
+            q, node = q[overlap], node[overlap]
+            leaf = self.children[node, 0] < 0
+            # test the boxes of the reached leaves one by one
+            leaf_q, leaf_node = q[leaf], node[leaf]
+            counts = self.ranges[leaf_node, 1] - self.ranges[leaf_node, 0]
+            pair_q = np.repeat(leaf_q, counts)
+            starts = np.repeat(self.ranges[leaf_node, 0] - np.cumsum(counts) + counts, counts)
+            pair_box = self.order[starts + np.arange(counts.sum())]
+            hit = ((queries[pair_q, :3] <= self.boxes[pair_box, 3:]) & (self.boxes[pair_box, :3] <= queries[pair_q, 3:])).all(axis=1)
+            found_queries.append(pair_q[hit])
+            found_boxes.append(pair_box[hit])
+            # descend into both children of the internal nodes
+            q = np.repeat(q[~leaf], 2)
+            node = self.children[node[~leaf]].ravel()
+        return np.concatenate(found_queries), np.concatenate(found_boxes)
@@ -36,3 +36,8 @@ Z = 2
 
 DEFAULT_FPS = 30
 DEFAULT_GRANULARITY = 2
+
+# Number of neighbors a maze cell can move to: 6 (faces), 18 (faces + edges)
+# or 26 (faces + edges + corners)
+DEFAULT_CONNECTIVITY = 6
+CONNECTIVITIES = (6, 18, 26)
@@ -7,12 +7,16 @@ Author: Daniel Ingram (daniel-s-ingram)
 from math import cos, sin
 import numpy as np
 from Quadrotor import Quadrotor
-from TrajectoryGenerator import TrajectoryGenerator
-from mpl_toolkits.mplot3d import Axes3D
-import random
+from TrajectoryGenerator import stack_coefficients
+from trajectory_planning import plan_trajectory
+import time
 from search import astar
 from drone import Drone
 from transform import transformToMaze
+from shortcut import shortcut_path
+from collision import expand_boxes
+from trajectory_collision import TrajectoryChecker
+from simulation import Params, simulate
 
 
 show_animation = True
@@ -24,6 +28,9 @@ Ixx = 1
 Iyy = 1
 Izz = 1
 T = 5
+# limits the segment durations are allocated from
+v_max = 2
+a_max = 2
 
 # Proportional coefficients
 Kp_x = 1
@@ -39,139 +46,40 @@ Kd_y = 10
 Kd_z = 1
 
 
-def quad_sim(x_c, y_c, z_c, obstacles):
+def quad_sim(x_c, y_c, z_c, obstacles, durations=None, recorder=None, method=None):
     """
     Calculates the necessary thrust and torques for the quadrotor to
     follow the trajectory described by the sets of coefficients
-    x_c, y_c, and z_c.
+    x_c, y_c, and z_c. Segment i lasts durations[i] seconds, T by default.
+    The flight is simulated headless first and returned as Telemetry, and streamed
+    to the telemetry.TelemetryRecorder if one is given. method selects the integrator,
+    see simulation.simulate.
     """
-    x_pos = 2
-    y_pos = 2
-    z_pos = 2
-    x_vel = 0
-    y_vel = 0
-    z_vel = 0
-    x_acc = 0
-    y_acc = 0
-    z_acc = 0
-    roll = 0
-    pitch = 0
-    yaw = 0
-    roll_vel = 0
-    pitch_vel = 0
-    yaw_vel = 0
-
-    des_yaw = 0
-
     #the change of rate at which the drone is moving in the simulation
     dt = 0.2
-    t = 0
-
-    q = Quadrotor(x=x_pos, y=y_pos, z=z_pos, roll=roll,
-                  pitch=pitch, yaw=yaw, size=1, show_animation=show_animation, obstacles = obstacles)
-
-    i = 0
-    n_run = len(x_c)
-    irun = 0
-
-    while True:
-        while t <= T:
-            # des_x_pos = calculate_position(x_c[i], t)
-            # des_y_pos = calculate_position(y_c[i], t)
-            des_z_pos = calculate_position(z_c[i], t)
-            # des_x_vel = calculate_velocity(x_c[i], t)
-            # des_y_vel = calculate_velocity(y_c[i], t)
-            des_z_vel = calculate_velocity(z_c[i], t)
-            des_x_acc = calculate_acceleration(x_c[i], t)
-            des_y_acc = calculate_acceleration(y_c[i], t)
-            des_z_acc = calculate_acceleration(z_c[i], t)
-
-            thrust = m * (g + des_z_acc + Kp_z * (des_z_pos -
-                                                  z_pos) + Kd_z * (des_z_vel - z_vel))
-
-            roll_torque = Kp_roll * \
-                (((des_x_acc * sin(des_yaw) - des_y_acc * cos(des_yaw)) / g) - roll)
-            pitch_torque = Kp_pitch * \
-                (((des_x_acc * cos(des_yaw) - des_y_acc * sin(des_yaw)) / g) - pitch)
-            yaw_torque = Kp_yaw * (des_yaw - yaw)
-
-            roll_vel += roll_torque * dt / Ixx
-            pitch_vel += pitch_torque * dt / Iyy
-            yaw_vel += yaw_torque * dt / Izz
-
-            roll += roll_vel * dt
-            pitch += pitch_vel * dt
-            yaw += yaw_vel * dt
-
-            R = rotation_matrix(roll, pitch, yaw)
-            acc = (np.matmul(R, np.array(
-                [0, 0, thrust.item()]).T) - np.array([0, 0, m * g]).T) / m
-            x_acc = acc[0]
-            y_acc = acc[1]
-            z_acc = acc[2]
-            x_vel += x_acc * dt
-            y_vel += y_acc * dt
-            z_vel += z_acc * dt
-            x_pos += x_vel * dt
-            y_pos += y_vel * dt
-            z_pos += z_vel * dt
-
-            q.update_pose(x_pos, y_pos, z_pos, roll, pitch, yaw)
-
-            #looping through a fifth degree polynomial 
-            t += dt
-        t = 0
-        i = i + 1
-        irun += 1
-        if irun >= n_run:
-            break
-
-    print("Done")
-
-
-def calculate_position(c, t):
-    """
-    Calculates a position given a set of quintic coefficients and a time.
-
-    Args
-        c: List of coefficients generated by a quintic polynomial 
-            trajectory generator.
-        t: Time at which to calculate the position
-
-    Returns
-        Position
-    """
-    return c[0] * t**5 + c[1] * t**4 + c[2] * t**3 + c[3] * t**2 + c[4] * t + c[5]
-
-
-def calculate_velocity(c, t):
-    """
-    Calculates a velocity given a set of quintic coefficients and a time.
 
-    Args
-        c: List of coefficients generated by a quintic polynomial 
-            trajectory generator.
-        t: Time at which to calculate the velocity
-
-    Returns
-        Velocity
-    """
-    return 5 * c[0] * t**4 + 4 * c[1] * t**3 + 3 * c[2] * t**2 + 2 * c[3] * t + c[4]
-
-
-def calculate_acceleration(c, t):
-    """
-    Calculates an acceleration given a set of quintic coefficients and a time.
+    coeffs = stack_coefficients(x_c, y_c, z_c)
+    durations = np.broadcast_to(T if durations is None else durations, (len(coeffs),))
+    params = Params(g=g, m=m, Ixx=Ixx, Iyy=Iyy, Izz=Izz, Kp_z=Kp_z, Kp_roll=Kp_roll, Kp_pitch=Kp_pitch,
+                    Kp_yaw=Kp_yaw, Kd_z=Kd_z)
+    telemetry = simulate(coeffs, durations, start=(2, 2, 2), dt=dt, params=params, recorder=recorder,
+                         method=method)
+
+    # the plot replays the recorded flight in real time, Quadrotor skips the frames it
+    # has no time for
+    pose = np.concatenate([telemetry.pos, telemetry.att], axis=1).tolist()
+    q = Quadrotor(*pose[0], size=1, show_animation=show_animation, obstacles = obstacles)
+    began = time.perf_counter()
+    for t, (x_pos, y_pos, z_pos, roll, pitch, yaw) in zip(telemetry.t[1:].tolist(), pose[1:]):
+        if show_animation:
+            time.sleep(max(0, began + t - time.perf_counter()))
+        q.update_pose(x_pos, y_pos, z_pos, roll, pitch, yaw)
+    if show_animation:
+        # the last pose may have been skipped
+        q.plot()
 
-    Args
-        c: List of coefficients generated by a quintic polynomial 
-            trajectory generator.
-        t: Time at which to calculate the acceleration
-
-    Returns
-        Acceleration
-    """
-    return 20 * c[0] * t**3 + 12 * c[1] * t**2 + 6 * c[2] * t + 2 * c[3]
+    print("Done")
+    return telemetry
 
 
 def rotation_matrix(roll, pitch, yaw):
@@ -210,22 +118,29 @@ def main():
     granularity = 1
     generated_maze = transformToMaze(drone,goal,obstacles,window,granularity)
 
-    waypoints = astar(generated_maze, ispart1=True)
-    print(waypoints)
-    x_coeffs = [[] for i in range(len(waypoints) - 1)]
-    y_coeffs = [[] for i in range(len(waypoints) - 1)]
-    z_coeffs = [[] for i in range(len(waypoints) - 1)]
-   
-    for i in range(len(waypoints) - 1):
-        print(waypoints[i].state, waypoints[(i + 1)].state)
-        traj = TrajectoryGenerator(waypoints[i].state, waypoints[(i + 1)].state, T)
-        traj.solve()
-        x_coeffs[i] = traj.x_c
-        y_coeffs[i] = traj.y_c
-        z_coeffs[i] = traj.z_c
+    path = astar(generated_maze, ispart1=True)
+    print(path)
+    # skip the cells the drone can fly straight past
+    half_extents = np.array([drone_length, drone_width, drone_height]) / 2
+    waypoints, removed = shortcut_path(generated_maze, path, boxes=expand_boxes(obstacles, half_extents))
+    print("Shortcutting removed {} of {} segments".format(removed, len(path) - 1))
+    # one segment per straight run, timed from the limits, flying through the interior waypoints
+    plan = plan_trajectory(waypoints, v_max, a_max)
+    checker = TrajectoryChecker(obstacles, half_extents)
+    contact = checker.first_contact(plan.coeffs, plan.durations)
+    if contact is not None:
+        print("Trajectory hits obstacle {} at t = {:.3f} s, stopping at the waypoints instead".format(contact.obstacle, contact.time))
+        plan = plan_trajectory(waypoints, v_max, a_max, stop_at_waypoints=True)
+        contact = checker.first_contact(plan.coeffs, plan.durations)
+    for i in range(len(plan.waypoints) - 1):
+        print(plan.waypoints[i], plan.waypoints[(i + 1)], "{:.2f} s".format(plan.durations[i]))
+    print("Mission time {:.2f} s instead of {} s".format(plan.durations.sum(), T * (len(path) - 1)))
+    # (N, 6) per axis, so the coefficients are scalars in quad_sim
+    x_coeffs, y_coeffs, z_coeffs = plan.coeffs[:, 0], plan.coeffs[:, 1], plan.coeffs[:, 2]
     print(x_coeffs, y_coeffs, z_coeffs)
-    quad_sim(x_coeffs, y_coeffs, z_coeffs, obstacles)
-
+    if contact is not None:
+        print("Warning: trajectory hits obstacle {} at t = {:.3f} s".format(contact.obstacle, contact.time))
+    quad_sim(x_coeffs, y_coeffs, z_coeffs, obstacles, plan.durations)
 
 if __name__ == "__main__":
     main()
@@ -13,33 +13,97 @@ This file contains geometry functions necessary for solving problems in MP3
 """
 
 import math
+from functools import lru_cache
 from re import I
 import numpy as np
 from drone import Drone
 from typing import List, Tuple
 
+# cell side of a WallIndex for a drone without extent, e.g. a point drone at granularity 0,
+# one map unit so the grid stays as coarse as the map itself
+MIN_CELL_SIZE = 1
+
+class WallIndex:
+    def __init__(self, walls, cell_size):
+        """Uniform grid hash of wall bounding boxes, built once per map
+
+        Every wall is stored in each grid cell its bounding box overlaps, as one sorted array
+        of cell keys with the matching wall indices, so a query only looks at the walls in
+        the cells around the drone.
+
+        Args:
+            walls (list): List of endpoints of line segments that comprise the walls in the maze in the format [(startx, starty, endx, endy), ...]
+            cell_size (float): side of a grid cell, see for_drone
+        """
+        if not cell_size > 0 or not np.isfinite(cell_size):
+            raise ValueError('cell_size must be positive and finite (got {0})'.format(cell_size))
+        self.segments = as_segments(walls)
+        self.cell_size = float(cell_size)
+        lo, hi = self.segments.min(axis=1), self.segments.max(axis=1)
+        self.origin = lo.min(axis=0) if len(lo) else np.zeros(2)
+        first, last = self.__cells(lo), self.__cells(hi)
+        self.shape = (last.max(axis=0) + 1) if len(last) else np.ones(2, dtype=np.int64)
+        # expand each wall into the cells of its bounding box
+        counts = np.prod(last - first + 1, axis=1)
+        wall = np.repeat(np.arange(len(self.segments)), counts)
+        offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        rows = (last - first + 1)[wall, 1]
+        cells = first[wall] + np.stack([offset // rows, offset % rows], axis=1)
+        keys = cells[:, 0] * self.shape[1] + cells[:, 1]
+        order = np.argsort(keys, kind='stable')
+        self.keys, self.walls = keys[order], wall[order]
+
+    @classmethod
+    def for_drone(cls, walls, drone, granularity):
+        """Index sized so a drone's reach only spans a few cells"""
+        return cls(walls, drone_cell_size(drone, granularity))
+
+    def __cells(self, points):
+        return np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+
+    def nearby(self, lo, hi):
+        """Indices of the walls whose bounding boxes may overlap the box from lo to hi (x, y)"""
+        first = np.maximum(self.__cells(np.asarray(lo, dtype=np.float64)), 0)
+        last = np.minimum(self.__cells(np.asarray(hi, dtype=np.float64)), self.shape - 1)
+        if (first > last).any():
+            return np.zeros(0, dtype=np.int64)
+        xs, ys = np.meshgrid(np.arange(first[0], last[0] + 1), np.arange(first[1], last[1] + 1), indexing='ij')
+        keys = (xs * self.shape[1] + ys).ravel()
+        starts, ends = np.searchsorted(self.keys, keys), np.searchsorted(self.keys, keys, side='right')
+        counts = ends - starts
+        found = self.walls[np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())]
+        return np.unique(found)
+
+def drone_cell_size(drone, granularity):
+    """WallIndex cell side for a drone, its width plus the granularity"""
+    return max(drone.get_width() + granularity, MIN_CELL_SIZE)
+
 def does_drone_touch_wall(drone, walls,granularity):
     """Determine whether the drone touches a wall
 
         Args:
             drone (Drone): Instance of Drone class that will be navigating our map
-            walls (list): List of endpoints of line segments that comprise the walls in the maze in the format [(startx, starty, endx, endx), ...]
+            walls (list or WallIndex): List of endpoints of line segments that comprise the walls in the maze in the format [(startx, starty, endx, endx), ...],
+                or a WallIndex over them to only test the walls near the drone
             granularity (int): The granularity of the map
 
         Return:
             True if touched, False if not
     """
+    reach = drone.get_width() + granularity/np.sqrt(2)
     if drone.is_circle():
-        # drone_coords = drone.get_head_and_tail()
-        # drone_coords = ((drone_coords[0][0], drone_coords[0][1]), (drone_coords[1][0], drone_coords[1][1]))
-        for wall in walls:
-            if point_segment_distance(drone.get_centroid(), ((wall[0], wall[1]), (wall[2], wall[3]))) <= drone.get_width() + granularity/np.sqrt(2):
-                return True
-        return False
-    for wall in walls:
-        if segment_distance(drone.get_head_and_tail(), ((wall[0], wall[1]), (wall[2], wall[3]))) <= drone.get_width() + granularity/np.sqrt(2):
-            return True
-    return False
+        shape = np.asarray(drone.get_centroid(), dtype=np.float64)[None]
+    else:
+        shape = np.asarray(drone.get_head_and_tail(), dtype=np.float64)
+    if isinstance(walls, WallIndex):
+        walls = walls.segments[walls.nearby(shape.min(axis=0) - reach, shape.max(axis=0) + reach)]
+    else:
+        walls = as_segments(walls)
+    if drone.is_circle():
+        distances = point_segment_distances(shape, walls)
+    else:
+        distances = segment_distances(shape[None], walls)
+    return bool((distances <= reach).any())
 
 def does_drone_touch_goal(drone, goals):
     """Determine whether the drone touches a goal
@@ -51,15 +115,12 @@ def does_drone_touch_goal(drone, goals):
         Return:
             True if a goal is touched, False if not.
     """
+    goals = np.asarray(goals, dtype=np.float64).reshape(-1, 3)
     if drone.is_circle():
-        for goal in goals:
-            if np.linalg.norm(np.array(drone.get_centroid()) - np.array((goal[0], goal[1]))) <= drone.get_width() + goal[2]:
-                return True
-        return False
-    for goal in goals:
-        if point_segment_distance((goal[0], goal[1]), drone.get_head_and_tail()) <= drone.get_width() + goal[2]:
-            return True
-    return False
+        distances = np.hypot(*(goals[:, :2] - drone.get_centroid()).T)
+    else:
+        distances = point_segment_distances(goals[:, :2], [drone.get_head_and_tail()])[:, 0]
+    return bool((distances <= drone.get_width() + goals[:, 2]).any())
 
 def is_drone_within_window(drone, window,granularity):
     """Determine whether the drone stays within the window
@@ -69,13 +130,112 @@ def is_drone_within_window(drone, window,granularity):
             window (tuple): (width, height) of the window
             granularity (int): The granularity of the map
     """
-    width, height = window
-    walls = [(0,0,width,0), (0,0,0,height), (width, 0, width, height), (0, height, width, height)]
-    if drone.is_circle():
-        # drone_coords = drone.get_head_and_tail()
-        # drone_coords = ((drone_coords[0][0], drone_coords[0][1]), (drone_coords[1][0], drone_coords[1][1]))
-        return not any([point_segment_distance(drone.get_centroid(), ((wall[0], wall[1]), (wall[2], wall[3]))) <= drone.get_width() + granularity/np.sqrt(2) for wall in walls])
-    return not any([segment_distance(drone.get_head_and_tail(), ((wall[0], wall[1]), (wall[2], wall[3]))) <= drone.get_width() + granularity/np.sqrt(2) for wall in walls])
+    return not does_drone_touch_wall(drone, window_index(*window, drone_cell_size(drone, granularity)), granularity)
+
+def wall_test(walls, drone, granularity):
+    """Returns a function telling whether the drone, in its current configuration, touches a wall
+
+    The WallIndex of the walls is built once here, build the test once per map and call it
+    for every configuration of the drone.
+    """
+    index = WallIndex.for_drone(walls, drone, granularity)
+    return lambda drone: does_drone_touch_wall(drone, index, granularity)
+
+@lru_cache(maxsize=None)
+def window_walls(width, height):
+    """The four walls around a window, built once per window size"""
+    walls = as_segments([(0,0,width,0), (0,0,0,height), (width, 0, width, height), (0, height, width, height)])
+    walls.flags.writeable = False
+    return walls
+
+@lru_cache(maxsize=None)
+def window_index(width, height, cell_size):
+    """WallIndex of the walls around a window, built once per window size and cell size"""
+    return WallIndex(window_walls(width, height), cell_size)
+
+def as_segments(walls):
+    """Convert walls [(startx, starty, endx, endy), ...] to an (M, 2, 2) array of segments"""
+    return np.asarray(walls, dtype=np.float64).reshape(-1, 2, 2)
+
+def point_segment_distances(points, segments):
+    """Compute the distance from every point to every line segment at once.
+
+        Args:
+            points: (N, D) array of points.
+            segments: (M, 2, D) array of segment endpoints.
+
+        Return:
+            (N, M) array of Euclidean distances.
+    """
+    points = np.asarray(points, dtype=np.float64)
+    segments = np.asarray(segments, dtype=np.float64)
+    start = segments[:, 0]
+    direction = segments[:, 1] - start
+    length2 = (direction * direction).sum(axis=-1)
+    offset = points[:, None, :] - start[None]
+    # parameter of the closest point on each segment, degenerate segments are points
+    t = np.clip((offset * direction).sum(axis=-1) / np.where(length2 > 0, length2, 1), 0, 1)
+    return np.linalg.norm(offset - t[..., None] * direction, axis=-1)
+
+def segment_distances(segments1, segments2):
+    """Compute the distance from every segment in segments1 to every segment in segments2 at once.
+
+        Args:
+            segments1: (N, 2, 2) array of segment endpoints.
+            segments2: (M, 2, 2) array of segment endpoints.
+
+        Return:
+            (N, M) array of Euclidean distances.
+    """
+    segments1 = np.asarray(segments1, dtype=np.float64)
+    segments2 = np.asarray(segments2, dtype=np.float64)
+    # two segments that do not intersect are closest at an endpoint of one of them
+    distances = np.minimum.reduce([
+        point_segment_distances(segments1[:, 0], segments2),
+        point_segment_distances(segments1[:, 1], segments2),
+        point_segment_distances(segments2[:, 0], segments1).T,
+        point_segment_distances(segments2[:, 1], segments1).T])
+    return np.where(segments_intersect(segments1, segments2), 0.0, distances)
+
+def segments_intersect(segments1, segments2):
+    """Determine whether every segment in segments1 intersects every segment in segments2 at once.
+    Same rules as do_segments_intersect, including touching and overlapping collinear segments.
+
+        Args:
+            segments1: (N, 2, 2) array of segment endpoints.
+            segments2: (M, 2, 2) array of segment endpoints.
+
+        Return:
+            (N, M) boolean array, True where the segments intersect.
+    """
+    segments1 = np.asarray(segments1, dtype=np.float64)
+    segments2 = np.asarray(segments2, dtype=np.float64)
+    a, b = segments1[:, None, 0], segments1[:, None, 1]
+    c, d = segments2[None, :, 0], segments2[None, :, 1]
+    d0 = orientation(a, b, c)
+    d1 = orientation(a, b, d)
+    d2 = orientation(c, d, a)
+    d3 = orientation(c, d, b)
+    crossing = (d0 * d1 < 0) & (d2 * d3 < 0)
+    # an endpoint on the line through the other segment must also lie within its bounding box
+    touching = ((d0 == 0) & within_box(a, b, c)) | ((d1 == 0) & within_box(a, b, d)) | \
+               ((d2 == 0) & within_box(c, d, a)) | ((d3 == 0) & within_box(c, d, b))
+    return crossing | touching
+
+def within_box(a, b, c):
+    """Whether the points c lie in the axis aligned boxes spanned by the points a and b"""
+    return ((np.minimum(a, b) <= c) & (c <= np.maximum(a, b))).all(axis=-1)
+
+def orientation(a, b, c):
+    """Twice the signed area of the triangles (a, b, c), for arrays of 2D points of any matching shape"""
+    return (b[..., 0] - a[..., 0]) * (c[..., 1] - a[..., 1]) - (c[..., 0] - a[..., 0]) * (b[..., 1] - a[..., 1])
+
+def _point_segment_distance(px, py, ax, ay, bx, by):
+    """Scalar point to segment distance with plain floats, much faster than NumPy for one pair"""
+    dx, dy = bx - ax, by - ay
+    length2 = dx * dx + dy * dy
+    t = 0.0 if length2 == 0 else min(1.0, max(0.0, ((px - ax) * dx + (py - ay) * dy) / length2))
+    return math.hypot(px - ax - t * dx, py - ay - t * dy)
 
 def point_segment_distance(point, segment):
     """Compute the distance from the point to the line segment.
@@ -88,14 +248,8 @@ def point_segment_distance(point, segment):
         Return:
             Euclidean distance from the point to the line segment.
     """
-    pt = np.array(point)
-    s0 = np.array(segment[0])
-    s1 = np.array(segment[1])
-    if np.dot(s1 - s0, pt - s1) > 0:
-        return np.linalg.norm(pt - s1)
-    if np.dot(s1 - s0, pt - s0) < 0:
-        return np.linalg.norm(pt - s0)
-    return np.linalg.norm(np.cross(pt - s0, s1 - s0))/np.linalg.norm(s1 - s0)
+    (ax, ay), (bx, by) = segment
+    return _point_segment_distance(point[0], point[1], ax, ay, bx, by)
 
 def do_segments_intersect(segment1, segment2):
     """Determine whether segment1 intersects segment2.  
@@ -143,8 +297,10 @@ def segment_distance(segment1, segment2):
     """
     if do_segments_intersect(segment1, segment2):
         return 0
-    
-    return min([point_segment_distance(point, segment2) for point in segment1] + [point_segment_distance(point, segment1) for point in segment2])
+    (ax, ay), (bx, by) = segment1
+    (cx, cy), (dx, dy) = segment2
+    return min(_point_segment_distance(ax, ay, cx, cy, dx, dy), _point_segment_distance(bx, by, cx, cy, dx, dy),
+               _point_segment_distance(cx, cy, ax, ay, bx, by), _point_segment_distance(dx, dy, ax, ay, bx, by))
 
 if __name__ == '__main__':
 
@@ -182,6 +338,18 @@ if __name__ == '__main__':
                             assert False, f'Intersection not expected between {a} and {b}.'
 
 
+    def test_segments_intersect(center: List[Tuple[int]], segments: List[Tuple[int]],
+                                result: List[List[List[bool]]]):
+        # the same segments as test_do_segments_intersect, all tested in one batch
+        offsets = np.array([(40, 0), (0, 40), (100, 0), (0, 100), (0, 120), (120, 0)])
+        centers = np.asarray(center, dtype=np.float64)[:, None]
+        batch = np.stack([centers + offsets, centers - offsets], axis=2).reshape(-1, 2, 2)
+        found = segments_intersect(batch, as_segments(segments)).reshape(len(center), len(offsets), len(segments))
+        mismatches = np.argwhere(found != np.asarray(result, dtype=bool))
+        assert not len(mismatches), f'segments_intersect differs from the expected results at (center, segment, ' \
+                                    f'wall) {mismatches[:5].tolist()}'
+
+
     def test_segment_distance(center: List[Tuple[int]], segments: List[Tuple[int]], result: List[List[float]]):
         for i in range(len(center)):
             for j, s in enumerate([(40, 0), (0, 40), (100, 0), (0, 100), (0, 120), (120, 0)]):
@@ -201,6 +369,10 @@ if __name__ == '__main__':
         config = drone.get_config()
 
         touch_wall_result = does_drone_touch_wall(drone, walls, 0)
+        indexed_result = does_drone_touch_wall(drone, WallIndex.for_drone(walls, drone, 0), 0)
+        assert indexed_result == touch_wall_result, \
+            f'does_drone_touch_wall with a WallIndex returns {indexed_result} for drone config {config}, ' \
+            f'expected: {touch_wall_result}'
         touch_goal_result = does_drone_touch_goal(drone, goals)
         in_window_result = is_drone_within_window(drone, window, 0)
 
@@ -234,6 +406,7 @@ if __name__ == '__main__':
     segments = walls
     test_point_segment_distance(centers, segments, point_segment_distance_result)
     test_do_segments_intersect(centers, segments, is_intersect_result)
+    test_segments_intersect(centers, segments, is_intersect_result)
     test_segment_distance(centers, segments, segment_distance_result)
 
     for i in range(len(drone_positions)):
@@ -0,0 +1,371 @@
+# hierarchy.py
+# ---------------
+
+"""
+This file contains the contraction hierarchy of a static maze, for answering many path queries.
+"""
+
+from collections import OrderedDict, namedtuple
+import hashlib
+import heapq
+import math
+import os
+import tempfile
+import time
+import zipfile
+import numpy as np
+from utils import EPSILON
+
+# Witness searches stop after settling this many nodes or following this many edges.
+# Stopping early only adds shortcuts that were not needed, it never breaks shortest paths.
+WITNESS_SETTLE_LIMIT = 64
+WITNESS_HOP_LIMIT = 8
+# tighter limits for the witness searches that only estimate the priority of a node
+PRIORITY_SETTLE_LIMIT = 8
+PRIORITY_HOP_LIMIT = 2
+# number of hierarchies of mazes without a stored file that for_maze keeps in memory
+BUILT_CACHE_SIZE = 8
+
+
+class HierarchyError(Exception):
+    pass
+
+
+# what loading a missing, truncated or corrupt hierarchy file may raise, for_maze rebuilds it
+LOAD_ERRORS = (HierarchyError, OSError, EOFError, ValueError, KeyError, zipfile.BadZipFile)
+
+# result of benchmark: size of the hierarchy, and the wall time in seconds of the build
+# and of one query on average
+HierarchyBenchmark = namedtuple('HierarchyBenchmark', ['nodes', 'edges', 'build_seconds', 'query_seconds'])
+
+# hierarchies for_maze built without storing them, by fingerprint, least recently used first
+built_hierarchies = OrderedDict()
+
+
+def hierarchy_path(maze_path):
+    """Returns the file path of the hierarchy stored next to a compiled maze file"""
+    return os.path.splitext(maze_path)[0] + '.ch.npz'
+
+
+def cached_hierarchy_path(fingerprint, directory):
+    """Returns the file path of the hierarchy of a maze without a file, keyed by its maze_fingerprint"""
+    return os.path.join(directory, fingerprint + '.ch.npz')
+
+
+def maze_fingerprint(maze, heads, tails):
+    """Hash of the maze graph, used to detect a hierarchy file that no longer matches its maze"""
+    digest = hashlib.sha1(heads.tobytes() + tails.tobytes())
+    digest.update(str((maze.getDimensions(), maze.connectivity)).encode())
+    return digest.hexdigest()
+
+
+class ContractionHierarchy:
+    def __init__(self, cells, rank, indptr, tails, weights, middles, fingerprint):
+        """Initialize a contraction hierarchy, use build or load to create one
+
+        Args:
+            cells (ndarray): (n, 3) grid cell of each node
+            rank (ndarray): (n,) contraction order of each node
+            indptr, tails, weights, middles (ndarray): upward edges in CSR form, every edge leads
+                to a node of higher rank. middles holds the node a shortcut skips over, or -1
+                for an edge of the maze
+            fingerprint (str): maze_fingerprint of the maze the hierarchy was built from
+        """
+        heads = np.repeat(np.arange(len(rank)), np.diff(indptr))
+        if (rank[tails] <= rank[heads]).any():
+            raise HierarchyError('hierarchy has edges that do not lead up the contraction order')
+        self.cells = cells
+        self.rank = rank
+        self.indptr = indptr
+        self.tails = tails
+        self.weights = weights
+        self.middles = middles
+        self.fingerprint = fingerprint
+        self.nodes = {cell: node for node, cell in enumerate(map(tuple, cells.tolist()))}
+        self.__upward = [list(zip(tails[indptr[v]:indptr[v + 1]].tolist(), weights[indptr[v]:indptr[v + 1]].tolist()))
+                         for v in range(len(cells))]
+        self.__middle = {}
+        for v in range(len(cells)):
+            for k in range(indptr[v], indptr[v + 1]):
+                self.__middle[(v, int(tails[k]))] = self.__middle[(int(tails[k]), v)] = int(middles[k])
+
+    @classmethod
+    def build(cls, maze, edges=None):
+        """Contract every node of the maze graph (part 1 only)
+
+        Args:
+            maze (Maze): maze to preprocess
+            edges (tuple): (heads, tails, costs) from maze.getEdges(), computed if not given
+
+        Returns:
+            ContractionHierarchy
+        """
+        heads, tails, costs = maze.getEdges() if edges is None else edges
+        indices, compact = np.unique(np.concatenate((heads, tails)), return_inverse=True)
+        n = len(indices)
+        adjacency = [{} for _ in range(n)]
+        for a, b, cost in zip(compact[:len(heads)].tolist(), compact[len(heads):].tolist(), costs.tolist()):
+            adjacency[a][b] = cost
+        middle = {}
+
+        def shortcuts(v, settle_limit=WITNESS_SETTLE_LIMIT, hop_limit=WITNESS_HOP_LIMIT):
+            # pairs of neighbors whose only shortest connection runs through v
+            needed = []
+            neighbors = list(adjacency[v].items())
+            for i, (u, to_u) in enumerate(neighbors[:-1]):
+                # a direct edge no longer than the way through v is a witness, most pairs in
+                # a grid have one and need no search
+                direct = adjacency[u]
+                targets = {w: to_u + to_w for w, to_w in neighbors[i + 1:]
+                           if direct.get(w, math.inf) > to_u + to_w + EPSILON}
+                if not targets:
+                    continue
+                limit = max(targets.values()) + EPSILON
+                remaining = len(targets)
+                # v is never relaxed, witnesses avoid it
+                dist = {u: 0, v: -math.inf}
+                frontier = [(0, 0, u)]
+                settled = 0
+                while frontier and settled < settle_limit:
+                    d, hops, x = heapq.heappop(frontier)
+                    if d > dist[x]:
+                        continue
+                    settled += 1
+                    if x in targets:
+                        remaining -= 1
+                        if not remaining:
+                            break
+                    if hops == hop_limit:
+                        continue
+                    for y, cost in adjacency[x].items():
+                        cost += d
+                        if cost <= limit and cost < dist.get(y, math.inf):
+                            dist[y] = cost
+                            heapq.heappush(frontier, (cost, hops + 1, y))
+                for w, through in targets.items():
+                    if dist.get(w, math.inf) > through + EPSILON:
+                        needed.append((u, w, through))
+            return needed
+
+        # priority is the edge difference, plus the number of contracted neighbors to spread
+        # contractions evenly over the maze
+        deleted = [0] * n
+
+        def priority(needed, v):
+            return len(needed) - len(adjacency[v]) + deleted[v]
+
+        def estimate(v):
+            return priority(shortcuts(v, PRIORITY_SETTLE_LIMIT, PRIORITY_HOP_LIMIT), v)
+
+        queue = [(estimate(v), v) for v in range(n)]
+        heapq.heapify(queue)
+        # nodes whose neighborhood changed since their priority was estimated
+        changed = [False] * n
+        rank = np.zeros(n, dtype=np.int64)
+        upward = [None] * n
+        order = 0
+        while queue:
+            _, v = heapq.heappop(queue)
+            # lazy update: contract v only if it is still the best candidate
+            if changed[v]:
+                changed[v] = False
+                current = estimate(v)
+                if queue and current > queue[0][0]:
+                    heapq.heappush(queue, (current, v))
+                    continue
+            needed = shortcuts(v)
+
+            rank[v] = order
+            order += 1
+            upward[v] = [(u, cost, middle.get((v, u), -1)) for u, cost in adjacency[v].items()]
+            for u, w, cost in needed:
+                if cost < adjacency[u].get(w, math.inf):
+                    adjacency[u][w] = adjacency[w][u] = cost
+                    middle[(u, w)] = middle[(w, u)] = v
+            for u in adjacency[v]:
+                del adjacency[u][v]
+                deleted[u] += 1
+                changed[u] = True
+            adjacency[v] = {}
+
+        counts = [len(edges) for edges in upward]
+        indptr = np.concatenate(([0], np.cumsum(counts))).astype(np.int64)
+        edges = [edge for edges in upward for edge in edges]
+        tails_up = np.array([u for u, _, _ in edges], dtype=np.int64)
+        weights = np.array([cost for _, cost, _ in edges], dtype=np.float64)
+        middles = np.array([mid for _, _, mid in edges], dtype=np.int64)
+        cells = np.array([maze.getCell(index) for index in indices.tolist()], dtype=np.int64).reshape(-1, 3)
+        return cls(cells, rank, indptr, tails_up, weights, middles, maze_fingerprint(maze, heads, tails))
+
+    @classmethod
+    def for_maze(cls, maze, path=None, directory=None):
+        """Load the stored hierarchy of a maze, or build and store it
+
+        Args:
+            maze (Maze): maze to preprocess
+            path (str): hierarchy file, defaults to hierarchy_path(maze.filepath) next to the
+                maze file, or to cached_hierarchy_path in directory for a maze without one
+            directory (str): where hierarchies of mazes without a file, e.g. from
+                transformToMaze, are kept by fingerprint. By default they are built
+                without storing, and the last BUILT_CACHE_SIZE are kept in memory
+
+        Returns:
+            ContractionHierarchy
+        """
+        edges = maze.getEdges()
+        fingerprint = maze_fingerprint(maze, *edges[:2])
+        if path is None and maze.filepath:
+            path = hierarchy_path(maze.filepath)
+        elif path is None and directory is not None:
+            path = cached_hierarchy_path(fingerprint, directory)
+        if not path:
+            if fingerprint in built_hierarchies:
+                built_hierarchies.move_to_end(fingerprint)
+                return built_hierarchies[fingerprint]
+            built_hierarchies[fingerprint] = hierarchy = cls.build(maze, edges)
+            if len(built_hierarchies) > BUILT_CACHE_SIZE:
+                built_hierarchies.popitem(last=False)
+            return hierarchy
+        if os.path.exists(path):
+            try:
+                hierarchy = cls.load(path)
+            except LOAD_ERRORS:
+                hierarchy = None
+            if hierarchy is not None and hierarchy.fingerprint == fingerprint:
+                return hierarchy
+        hierarchy = cls.build(maze, edges)
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        hierarchy.save(path)
+        return hierarchy
+
+    def save(self, path):
+        """Save the hierarchy to an .npz file
+
+        The file is written next to path and moved into place, so an interrupted save never
+        leaves a partial file at path.
+        """
+        handle, temporary = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(os.path.abspath(path)))
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                np.savez(f, cells=self.cells, rank=self.rank, indptr=self.indptr, tails=self.tails,
+                         weights=self.weights, middles=self.middles, fingerprint=np.array(self.fingerprint))
+            os.replace(temporary, path)
+        except BaseException:
+            os.remove(temporary)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """Load a hierarchy saved with save"""
+        with np.load(path) as data:
+            return cls(data['cells'], data['rank'], data['indptr'], data['tails'], data['weights'],
+                       data['middles'], str(data['fingerprint']))
+
+    def query(self, start, objectives):
+        """Find a shortest path from start to the nearest objective
+
+        Args:
+            start (tuple): (x, y, z) start cell
+            objectives (list): (x, y, z) objective cells
+
+        Returns:
+            tuple: (list of cells, path cost), or None if there is no path
+        """
+        if start in objectives:
+            return [start], 0
+        if start not in self.nodes:
+            return None
+        targets = [self.nodes[cell] for cell in objectives if cell in self.nodes]
+
+        # forward search from the start, backward search from every objective at once
+        n = len(self.rank)
+        dist = ([math.inf] * n, [math.inf] * n)
+        parent = ([None] * n, [None] * n)
+        dist[0][self.nodes[start]] = 0
+        for node in targets:
+            dist[1][node] = 0
+        frontier = ([(0, self.nodes[start])], [(0, node) for node in targets])
+        upward = self.__upward
+        best, meeting = math.inf, None
+        while frontier[0] or frontier[1]:
+            for side in (0, 1):
+                queue, own, other = frontier[side], dist[side], dist[1 - side]
+                if not queue:
+                    continue
+                d, v = heapq.heappop(queue)
+                if d > own[v]:
+                    continue
+                if d >= best:
+                    queue.clear()
+                    continue
+                if d + other[v] < best:
+                    best, meeting = d + other[v], v
+                # stall-on-demand: v is reached more cheaply through a higher node, so the
+                # upward search does not need to continue from it
+                for u, cost in upward[v]:
+                    if own[u] + cost < d:
+                        break
+                else:
+                    for u, cost in upward[v]:
+                        cost += d
+                        if cost < own[u]:
+                            own[u] = cost
+                            parent[side][u] = v
+                            heapq.heappush(queue, (cost, u))
+        if meeting is None:
+            return None
+
+        up, down = [meeting], [meeting]
+        while parent[0][up[-1]] is not None:
+            up.append(parent[0][up[-1]])
+        while parent[1][down[-1]] is not None:
+            down.append(parent[1][down[-1]])
+        nodes = up[::-1] + down[1:]
+        path = [nodes[0]]
+        for a, b in zip(nodes, nodes[1:]):
+            path.extend(self.unpack(a, b))
+        return [tuple(cell) for cell in self.cells[path].tolist()], best
+
+    def unpack(self, a, b):
+        """Returns the nodes of the maze path an edge a-b stands for, excluding a"""
+        stack, nodes = [(a, b)], []
+        while stack:
+            a, b = stack.pop()
+            mid = self.__middle[(a, b)]
+            if mid < 0:
+                nodes.append(b)
+            else:
+                stack.append((mid, b))
+                stack.append((a, mid))
+        return nodes
+
+
+def benchmark(maze, queries=200, rng=None):
+    """Time building the hierarchy of a maze and querying it between random cells
+
+    Returns:
+        HierarchyBenchmark
+    """
+    rng = np.random.default_rng(0) if rng is None else rng
+    began = time.perf_counter()
+    hierarchy = ContractionHierarchy.build(maze)
+    build_seconds = time.perf_counter() - began
+    ends = hierarchy.cells[rng.integers(0, len(hierarchy.cells), (queries, 2))].tolist()
+    began = time.perf_counter()
+    for start, objective in ends:
+        hierarchy.query(tuple(start), [tuple(objective)])
+    return HierarchyBenchmark(len(hierarchy.rank), len(hierarchy.tails), build_seconds,
+                              (time.perf_counter() - began) / queries)
+
+
+if __name__ == '__main__':
+    from maze import Maze
+
+    print('{0:>12} {1:>8} {2:>8} {3:>10} {4:>10}'.format('connectivity', 'nodes', 'edges', 'build s', 'query ms'))
+    for connectivity in (6, 18, 26):
+        grid = np.where(np.random.default_rng(0).random((40, 40, 6)) < 0.3, '%', ' ').astype(object)
+        grid[0, 0, 0], grid[-1, -1, -1] = 'P', '.'
+        result = benchmark(Maze(grid.tolist(), None, connectivity=connectivity))
+        print('{0:>12} {1:>8} {2:>8} {3:>10.2f} {4:>10.3f}'.format(connectivity, result.nodes, result.edges,
+                                                                  result.build_seconds, result.query_seconds * 1e3))
@@ -0,0 +1,290 @@
+"""
+Integrators for the quadrotor dynamics, selected with the method of simulation.simulate.
+"""
+
+import time
+from collections import namedtuple
+import numpy as np
+from simulation import DEFAULT_DT, DEFAULT_PARAMS, TELEMETRY_WIDTH, rotation_matrices, simulate, telemetry_views
+from TrajectoryGenerator import derivative, polyval
+from utils import EPSILON
+
+# layout of a state: position and attitude, then their rates of change
+STATE_WIDTH = 12
+POS, ATT, VEL, RATES = slice(0, 3), slice(3, 6), slice(6, 9), slice(9, 12)
+# the first half of the state is integrated with the updated second half by semi-implicit Euler
+HALF = STATE_WIDTH // 2
+
+DEFAULT_RTOL = 1e-6
+DEFAULT_ATOL = 1e-9
+# adaptive steps grow or shrink by at most these factors
+MIN_FACTOR, MAX_FACTOR, SAFETY = 0.2, 5.0, 0.9
+
+# Dormand-Prince 5(4) tableau
+DP_C = np.array([0, 1 / 5, 3 / 10, 4 / 5, 8 / 9, 1, 1])
+DP_A = [[],
+        [1 / 5],
+        [3 / 40, 9 / 40],
+        [44 / 45, -56 / 15, 32 / 9],
+        [19372 / 6561, -25360 / 2187, 64448 / 6561, -212 / 729],
+        [9017 / 3168, -355 / 33, 46732 / 5247, 49 / 176, -5103 / 18656],
+        [35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84]]
+DP_B5 = np.array([35 / 384, 0, 500 / 1113, 125 / 192, -2187 / 6784, 11 / 84, 0])
+DP_B4 = np.array([5179 / 57600, 0, 7571 / 16695, 393 / 640, -92097 / 339200, 187 / 2100, 1 / 40])
+
+# one line of benchmark: the method of simulate ('simulate' for its own stepping), its step
+# (or relative tolerance for rk45), the number of steps taken, the final position error
+# and the wall time in seconds
+BenchmarkRow = namedtuple('BenchmarkRow', ['method', 'setting', 'steps', 'error', 'seconds'])
+
+
+class Reference:
+    def __init__(self, coeffs, durations):
+        """Desired position, velocity and acceleration of a trajectory at any time since its start
+
+        Args:
+            coeffs: (N, 3, 6) trajectory coefficients
+            durations: duration of every segment, a float or (N,) array
+        """
+        self.coeffs = np.asarray(coeffs, dtype=np.float64).reshape(-1, 3, 6)
+        self.velocity = derivative(self.coeffs)
+        self.acceleration = derivative(self.velocity)
+        self.durations = np.broadcast_to(np.asarray(durations, dtype=np.float64), (len(self.coeffs),))
+        self.ends = np.cumsum(self.durations)
+
+    def __call__(self, t):
+        # the trajectory holds its last state after the end
+        i = min(int(np.searchsorted(self.ends, t, side='right')), len(self.coeffs) - 1)
+        local = min(t - (self.ends[i] - self.durations[i]), self.durations[i])
+        return polyval(self.coeffs[i], local), polyval(self.velocity[i], local), polyval(self.acceleration[i], local)
+
+
+def controller(reference, params=DEFAULT_PARAMS):
+    """The controller of simulate, for any number of states
+
+    Args:
+        reference (Reference): trajectory to follow
+        params (Params): parameters, fields may be (N,) arrays for N states
+
+    Returns:
+        control(t, states) for (..., STATE_WIDTH) states, giving the thrust (...), the
+        torques (..., 3) and the desired position, velocity and acceleration at t
+    """
+    g, m = np.asarray(params.g, dtype=np.float64), np.asarray(params.m, dtype=np.float64)
+    gains = np.stack(np.broadcast_arrays(*(np.asarray(value, dtype=np.float64) for value in (params.Kp_roll, params.Kp_pitch, params.Kp_yaw))), axis=-1)
+    Kp_z, Kd_z = params.Kp_z, params.Kd_z
+    des_yaw = 0
+
+    def control(t, states):
+        desired = des_pos, des_vel, des_acc = reference(t)
+        pos, att, vel = states[..., POS], states[..., ATT], states[..., VEL]
+        thrust = m * (g + des_acc[2] + Kp_z * (des_pos[2] - pos[..., 2]) + Kd_z * (des_vel[2] - vel[..., 2]))
+        attitude = np.stack(np.broadcast_arrays((des_acc[0] * np.sin(des_yaw) - des_acc[1] * np.cos(des_yaw)) / g,
+                                                (des_acc[0] * np.cos(des_yaw) - des_acc[1] * np.sin(des_yaw)) / g,
+                                                np.full_like(g, des_yaw)), axis=-1)
+        return thrust, gains * (attitude - att), desired
+
+    return control
+
+
+def closed_loop(reference, params=DEFAULT_PARAMS):
+    """State derivative of the controlled quadrotor, the controller of simulate applied continuously
+
+    Args:
+        reference (Reference): trajectory to follow
+        params (Params): parameters, fields may be (N,) arrays for N states
+
+    Returns:
+        f(t, states) for (..., STATE_WIDTH) states
+    """
+    g, m = np.asarray(params.g, dtype=np.float64), np.asarray(params.m, dtype=np.float64)
+    inertia = np.stack(np.broadcast_arrays(*(np.asarray(value, dtype=np.float64) for value in (params.Ixx, params.Iyy, params.Izz))), axis=-1)
+    control = controller(reference, params)
+
+    def f(t, states):
+        thrust, torques, _ = control(t, states)
+        att, vel = states[..., ATT], states[..., VEL]
+        rotation = rotation_matrices(att[..., 0], att[..., 1], att[..., 2])
+        acc = rotation[..., :, 2] * (thrust / m)[..., None]
+        acc[..., 2] -= g
+        return np.concatenate(np.broadcast_arrays(vel, states[..., RATES], acc, torques / inertia), axis=-1)
+
+    return f
+
+
+def euler_step(f, t, y, h):
+    """Explicit Euler, every part of the state advances with the derivative at the start of the step"""
+    return y + h * f(t, y)
+
+
+def semi_implicit_euler_step(f, t, y, h):
+    """Semi-implicit Euler: the rates advance first, then the positions advance with the new rates"""
+    rates = y[..., HALF:] + h * f(t, y)[..., HALF:]
+    return np.concatenate([y[..., :HALF] + h * rates, rates], axis=-1)
+
+
+def rk4_step(f, t, y, h):
+    """Classic fourth order Runge-Kutta step"""
+    k1 = f(t, y)
+    k2 = f(t + h / 2, y + h / 2 * k1)
+    k3 = f(t + h / 2, y + h / 2 * k2)
+    k4 = f(t + h, y + h * k3)
+    return y + h / 6 * (k1 + 2 * k2 + 2 * k3 + k4)
+
+
+INTEGRATORS = {'euler': euler_step, 'semi_implicit_euler': semi_implicit_euler_step, 'rk4': rk4_step}
+
+
+def integrate_fixed(f, y0, t0, t1, h, method='rk4'):
+    """Integrate from t0 to t1 with a fixed step, shortened so the last step ends at t1
+
+    Returns:
+        times (K,), states (K, ...)
+    """
+    step = INTEGRATORS[method]
+    count = max(1, int(np.ceil((t1 - t0) / h - EPSILON)))
+    h = (t1 - t0) / count
+    times = t0 + h * np.arange(count + 1)
+    y = np.asarray(y0, dtype=np.float64)
+    states = np.empty((count + 1,) + y.shape)
+    states[0] = y
+    for i in range(count):
+        y = step(f, times[i], y, h)
+        states[i + 1] = y
+    return times, states
+
+
+def integrate_rk45(f, y0, t0, t1, h=DEFAULT_DT, rtol=DEFAULT_RTOL, atol=DEFAULT_ATOL):
+    """Integrate from t0 to t1 with Dormand-Prince 5(4), controlling the local error
+
+    The step is accepted when the scaled difference of the embedded fourth and fifth order
+    solutions is at most 1, and resized from that error after every attempt.
+
+    Returns:
+        times (K,), states (K, ...), number of derivative evaluations
+    """
+    y = np.asarray(y0, dtype=np.float64)
+    t = t0
+    times, states = [t], [y]
+    k1 = f(t, y)
+    evaluations = 1
+    while t < t1:
+        h = min(h, t1 - t)
+        k = [k1]
+        for stage in range(1, 7):
+            k.append(f(t + DP_C[stage] * h, y + h * sum(a * ki for a, ki in zip(DP_A[stage], k))))
+        evaluations += 6
+        y5 = y + h * sum(b * ki for b, ki in zip(DP_B5, k))
+        y4 = y + h * sum(b * ki for b, ki in zip(DP_B4, k))
+        scale = atol + rtol * np.maximum(np.abs(y), np.abs(y5))
+        error = np.sqrt(np.mean(((y5 - y4) / scale) ** 2))
+        if error <= 1:
+            # the last stage is the derivative at the accepted state
+            t, y, k1 = t + h, y5, k[6]
+            times.append(t)
+            states.append(y)
+        h *= min(MAX_FACTOR, max(MIN_FACTOR, SAFETY * error ** -0.2)) if error > 0 else MAX_FACTOR
+    return np.array(times), np.array(states), evaluations
+
+
+def initial_state(start, count=None):
+    """State at rest at a start position, (STATE_WIDTH,) or (count, STATE_WIDTH)"""
+    state = np.zeros(STATE_WIDTH if count is None else (count, STATE_WIDTH))
+    state[..., POS] = start
+    return state
+
+
+def simulate_integrated(coeffs, durations, start=None, method='rk4', h=DEFAULT_DT, params=DEFAULT_PARAMS,
+                        rtol=DEFAULT_RTOL, atol=DEFAULT_ATOL, recorder=None):
+    """Fly a trajectory with the chosen integrator, see simulation.simulate
+
+    Args:
+        coeffs: (N, 3, 6) trajectory coefficients
+        durations: duration of every segment
+        start: (x, y, z) initial position, or (M, 3) for M vehicles, the start of the trajectory by default
+        method (str): 'euler', 'semi_implicit_euler', 'rk4' or 'rk45'
+        h (float): step, the first step for rk45
+        params (Params): vehicle and controller parameters
+        rtol, atol (float): tolerances of rk45
+        recorder (TelemetryRecorder): also writes the rows to a file, for one vehicle only
+
+    Returns:
+        Telemetry, one row per integrator step, with a vehicle axis after the step axis for M vehicles
+    """
+    if method != 'rk45' and method not in INTEGRATORS:
+        raise ValueError('unknown method {0}, expected rk45 or one of {1}'.format(method, list(INTEGRATORS)))
+    if recorder is not None and start is not None and np.ndim(start) > 1:
+        raise ValueError('telemetry files hold one vehicle, got {0} starts'.format(len(start)))
+    reference = Reference(coeffs, durations)
+    if start is None:
+        start = reference(0)[0] if len(reference.coeffs) else (0, 0, 0)
+    start = np.asarray(start, dtype=np.float64)
+    y0 = initial_state(start, None if start.ndim == 1 else len(start))
+    f = closed_loop(reference, params)
+    if not len(reference.coeffs):
+        # like simulate, without segments the only row is the start
+        times, states = np.zeros(1), y0[None]
+    elif method == 'rk45':
+        times, states = integrate_rk45(f, y0, 0, reference.ends[-1], h, rtol, atol)[:2]
+    else:
+        times, states = integrate_fixed(f, y0, 0, reference.ends[-1], h, method)
+
+    # the rows of simulate: the state, the controls computed from it and the reference at every time
+    data = np.zeros(states.shape[:-1] + (TELEMETRY_WIDTH,))
+    telemetry = telemetry_views(data)
+    control = controller(reference, params)
+    for k, t in enumerate(times.tolist() if len(reference.coeffs) else []):
+        thrust, torques, (des_pos, des_vel, des_acc) = control(t, states[k])
+        telemetry.thrust[k], telemetry.torques[k] = thrust, torques
+        telemetry.des_pos[k], telemetry.des_vel[k], telemetry.des_acc[k] = des_pos, des_vel, des_acc
+    data[..., 0] = times.reshape((-1,) + (1,) * (data.ndim - 2))
+    # the reference runs on the same clock as the flight
+    telemetry.ref_t[:] = telemetry.t
+    telemetry.pos[:], telemetry.vel[:] = states[..., POS], states[..., VEL]
+    telemetry.att[:], telemetry.rates[:] = states[..., ATT], states[..., RATES]
+    if recorder is not None:
+        recorder.append(data)
+    return telemetry
+
+
+def benchmark(coeffs, durations, steps=(0.2, 0.1, 0.05, 0.02, 0.01), tolerances=(1e-3, 1e-5, 1e-7),
+              params=DEFAULT_PARAMS):
+    """Final position error against wall time of every method of simulate
+
+    The error is measured against an rk45 solution with very tight tolerances, at the time
+    the flight ended, the t of the last telemetry row. simulate flies every segment in whole
+    steps and drops the rest of it, so its error also includes that timing error.
+
+    Returns:
+        list of BenchmarkRow
+    """
+    reference = Reference(coeffs, durations)
+    f = closed_loop(reference, params)
+    y0 = initial_state(reference(0)[0])
+    exact = {}
+
+    def row(method, setting, **options):
+        began = time.perf_counter()
+        telemetry = simulate(coeffs, durations, params=params, method=method, **options)
+        seconds = time.perf_counter() - began
+        # physical time, the trajectory is held at its end after it
+        end = float(telemetry.t[-1])
+        if end not in exact:
+            exact[end] = integrate_rk45(f, y0, 0, end, rtol=1e-11, atol=1e-13)[1][-1][POS]
+        return BenchmarkRow(method or 'simulate', setting, len(telemetry.t) - 1,
+                            float(np.linalg.norm(telemetry.pos[-1] - exact[end])), seconds)
+
+    rows = [row(method, h, dt=h) for method in (None,) + tuple(INTEGRATORS) for h in steps]
+    rows += [row('rk45', rtol, rtol=rtol, atol=rtol * 1e-3) for rtol in tolerances]
+    return rows
+
+
+if __name__ == '__main__':
+    from trajectory_planning import plan_trajectory
+
+    plan = plan_trajectory([[-5, -5, 5], [5, -5, 5], [5, 5, 5], [-5, 5, 5]], 2, 2)
+    print('{0:<20} {1:>8} {2:>12} {3:>12} {4:>10}'.format('method', 'step/tol', 'steps', 'error', 'ms'))
+    with np.errstate(all='ignore'):
+        for row in benchmark(plan.coeffs, plan.durations):
+            print('{0:<20} {1:>8g} {2:>12} {3:>12.3e} {4:>10.2f}'.format(row.method, row.setting, row.steps,
+                                                                       row.error, row.seconds * 1e3))
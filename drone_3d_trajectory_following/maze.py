@@ -31,7 +31,7 @@ class NoObjectiveError(Exception):
 
 class Maze:
     def __init__(self, input_map, alien, mst_cache={}, granularity=DEFAULT_GRANULARITY, offsets=[0, 0, 0], filepath=None,
-                 use_heuristic=True):
+                 use_heuristic=True, connectivity=DEFAULT_CONNECTIVITY):
         """Initialize the Maze class
 
         Args:
@@ -40,12 +40,19 @@ class Maze:
             alien (Alien): the Alien instance
             offsets (list): list of offsets to make the maze start at (0,0,0) Ignore for this mp
             filepath (str): file path to the ASCII maze
+            connectivity (int): number of neighbors of a cell, 6, 18 or 26 (part 1 only)
         """        
+        if connectivity not in CONNECTIVITIES:
+            raise MazeError('connectivity must be one of {0} (got {1})'.format(CONNECTIVITIES, connectivity))
+        self.connectivity = connectivity
         self.states_explored = 0
+        # memory high-water mark of the last search, the largest number of states it held at once
+        self.peak_states = 0
         self.use_heuristic = use_heuristic
         self.mst_cache = mst_cache
         self.alien = alien
         self.__alien = alien
+        self.filepath = filepath
         if filepath:
             self.granularity = 0
             self.readFromFile(filepath)
@@ -78,6 +85,7 @@ class Maze:
 
         if not self.__objective:
             raise NoObjectiveError("Maze has no objectives")
+        self.__compileNeighborhood()
         self.__start = MazeState(self.__start, self.getObjectives(), 0, self, self.mst_cache, self.use_heuristic)
     
     def __getitem__(self, index):
@@ -151,8 +159,137 @@ class Maze:
             for k in range(h) if self[i, j, k] == OBJECTIVE_CHAR)
 
         # Converts start from tuple to a MazeState
+        self.__compileNeighborhood()
         self.__start = MazeState(self.__start, self.getObjectives(), 0, self, self.mst_cache, self.use_heuristic)
 
+    def __compileNeighborhood(self):
+        """Precompute the occupancy grid and the neighborhood as flat index deltas
+
+        The free cells are stored in a flattened boolean array padded with one layer of walls,
+        so a neighbor is just `index + delta` and never needs a bounds check.
+        """
+        dims = np.array(self.__dimensions)
+        free = np.zeros(dims + 2, dtype=bool)
+        free[1:-1, 1:-1, 1:-1] = np.array(self.__map).reshape(dims) != WALL_CHAR
+        self.__free = free.ravel()
+        self.__strides = np.array([(dims[Y] + 2) * (dims[Z] + 2), dims[Z] + 2, 1])
+
+        self.__offsets, self.__costs, guards = neighborhood(self.connectivity)
+        self.__deltas = self.__offsets @ self.__strides
+        self.__guardDeltas = guards @ self.__strides
+        self.__labelComponents()
+
+    def __labelComponents(self):
+        """Label the connected components of the free space
+
+        Diagonal moves may not cut corners, so two cells joined by a diagonal move are also
+        joined through face neighbors and the 6-connected components are the components of
+        every connectivity. Components are found with a vectorized union-find: each round
+        hooks the larger root of every edge onto the smaller one, then compresses paths by
+        pointer jumping until each cell points at its root.
+        """
+        cells = np.flatnonzero(self.__free)
+        heads, tails = [], []
+        for delta in self.__strides:
+            connected = self.__free[cells + delta]
+            heads.append(cells[connected])
+            tails.append(cells[connected] + delta)
+        heads, tails = np.concatenate(heads), np.concatenate(tails)
+
+        parent = np.arange(self.__free.size)
+        while True:
+            a, b = parent[heads], parent[tails]
+            merge = a != b
+            if not merge.any():
+                break
+            np.minimum.at(parent, np.maximum(a, b)[merge], np.minimum(a, b)[merge])
+            while True:
+                grandparent = parent[parent]
+                if np.array_equal(grandparent, parent):
+                    break
+                parent = grandparent
+
+        # 0 marks walls, free cells get labels 1..n
+        self.__components = np.zeros(self.__free.size, dtype=np.int32)
+        self.__components[cells] = np.unique(parent[cells], return_inverse=True)[1] + 1
+        self.__objectiveComponents = frozenset(self.getComponent(*objective) for objective in self.__objective)
+
+    def getIndex(self, x, y, shape):
+        """Returns the flat index of a grid cell in the padded occupancy array (part 1 only)"""
+        return int((x + 1) * self.__strides[X] + (y + 1) * self.__strides[Y] + shape + 1)
+
+    def getCell(self, index):
+        """Returns the (x, y, z) grid cell of a flat index, the inverse of getIndex"""
+        x, rest = divmod(int(index), int(self.__strides[X]))
+        y, z = divmod(rest, int(self.__strides[Y]))
+        return (x - 1, y - 1, z - 1)
+
+    def areFree(self, cells):
+        """Vectorized part 1 check of which cells are not walls
+
+        Args:
+            cells (array_like): (n, 3) int array of (x, y, z) cells, cells outside the maze count as walls
+
+        Returns:
+            ndarray: (n,) bool array
+        """
+        cells = np.asarray(cells, dtype=np.int64).reshape(-1, 3)
+        inside = ((cells >= 0) & (cells < self.__dimensions)).all(axis=1)
+        return inside & self.__free[(np.where(inside[:, None], cells, -1) + 1) @ self.__strides]
+
+    def getEdges(self):
+        """Returns every move of the maze as flat index arrays (part 1 only)
+
+        Returns:
+            heads (ndarray): flat index of the cell each move starts from, sorted
+            tails (ndarray): flat index of the cell each move ends in
+            costs (ndarray): cost of each move
+        """
+        cells = np.flatnonzero(self.__free)
+        heads, tails, costs = [], [], []
+        for delta, guard, cost in zip(self.__deltas, self.__guardDeltas, self.__costs):
+            valid = self.__free[cells + delta] & self.__free[cells[:, None] + guard].all(axis=1)
+            heads.append(cells[valid])
+            tails.append(cells[valid] + delta)
+            costs.append(np.full(np.count_nonzero(valid), cost))
+        heads, tails, costs = np.concatenate(heads), np.concatenate(tails), np.concatenate(costs)
+        order = np.argsort(heads, kind='stable')
+        return heads[order], tails[order], costs[order]
+
+    def getComponent(self, x, y, shape):
+        """Returns the connected component label of a grid cell, 0 for walls (part 1 only)"""
+        return int(self.__components[self.getIndex(x, y, shape)])
+
+    def getComponents(self):
+        """Returns the component labels of every cell as an array of shape (num_rows, num_cols, levels)"""
+        dims = self.__dimensions
+        return self.__components.reshape(dims[X] + 2, dims[Y] + 2, dims[Z] + 2)[1:-1, 1:-1, 1:-1]
+
+    def canReachObjective(self, x, y, shape):
+        """Check in O(1) whether any objective lies in the same free space component as a cell (part 1 only)
+
+        Returns:
+            bool: False if no path from (x, y, shape) to an objective exists
+        """
+        return self.getComponent(x, y, shape) in self.__objectiveComponents
+
+    def getWeightedNeighbors(self, x, y, shape):
+        """Returns the neighbors of a grid cell together with the cost of moving there (part 1 only)
+
+        Args:
+            x (int): x
+            y (int): y
+            shape (int): z level
+
+        Returns:
+            list: list of ((x, y, z), cost) pairs
+        """
+        self.states_explored += 1
+        index = (x + 1) * self.__strides[X] + (y + 1) * self.__strides[Y] + shape + 1
+        valid = self.__free[index + self.__deltas] & self.__free[index + self.__guardDeltas].all(axis=1)
+        cells = (self.__offsets[valid] + (x, y, shape)).tolist()
+        return list(zip(map(tuple, cells), self.__costs[valid].tolist()))
+
     def getChar(self, x, y, shape, part1=False):
         """Getting underlying character at the specified coordinate
 
@@ -204,6 +341,7 @@ class Maze:
 
     def setObjectives(self, objectives):
         self.__objective = objectives
+        self.__objectiveComponents = frozenset(self.getComponent(*objective) for objective in objectives)
 
     def isValidMove(self, x, y, shape, part1=False):
         """Check if the agent can move into a specific coordinate
@@ -240,18 +378,10 @@ class Maze:
         Returns:
             list: list of possible neighbor positions, formatted as (x, y, shape) tuples.
         """        
-        self.states_explored += 1
         if part1:
-            i, j, k = x, y, shape
-            return tuple(x for x in (
-            (x + 1, y, k),
-            (i - 1, j, k),
-            (i, j + 1, k),
-            (i, j - 1, k),
-            (i, j, k - 1),
-            (i, j, k + 1)) 
-            if self.isValidMove( * x, True ))
+            return tuple(cell for cell, _ in self.getWeightedNeighbors(x, y, shape))
 
+        self.states_explored += 1
         possibleNeighbors = [
             (x + self.granularity, y,shape),
             (x - self.granularity, y,shape),
@@ -292,6 +422,7 @@ class Maze:
 
         with open(filename, 'w') as f:
             f.write(outputMap)
+        self.filepath = filename
 
         return True
             
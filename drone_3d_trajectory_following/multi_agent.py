@@ -0,0 +1,256 @@
+# multi_agent.py
+# ---------------
+
+"""
+This file contains space-time planning of several drones in one maze.
+"""
+
+import heapq
+import time
+from collections import deque, namedtuple
+from itertools import count
+import numpy as np
+
+# paths holds one list of (x, y, z) cells per drone, indexed by timestep (None if no plan was
+# found), cost is the sum of arrival times and agents_per_second the planning throughput
+Plan = namedtuple('Plan', ['paths', 'cost', 'agents_per_second', 'expansions'])
+
+DEFAULT_MAX_CBS_NODES = 10000
+
+
+class ReservationTable:
+    def __init__(self, size):
+        """Cells and moves that are taken at given timesteps
+
+        Reservations are hashed as single integers: a cell at timestep t is t * size + cell,
+        and a move from cell u to cell v between t and t + 1 is (t * size + u) * size + v,
+        where cells are flat maze indices.
+
+        Args:
+            size (int): number of flat maze indices
+        """
+        self.size = size
+        self.cells = set()
+        self.moves = set()
+        # last timestep each cell is reserved at, a drone may only stop on a cell after it
+        self.last = {}
+        # cells where a drone stays forever from the given timestep on
+        self.parked = {}
+
+    def copy(self):
+        table = ReservationTable(self.size)
+        table.cells = set(self.cells)
+        table.moves = set(self.moves)
+        table.last = dict(self.last)
+        table.parked = dict(self.parked)
+        return table
+
+    def reserve_cell(self, cell, t):
+        self.cells.add(t * self.size + cell)
+        self.last[cell] = max(self.last.get(cell, -1), t)
+
+    def reserve_move(self, u, v, t):
+        self.moves.add((t * self.size + u) * self.size + v)
+
+    def park(self, cell, t):
+        self.parked[cell] = min(self.parked.get(cell, t), t)
+
+    def is_free(self, u, v, t):
+        """Check whether moving from u (at t) to v (at t + 1) is allowed"""
+        return ((t + 1) * self.size + v not in self.cells
+                and (t * self.size + u) * self.size + v not in self.moves
+                and self.parked.get(v, np.inf) > t + 1)
+
+    def reserve_path(self, path):
+        """Reserve a planned path for the drones planned after it"""
+        for t, cell in enumerate(path):
+            self.reserve_cell(cell, t)
+            if t + 1 < len(path):
+                # another drone may not take the same move back at the same time
+                self.reserve_move(path[t + 1], cell, t)
+        self.park(path[-1], len(path) - 1)
+
+
+class SpaceTimePlanner:
+    def __init__(self, maze):
+        """Plan several drones through the free space of a maze (part 1 only)
+
+        Every drone moves one cell or waits per timestep, and no two drones may occupy the
+        same cell at the same timestep or swap cells in one step.
+
+        Args:
+            maze (Maze): maze the drones fly in, its start and objectives are ignored
+        """
+        self.maze = maze
+        dims = maze.getDimensions()
+        self.size = (dims[0] + 2) * (dims[1] + 2) * (dims[2] + 2)
+        heads, tails, _ = maze.getEdges()
+        indptr = np.searchsorted(heads, np.arange(self.size + 1))
+        self.neighbors = [tails[indptr[v]:indptr[v + 1]].tolist() for v in range(self.size)]
+        self.free_cells = np.count_nonzero(maze.areFree(np.argwhere(np.ones(dims, dtype=bool))))
+        self.__distances = {}
+        self.expansions = 0
+
+    def distances(self, goal):
+        """Number of moves from every cell to a goal, by breadth first search (-1 if unreachable)"""
+        if goal not in self.__distances:
+            dist = [-1] * self.size
+            dist[goal] = 0
+            queue = deque([goal])
+            while queue:
+                v = queue.popleft()
+                for u in self.neighbors[v]:
+                    if dist[u] < 0:
+                        dist[u] = dist[v] + 1
+                        queue.append(u)
+            self.__distances[goal] = dist
+        return self.__distances[goal]
+
+    def search(self, start, goal, reservations, horizon=None):
+        """Space-time A* from start to goal that avoids the reservations
+
+        Args:
+            start (int): flat index of the start cell
+            goal (int): flat index of the goal cell
+            reservations (ReservationTable): cells and moves this drone may not use
+            horizon (int): last timestep to search, defaults to twice the number of free cells
+
+        Returns:
+            list: flat index of the cell at every timestep, or None
+        """
+        h = self.distances(goal)
+        if h[start] < 0:
+            return None
+        if horizon is None:
+            horizon = 2 * self.free_cells + reservations.last.get(goal, 0)
+        # the drone stays on its goal, so it may only stop there after the last reservation
+        finish = max(reservations.last.get(goal, -1) + 1, 0)
+        size = self.size
+        parent = {start: None}
+        frontier = [(h[start], 0, start)]
+        while frontier:
+            _, t, v = heapq.heappop(frontier)
+            if v == goal and t >= finish and reservations.parked.get(goal, np.inf) > t:
+                key, path = t * size + v, []
+                while key is not None:
+                    path.append(key % size)
+                    key = parent[key]
+                return path[::-1]
+            if t >= horizon:
+                continue
+            self.expansions += 1
+            key = t * size + v
+            for u in self.neighbors[v] + [v]:
+                child = (t + 1) * size + u
+                if child not in parent and reservations.is_free(v, u, t):
+                    parent[child] = key
+                    heapq.heappush(frontier, (t + 1 + h[u], t + 1, u))
+        return None
+
+    def prioritized(self, agents, horizon=None):
+        """Plan drones one after another, each avoiding the ones planned before it
+
+        Args:
+            agents (list): ((x, y, z) start, (x, y, z) goal) of every drone, highest priority first
+            horizon (int): last timestep to search
+
+        Returns:
+            Plan
+        """
+        began = time.perf_counter()
+        self.expansions = 0
+        reservations = ReservationTable(self.size)
+        paths = []
+        for start, goal in agents:
+            path = self.search(self.maze.getIndex(*start), self.maze.getIndex(*goal), reservations, horizon)
+            if path is not None:
+                reservations.reserve_path(path)
+            paths.append(path)
+        return self.__plan(paths, began)
+
+    def cbs(self, agents, horizon=None, max_nodes=DEFAULT_MAX_CBS_NODES):
+        """Plan drones with conflict-based search, which minimizes the sum of arrival times
+
+        Every drone is planned alone, then the earliest conflict between two drones is
+        resolved by branching on which of the two must avoid the conflicting cell or move.
+
+        Args:
+            agents (list): ((x, y, z) start, (x, y, z) goal) of every drone
+            horizon (int): last timestep to search
+            max_nodes (int): give up after expanding this many nodes of the constraint tree
+
+        Returns:
+            Plan, with paths None if no conflict free plan was found
+        """
+        began = time.perf_counter()
+        self.expansions = 0
+        starts = [self.maze.getIndex(*start) for start, _ in agents]
+        goals = [self.maze.getIndex(*goal) for _, goal in agents]
+        constraints = [ReservationTable(self.size) for _ in agents]
+        paths = [self.search(s, g, c, horizon) for s, g, c in zip(starts, goals, constraints)]
+        if any(path is None for path in paths):
+            return self.__plan([None] * len(agents), began)
+
+        tiebreak = count()
+        tree = [(sum(map(len, paths)), next(tiebreak), constraints, paths)]
+        for _ in range(max_nodes):
+            if not tree:
+                break
+            _, _, constraints, paths = heapq.heappop(tree)
+            conflict = self.first_conflict(paths)
+            if conflict is None:
+                return self.__plan(paths, began)
+            for agent, (u, v), t in conflict:
+                table = constraints[agent].copy()
+                if u == v:
+                    table.reserve_cell(v, t + 1)
+                else:
+                    table.reserve_move(u, v, t)
+                path = self.search(starts[agent], goals[agent], table, horizon)
+                if path is not None:
+                    child_constraints = constraints[:agent] + [table] + constraints[agent + 1:]
+                    child_paths = paths[:agent] + [path] + paths[agent + 1:]
+                    heapq.heappush(tree, (sum(map(len, child_paths)), next(tiebreak), child_constraints, child_paths))
+        return self.__plan([None] * len(agents), began)
+
+    @staticmethod
+    def first_conflict(paths):
+        """Find the earliest conflict between two paths
+
+        Returns:
+            None, or two (agent, (u, v), t) branches: the agent may not move from u (at t) to v
+            (at t + 1). u == v stands for the agent being at v at t + 1 at all.
+        """
+        length = max(map(len, paths))
+        # drones wait on their goal once they arrive
+        positions = np.array([path + [path[-1]] * (length - len(path)) for path in paths])
+        i, j = np.triu_indices(len(paths), 1)
+        a, b = positions[i], positions[j]
+        vertex = a[:, 1:] == b[:, 1:]
+        swap = (a[:, :-1] == b[:, 1:]) & (a[:, 1:] == b[:, :-1]) & (a[:, :-1] != a[:, 1:])
+        conflicts = vertex | swap
+        if not conflicts.any():
+            return None
+        pair, t = np.unravel_index(np.argmax(conflicts.T), conflicts.T.shape)[::-1]
+        i, j = int(i[pair]), int(j[pair])
+        if vertex[pair, t]:
+            cell = int(positions[i, t + 1])
+            return [(i, (cell, cell), t), (j, (cell, cell), t)]
+        return [(i, (int(positions[i, t]), int(positions[i, t + 1])), t),
+                (j, (int(positions[j, t]), int(positions[j, t + 1])), t)]
+
+    def __plan(self, paths, began):
+        planned = [path for path in paths if path is not None]
+        elapsed = max(time.perf_counter() - began, 1e-9)
+        cells = [None if path is None else [self.maze.getCell(v) for v in path] for path in paths]
+        return Plan(cells, sum(len(path) - 1 for path in planned), len(planned) / elapsed, self.expansions)
+
+
+def plan_prioritized(maze, agents, horizon=None):
+    """Plan several drones in a maze with prioritized space-time A*, see SpaceTimePlanner.prioritized"""
+    return SpaceTimePlanner(maze).prioritized(agents, horizon)
+
+
+def plan_cbs(maze, agents, horizon=None, max_nodes=DEFAULT_MAX_CBS_NODES):
+    """Plan several drones in a maze with conflict-based search, see SpaceTimePlanner.cbs"""
+    return SpaceTimePlanner(maze).cbs(agents, horizon, max_nodes)
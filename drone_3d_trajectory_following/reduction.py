@@ -0,0 +1,119 @@
+# reduction.py
+# ---------------
+
+"""
+This file contains the maze graph reduced to its junctions, for faster searches.
+"""
+
+import heapq
+import math
+import numpy as np
+from state import HEURISTICS
+
+
+class ReducedGraph:
+    def __init__(self, maze):
+        """Build the reduced graph of a maze (part 1 only)
+
+        The start and the objectives are always kept as nodes, so the graph has to be
+        rebuilt if they change.
+
+        Args:
+            maze (Maze): the maze to reduce
+        """
+        self.maze = maze
+        self.start = maze.getIndex(*maze.getStart().state)
+        self.objectives = frozenset(maze.getIndex(*objective) for objective in maze.getObjectives())
+        protected = self.objectives | {self.start}
+
+        heads, tails, costs = maze.getEdges()
+        size = int(max(heads.max(initial=0), max(protected))) + 1
+        indptr = np.searchsorted(heads, np.arange(size + 1)).tolist()
+        tails, costs = tails.tolist(), costs.tolist()
+        degree = np.bincount(heads, minlength=size).tolist()
+
+        # Prune dead ends recursively: a cell with a single neighbor is never on a shortest
+        # path between two other cells, and removing it may turn its neighbor into a dead end
+        removed = [False] * size
+        stack = [v for v in range(size) if degree[v] == 1 and v not in protected]
+        while stack:
+            v = stack.pop()
+            if removed[v]:
+                continue
+            removed[v] = True
+            for u in tails[indptr[v]:indptr[v + 1]]:
+                if not removed[u]:
+                    degree[u] -= 1
+                    if degree[u] <= 1 and u not in protected:
+                        stack.append(u)
+        self.pruned = sum(removed)
+
+        # Contract corridors: walk from every junction through degree-2 cells to the next junction
+        self.junctions = [v for v in range(size) if degree[v] > 0 and not removed[v] and (degree[v] != 2 or v in protected)]
+        junctions = set(self.junctions) | protected
+        self.edges = {v: {} for v in junctions}
+        for junction in self.junctions:
+            for k in range(indptr[junction], indptr[junction + 1]):
+                previous, current, weight, corridor = junction, tails[k], costs[k], []
+                if removed[current]:
+                    continue
+                while current not in junctions:
+                    corridor.append(current)
+                    for n in range(indptr[current], indptr[current + 1]):
+                        if tails[n] != previous and not removed[tails[n]]:
+                            previous, current, weight = current, tails[n], weight + costs[n]
+                            break
+                if current != junction and weight < self.edges[junction].get(current, (np.inf,))[0]:
+                    self.edges[junction][current] = (weight, tuple(corridor))
+        self.contracted = sum(1 for v in range(size) if degree[v] > 0 and not removed[v]) - len(self.junctions)
+
+    def search(self):
+        """Run A* from the start to the nearest objective over the junctions
+
+        Returns:
+            list: (cell, dist_from_start) pairs of the full cell path, or None if there is no path
+        """
+        distance = HEURISTICS[self.maze.connectivity]
+        goals = [self.maze.getCell(objective) for objective in self.objectives]
+        h = {}
+
+        def heuristic(v):
+            if v not in h:
+                h[v] = min(distance(self.maze.getCell(v), goal) for goal in goals)
+            return h[v]
+
+        best = {self.start: 0}
+        parent = {self.start: None}
+        frontier = [(heuristic(self.start), 0, self.start)]
+        while frontier:
+            _, g, v = heapq.heappop(frontier)
+            if g > best[v]:
+                continue
+            if v in self.objectives:
+                return self.expand(parent, v, best)
+            self.maze.states_explored += 1
+            for u, (weight, _) in self.edges[v].items():
+                if g + weight < best.get(u, np.inf):
+                    best[u] = g + weight
+                    parent[u] = v
+                    heapq.heappush(frontier, (best[u] + heuristic(u), best[u], u))
+        return None
+
+    def expand(self, parent, v, best):
+        """Expand a junction path back to the cell sequence it stands for"""
+        junctions = [v]
+        while parent[junctions[-1]] is not None:
+            junctions.append(parent[junctions[-1]])
+        junctions.reverse()
+
+        path = [(self.maze.getCell(junctions[0]), 0)]
+        for a, b in zip(junctions, junctions[1:]):
+            _, corridor = self.edges[a][b]
+            g = best[a]
+            previous = self.maze.getCell(a)
+            for index in corridor + (b,):
+                cell = self.maze.getCell(index)
+                g += math.dist(cell, previous)
+                path.append((cell, g))
+                previous = cell
+        return path
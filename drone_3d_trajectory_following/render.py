@@ -0,0 +1,173 @@
+"""
+Renders recorded flights offscreen, into PNG frames or a video.
+"""
+
+import contextlib
+import os
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from matplotlib.image import imsave
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+from mpl_toolkits.mplot3d.art3d import Poly3DCollection
+from collision import box_faces
+from const import DEFAULT_FPS
+from simulation import rotation_matrices
+from utils import EPSILON
+
+FFMPEG = 'ffmpeg'
+DEFAULT_SIZE = (6.4, 4.8)
+DEFAULT_DPI = 100
+DEFAULT_LIMITS = ((0, 10), (0, 10), (0, 10))
+# recorded positions drawn behind the quadrotor, like Quadrotor's tail
+DEFAULT_TAIL = 1000
+# quadrotor arm length, as drawn by quad_sim
+DEFAULT_QUAD_SIZE = 1
+
+
+def frame_indices(t, fps=DEFAULT_FPS):
+    """Telemetry row shown in every frame: the last one recorded at or before the frame's time"""
+    t = np.asarray(t, dtype=np.float64)
+    if not len(t):
+        return np.zeros(0, dtype=np.int64)
+    times = np.arange(int(np.floor(t[-1] * fps + EPSILON)) + 1) / fps
+    return np.searchsorted(t, times + EPSILON, side='right') - 1
+
+
+def rotor_positions(pos, att, size=DEFAULT_QUAD_SIZE):
+    """Positions of the 4 rotors for every pose, like Quadrotor.transformation_matrix
+
+    Args:
+        pos: (K, 3) positions
+        att: (K, 3) roll, pitch and yaw
+
+    Returns:
+        (K, 4, 3) array, the first two rotors are on one arm and the last two on the other
+    """
+    arms = np.array([[size / 2, 0, 0], [-size / 2, 0, 0], [0, size / 2, 0], [0, -size / 2, 0]])
+    rotation = rotation_matrices(att[:, 0], att[:, 1], att[:, 2])
+    return np.einsum('kij,rj->kri', rotation, arms) + pos[:, None]
+
+
+class FrameRenderer:
+    def __init__(self, obstacles=(), size=DEFAULT_SIZE, dpi=DEFAULT_DPI, limits=DEFAULT_LIMITS):
+        """Offscreen figure with the obstacles drawn once; frames only redraw the quadrotor
+
+        Args:
+            obstacles (list): [(x1, y1, z1, x2, y2, z2), ...] obstacles
+            size (tuple): figure size in inches
+            dpi (int): pixels per inch
+            limits (tuple): (low, high) of every axis
+        """
+        self.figure = Figure(figsize=size, dpi=dpi)
+        self.canvas = FigureCanvasAgg(self.figure)
+        self.ax = self.figure.add_subplot(111, projection='3d')
+        self.ax.set_xlim(*limits[0])
+        self.ax.set_ylim(*limits[1])
+        self.ax.set_zlim(*limits[2])
+        if len(obstacles):
+            self.ax.add_collection3d(Poly3DCollection(box_faces(obstacles), facecolor='r', edgecolor='r', alpha=0.2))
+        self.rotors, = self.ax.plot([], [], [], 'k.', animated=True)
+        self.arm1, = self.ax.plot([], [], [], 'r-', animated=True)
+        self.arm2, = self.ax.plot([], [], [], 'r-', animated=True)
+        self.trail, = self.ax.plot([], [], [], 'b:', animated=True)
+        self.canvas.draw()
+        self.background = self.canvas.copy_from_bbox(self.figure.bbox)
+        self.width, self.height = (int(value) for value in self.canvas.get_width_height())
+
+    def draw(self, rotors, trail):
+        """Draw one frame and return its pixels as an (height, width, 4) RGBA array view
+
+        Args:
+            rotors: (4, 3) rotor positions, see rotor_positions
+            trail: (n, 3) recorded positions
+        """
+        self.rotors.set_data_3d(*rotors.T)
+        self.arm1.set_data_3d(*rotors[:2].T)
+        self.arm2.set_data_3d(*rotors[2:].T)
+        self.trail.set_data_3d(*np.asarray(trail).T)
+        self.canvas.restore_region(self.background)
+        for artist in (self.rotors, self.arm1, self.arm2, self.trail):
+            self.ax.draw_artist(artist)
+        return np.asarray(self.canvas.buffer_rgba())
+
+
+def render_range(pos, att, indices, start, stop, output, obstacles=(), fps=DEFAULT_FPS, size=DEFAULT_SIZE,
+                 dpi=DEFAULT_DPI, limits=DEFAULT_LIMITS, tail=DEFAULT_TAIL):
+    """Render frames start to stop, runs in the worker processes
+
+    Args:
+        pos, att: (K, 3) recorded positions and attitudes
+        indices: (F,) telemetry row of every frame, see frame_indices
+        start, stop (int): range of frames to render
+        output (str): PNG pattern formatted with the frame number, or a video file the
+            frames are piped into through ffmpeg
+
+    Returns:
+        number of frames rendered
+    """
+    renderer = FrameRenderer(obstacles, size, dpi, limits)
+    rotors = rotor_positions(pos[indices[start:stop]], att[indices[start:stop]])
+    encoder = None
+    if not output.lower().endswith('.png'):
+        encoder = subprocess.Popen([FFMPEG, '-loglevel', 'error', '-y', '-f', 'rawvideo', '-pix_fmt', 'rgba',
+                                    '-s', '{0}x{1}'.format(renderer.width, renderer.height), '-r', str(fps),
+                                    '-i', '-', '-pix_fmt', 'yuv420p', output], stdin=subprocess.PIPE)
+    try:
+        for frame in range(start, stop):
+            index = indices[frame]
+            first = 0 if tail is None else max(0, index + 1 - tail)
+            pixels = renderer.draw(rotors[frame - start], pos[first:index + 1])
+            if encoder is None:
+                imsave(output.format(frame), pixels)
+            else:
+                encoder.stdin.write(pixels.tobytes())
+    finally:
+        if encoder is not None:
+            encoder.stdin.close()
+            if encoder.wait():
+                raise RuntimeError('{0} failed with exit code {1}'.format(FFMPEG, encoder.returncode))
+    return stop - start
+
+
+def export(telemetry, output, obstacles=(), fps=DEFAULT_FPS, workers=None, size=DEFAULT_SIZE, dpi=DEFAULT_DPI,
+           limits=DEFAULT_LIMITS, tail=DEFAULT_TAIL):
+    """Render a recorded flight without a display, spread over a process pool
+
+    Args:
+        telemetry (Telemetry): recorded flight, see simulation.simulate
+        output (str): 'frames/frame_{:05d}.png' style pattern for a PNG sequence, or a video
+            file (e.g. 'flight.mp4') encoded with ffmpeg. Every process encodes its own part
+            and the parts are joined without re-encoding.
+        obstacles (list): [(x1, y1, z1, x2, y2, z2), ...] obstacles
+        fps (int): frames per second of replay time
+        workers (int): processes, the number of CPUs by default
+
+    Returns:
+        number of frames
+    """
+    pos, att = np.asarray(telemetry.pos, dtype=np.float64), np.asarray(telemetry.att, dtype=np.float64)
+    indices = frame_indices(telemetry.t, fps)
+    if not len(indices):
+        return 0
+    workers = max(1, min(workers or os.cpu_count() or 1, len(indices)))
+    bounds = np.linspace(0, len(indices), workers + 1).astype(int)
+    video = not output.lower().endswith('.png')
+    # the parts of a video are encoded next to it, then joined
+    scratch = tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output))) if video else contextlib.nullcontext()
+    with scratch as parts:
+        extension = os.path.splitext(output)[1]
+        outputs = [os.path.join(parts, 'part{0}{1}'.format(k, extension)) if video else output for k in range(workers)]
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            jobs = [executor.submit(render_range, pos, att, indices, bounds[k], bounds[k + 1], outputs[k], obstacles,
+                                    fps, size, dpi, limits, tail) for k in range(workers)]
+            frames = sum(job.result() for job in jobs)
+        if video:
+            listing = os.path.join(parts, 'parts.txt')
+            with open(listing, 'w') as f:
+                f.writelines("file '{0}'\n".format(part) for part in outputs)
+            subprocess.run([FFMPEG, '-loglevel', 'error', '-y', '-f', 'concat', '-safe', '0', '-i', listing,
+                            '-c', 'copy', output], check=True)
+    return frames
@@ -20,6 +20,18 @@ This file contains search functions.
 
 from collections import deque
 import heapq
+import math
+from hierarchy import ContractionHierarchy
+from reduction import ReducedGraph
+from state import HEURISTICS, MazeState
+from utils import EPSILON
+
+# default number of expansions between two progress callbacks of astar
+DEFAULT_CHECK_EVERY = 256
+# default number of states ida_star may keep in memory
+DEFAULT_NODE_BUDGET = 1000000
+# default smallest increase of the ida_star bound between iterations, one straight move
+DEFAULT_BOUND_STEP = 1.0
 
 # Search should return the path and the number of states explored.
 # The path should be a list of MazeState objects that correspond
@@ -29,33 +41,201 @@ import heapq
 # searchMethod is the search method specified by --method flag (astar)
 # You may need to slight change your previous search functions in MP2 since this is 3-d maze
 
-def astar(maze, ispart1=False):
+class SearchCancelled(Exception):
+    pass
+
+class SearchTimeout(SearchCancelled):
+    pass
+
+def astar(maze, ispart1=False, progress=None, check_every=DEFAULT_CHECK_EVERY):
     """
     This function returns an optimal path in a list, which contains the start and objective.
 
     @param maze: Maze instance from maze.py
     @param ispart1:pass this variable when you use functions such as getNeighbors and isObjective. DO NOT MODIFY THIS
+    @param progress: optional callback(best_state, expansions) called every check_every expansions, where
+                     best_state is the expanded state closest to a goal so far. Raise SearchCancelled from it
+                     to stop the search.
+    @param check_every: number of expansions between progress calls
     @return: a path in the form of a list of MazeState objects
     """
     # Your code here
     starting_state = maze.getStart()
+    # the free space labeling answers unreachable objectives without exhausting the search
+    if ispart1 and not maze.canReachObjective(*starting_state.state):
+        return None
     visited_states = {starting_state: (None, 0)}
     frontier = []
     heapq.heappush(frontier, starting_state)
+    best_state = starting_state
+    expansions = 0
+    # the frontier may also hold stale copies of states in visited_states
+    maze.peak_states = len(visited_states) + len(frontier)
 
     while frontier:
         state = heapq.heappop(frontier)
         if state.is_goal():
             return backtrack(visited_states, state)
 
+        if progress is not None:
+            expansions += 1
+            if state.h < best_state.h:
+                best_state = state
+            if expansions % check_every == 0:
+                progress(best_state, expansions)
+
         neighbors = state.get_neighbors(ispart1=ispart1)
         for neighbor in neighbors:
             if neighbor in visited_states and neighbor.dist_from_start >= visited_states[neighbor][1]:
                 continue
             heapq.heappush(frontier, neighbor)
             visited_states[neighbor] = (state, neighbor.dist_from_start)
+        maze.peak_states = max(maze.peak_states, len(visited_states) + len(frontier))
     return None
 
+def ida_star(maze, node_budget=DEFAULT_NODE_BUDGET, bound_step=DEFAULT_BOUND_STEP):
+    """
+    This function returns an optimal path like astar(maze, ispart1=True), using iterative deepening A*
+    so memory stays bounded on very large mazes.
+
+    Each iteration is a depth-first search that prunes states whose f = g + h exceeds the bound.
+    The next bound is the smallest f that was pruned, but at least bound_step higher: with the
+    sqrt(2) and sqrt(3) moves of 18/26-connected mazes almost every f is distinct, and raising
+    the bound to the next one would admit only a few states per iteration. A goal found below
+    a raised bound may not be the cheapest one, so the iteration that finds a goal carries on
+    as a branch and bound search, pruning at the cost of the best path found so far. The path
+    returned is optimal whatever bound_step is, bound_step only trades the number of iterations
+    against the states the last one visits beyond the optimal cost.
+
+    A transposition table remembers the cheapest g each cell was reached with in the current
+    iteration to avoid re-expanding it. node_budget is a hint, not a hard limit: the table stops
+    growing once the table, the search stack and the successors pending on it hold node_budget
+    states, and the search stays correct and only re-expands more states, but the stack and its
+    successors are always kept. The memory high-water mark, the largest number of states held at
+    once by all three, is stored in maze.peak_states.
+
+    @param maze: Maze instance from maze.py
+    @param node_budget: number of states to keep in memory, see above
+    @param bound_step: smallest increase of the bound between two iterations
+    @return: a path in the form of a list of MazeState objects
+    """
+    starting_state = maze.getStart()
+    maze.peak_states = 1
+    if not maze.canReachObjective(*starting_state.state):
+        return None
+    goals = set(starting_state.goal)
+    distance = HEURISTICS[maze.connectivity]
+
+    def heuristic(cell):
+        return min(distance(cell, goal) for goal in goals)
+
+    def successors(cell, g, bound):
+        """Children of a cell within the bound, the child with the lowest f last, and the lowest f pruned"""
+        children, pruned = [], math.inf
+        for neighbor, cost in maze.getWeightedNeighbors(*cell):
+            f = g + cost + heuristic(neighbor)
+            if f > bound + EPSILON:
+                pruned = min(pruned, f)
+            else:
+                children.append((f, neighbor, g + cost))
+        children.sort(reverse=True)
+        return [child[1:] for child in children], pruned
+
+    start = starting_state.state
+    if start in goals:
+        return [starting_state]
+    # no path is cheaper than lower, every path up to bound is searched
+    lower = bound = heuristic(start)
+    while bound < math.inf:
+        table = {start: 0}
+        children, next_bound = successors(start, 0, bound)
+        frames = [(start, 0, children)]
+        # successors generated but not yet popped, held by the frames
+        pending = len(children)
+        on_path = {start}
+        best = None
+        while frames:
+            cell, g, children = frames[-1]
+            if not children:
+                frames.pop()
+                on_path.discard(cell)
+                continue
+            child, child_g = children.pop()
+            pending -= 1
+            f = child_g + heuristic(child)
+            # the bound may have dropped to the cost of a goal since the child was generated
+            if f > bound + EPSILON:
+                continue
+            if child in on_path or table.get(child, math.inf) <= child_g + EPSILON:
+                continue
+            if len(table) + len(frames) + pending < node_budget:
+                table[child] = child_g
+            if child in goals:
+                best = [(frame[0], frame[1]) for frame in frames] + [(child, child_g)]
+                if child_g <= lower + EPSILON:
+                    break
+                # only strictly cheaper paths are searched from now on
+                bound = child_g - 2 * EPSILON
+                continue
+            children, pruned = successors(child, child_g, bound)
+            next_bound = min(next_bound, pruned)
+            frames.append((child, child_g, children))
+            pending += len(children)
+            on_path.add(child)
+            maze.peak_states = max(maze.peak_states, len(table) + len(frames) + pending)
+        if best is not None:
+            return [MazeState(cell, starting_state.goal, g, maze, starting_state.mst_cache, starting_state.use_heuristic)
+                    for cell, g in best]
+        lower = next_bound
+        bound = max(next_bound, bound + bound_step)
+    return None
+
+def astar_reduced(maze, graph=None):
+    """
+    This function returns an optimal path like astar(maze, ispart1=True), but searches the maze
+    graph with dead ends pruned and corridors contracted.
+
+    @param maze: Maze instance from maze.py
+    @param graph: ReducedGraph of the maze, built if not given. Reuse it for repeated queries.
+    @return: a path in the form of a list of MazeState objects
+    """
+    starting_state = maze.getStart()
+    if not maze.canReachObjective(*starting_state.state):
+        return None
+    if graph is None:
+        graph = ReducedGraph(maze)
+    path = graph.search()
+    if path is None:
+        return None
+    return [MazeState(cell, starting_state.goal, dist, maze, starting_state.mst_cache, starting_state.use_heuristic)
+            for cell, dist in path]
+
+def search_hierarchy(maze, hierarchy=None):
+    """
+    This function returns an optimal path like astar(maze, ispart1=True), using a contraction
+    hierarchy of the maze. Build it once per static maze, a query then settles a few hundred
+    nodes, about a millisecond, see hierarchy.benchmark.
+
+    @param maze: Maze instance from maze.py
+    @param hierarchy: ContractionHierarchy of the maze, see ContractionHierarchy.for_maze. If not given it is
+                      loaded from next to the maze file, or built and stored there, and built without
+                      storing, and kept in memory, for a maze without a file
+    @return: a path in the form of a list of MazeState objects
+    """
+    starting_state = maze.getStart()
+    if not maze.canReachObjective(*starting_state.state):
+        return None
+    if hierarchy is None:
+        hierarchy = ContractionHierarchy.for_maze(maze)
+    result = hierarchy.query(starting_state.state, maze.getObjectives())
+    if result is None:
+        return None
+    path, dist = [], 0
+    for cell in result[0]:
+        dist += math.dist(cell, path[-1].state) if path else 0
+        path.append(MazeState(cell, starting_state.goal, dist, maze, starting_state.mst_cache, starting_state.use_heuristic))
+    return path
+
 # This is the same as backtrack from MP2
 def backtrack(visited_states, current_state):
     path = [current_state]
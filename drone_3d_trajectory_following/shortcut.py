@@ -0,0 +1,107 @@
+# shortcut.py
+# ---------------
+
+"""
+This file contains line-of-sight shortcutting of planned paths.
+"""
+
+import numpy as np
+from collision import segment_aabb_intersect
+from utils import EPSILON
+
+# the 8 ways of picking the cell below/above a boundary on each axis
+CORNERS = np.array([[(bits >> axis) & 1 for axis in range(3)] for bits in range(8)], dtype=bool)
+
+
+def traversed_cells(a, b):
+    """Returns every cell the segment between two cell centers touches
+
+    Like a 3D DDA, the segment is split at the parameters where it crosses a cell
+    boundary on any axis, all at once. Where it passes exactly through a cell edge or
+    corner, every cell sharing that edge or corner is included, so a line of sight
+    never cuts a wall corner that a diagonal move would not cut either.
+
+    Args:
+        a (tuple): (x, y, z) start cell
+        b (tuple): (x, y, z) end cell
+
+    Returns:
+        ndarray: (n, 3) int array of unique cells
+    """
+    a = np.asarray(a, dtype=np.float64)
+    b = np.asarray(b, dtype=np.float64)
+    d = b - a
+    crossings = [np.array([0.0, 1.0])]
+    for axis in range(3):
+        if d[axis] != 0:
+            lo, hi = sorted((a[axis], b[axis]))
+            boundaries = np.arange(np.floor(lo) + 0.5, hi, 1.0)
+            crossings.append((boundaries - a[axis]) / d[axis])
+    t = np.unique(np.concatenate(crossings))
+    points = a + t[:, None] * d
+
+    # a coordinate on a boundary belongs to the cells on both sides of it
+    on_boundary = np.abs(points + 0.5 - np.round(points + 0.5)) < EPSILON
+    below = np.round(points - 0.5 * on_boundary).astype(np.int64)
+    above = np.round(points + 0.5 * on_boundary).astype(np.int64)
+    cells = np.where(CORNERS[None], above[:, None], below[:, None]).reshape(-1, 3)
+    return np.unique(cells, axis=0)
+
+
+def line_of_sight(maze, a, b, boxes=None):
+    """Check whether the straight segment between two cells only crosses free cells (part 1 only)
+
+    Args:
+        maze (Maze): maze the cells belong to
+        a, b (tuple): (x, y, z) cells
+        boxes (ndarray): optional (M, 6) obstacle boxes grown by the drone's half extents
+            (collision.expand_boxes), which the segment must not touch either
+    """
+    if not maze.areFree(traversed_cells(a, b)).all():
+        return False
+    return boxes is None or not segment_aabb_intersect(a, b, boxes).any()
+
+
+def shortcut_path(maze, path, optimal=False, boxes=None):
+    """Remove the waypoints of a cell path that line of sight lets the drone skip
+
+    Args:
+        maze (Maze): maze the path was planned in
+        path (list): (x, y, z) cells or MazeStates, consecutive cells must be neighbors
+        optimal (bool): find the fewest waypoints by checking every pair of cells (quadratic),
+            instead of greedily jumping to the furthest visible cell
+        boxes (ndarray): grown obstacle boxes line of sight is also checked against, see line_of_sight
+
+    Returns:
+        waypoints (list): (x, y, z) cells, starting and ending like the path
+        removed (int): number of segments removed from the path
+    """
+    cells = [tuple(getattr(cell, 'state', cell)) for cell in path]
+    if len(cells) <= 2:
+        return cells, 0
+
+    last = len(cells) - 1
+    if optimal:
+        # fewest segments over the visibility graph, which only has forward edges. Moves
+        # of the path itself are always kept, they were checked when planning.
+        segments = [0] + [np.inf] * last
+        previous = [None] * len(cells)
+        for j in range(1, len(cells)):
+            for i in range(j):
+                if segments[i] + 1 < segments[j] and (j == i + 1 or line_of_sight(maze, cells[i], cells[j], boxes)):
+                    segments[j], previous[j] = segments[i] + 1, i
+        indices = [last]
+        while previous[indices[-1]] is not None:
+            indices.append(previous[indices[-1]])
+        indices.reverse()
+    else:
+        # the next cell of the path is always reachable, so this always moves forward
+        indices = [0]
+        while indices[-1] < last:
+            i = indices[-1]
+            j = last
+            while j > i + 1 and not line_of_sight(maze, cells[i], cells[j], boxes):
+                j -= 1
+            indices.append(j)
+
+    return [cells[i] for i in indices], last - (len(indices) - 1)
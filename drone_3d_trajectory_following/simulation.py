@@ -0,0 +1,272 @@
+"""
+Simulates the controller and dynamics of quad_sim without rendering, into telemetry arrays.
+"""
+
+from collections import namedtuple
+from math import cos, sin
+import numpy as np
+from TrajectoryGenerator import evaluate
+
+# vehicle and controller parameters, the defaults are the ones of drone_3d_trajectory_following.
+# Altitude is held with Kp_z and Kd_z, x and y only follow from the attitude gains tracking
+# the desired acceleration.
+Params = namedtuple('Params', ['g', 'm', 'Ixx', 'Iyy', 'Izz', 'Kp_z', 'Kp_roll', 'Kp_pitch', 'Kp_yaw', 'Kd_z'])
+DEFAULT_PARAMS = Params(g=9.81, m=0.2, Ixx=1, Iyy=1, Izz=1, Kp_z=1, Kp_roll=25, Kp_pitch=25, Kp_yaw=25, Kd_z=1)
+DEFAULT_DT = 0.2
+
+# Recorded flight, one row per control step. t is the time since the start, row * dt, and
+# ref_t the time of the trajectory the reference was taken at: like quad_sim, the clock
+# restarts on every segment and a segment is flown in whole steps, so ref_t falls behind t.
+# All other fields of a row are at t: position, velocity, attitude (roll, pitch, yaw) and
+# attitude rates before the step, the thrust and torques computed from them and the
+# desired position, velocity and acceleration at ref_t. The last row is the final state,
+# dt after the last step; its controls are not applied and its desired state is the end of
+# the trajectory. Every field is a view into one (steps, TELEMETRY_WIDTH) array.
+Telemetry = namedtuple('Telemetry', ['t', 'ref_t', 'pos', 'vel', 'att', 'rates', 'thrust', 'torques',
+                                     'des_pos', 'des_vel', 'des_acc'])
+TELEMETRY_WIDTHS = Telemetry(t=1, ref_t=1, pos=3, vel=3, att=3, rates=3, thrust=1, torques=3,
+                             des_pos=3, des_vel=3, des_acc=3)
+TELEMETRY_WIDTH = sum(TELEMETRY_WIDTHS)
+# first column of des_pos, the desired values come last
+DESIRED_COLUMN = TELEMETRY_WIDTH - TELEMETRY_WIDTHS.des_pos - TELEMETRY_WIDTHS.des_vel - TELEMETRY_WIDTHS.des_acc
+
+
+def telemetry_views(data):
+    """Split a (steps, TELEMETRY_WIDTH) or (steps, N, TELEMETRY_WIDTH) array into the Telemetry fields, without copying"""
+    views, column = [], 0
+    for width in TELEMETRY_WIDTHS:
+        views.append(data[..., column] if width == 1 else data[..., column:column + width])
+        column += width
+    return Telemetry(*views)
+
+
+def step_times(durations, dt=DEFAULT_DT):
+    """Times within every segment the controller runs at
+
+    The clock is accumulated step by step and restarts at 0 on every segment, like
+    quad_sim, so the times carry the same rounding.
+
+    Returns:
+        list of lists of float times
+    """
+    times = []
+    for duration in durations:
+        segment, t = [], 0
+        while t <= duration:
+            segment.append(t)
+            t += dt
+        times.append(segment)
+    return times
+
+
+def row_times(times, durations):
+    """Reference times of the telemetry rows of every segment: the step times, and the last
+    segment also gets the row of the final state, at the end of the trajectory
+
+    Returns:
+        list of lists of float times
+    """
+    rows = [list(segment) for segment in times]
+    if rows:
+        rows[-1].append(float(durations[-1]))
+    return rows
+
+
+def simulate(coeffs, durations, start=None, dt=DEFAULT_DT, params=DEFAULT_PARAMS, recorder=None, method=None,
+             **options):
+    """Fly a trajectory with the quadrotor controller, without rendering
+
+    By default the controller runs every dt and the state is stepped like quad_sim always
+    did: rates, attitude, velocity, then position, each with the value just updated. A
+    method of integrators.py integrates the same closed loop instead, with the controller
+    evaluated continuously.
+
+    The state of the default stepping is deliberately kept in Python floats, not NumPy
+    arrays. Each step works on 3-vectors, and NumPy's per-call overhead on arrays that small
+    would make the loop slower. The NumPy arrays are where it pays off: the reference of
+    every segment is evaluated at once and the rows are copied into the preallocated
+    telemetry one segment at a time.
+
+    Args:
+        coeffs: (N, 3, 6) trajectory coefficients, see TrajectoryGenerator.solve_segments
+        durations: duration of every segment, a float or (N,) array
+        start: (x, y, z) initial position, the start of the trajectory by default
+        dt (float): step of the simulation
+        params (Params): vehicle and controller parameters
+        recorder (TelemetryRecorder): also streams the rows to a file, segment by segment
+        method (str): None, or 'euler', 'semi_implicit_euler', 'rk4' or 'rk45', then dt is
+            the step (the first step for rk45)
+        options: rtol and atol of rk45
+
+    Returns:
+        Telemetry
+    """
+    if method is not None:
+        # integrators builds on this module
+        from integrators import simulate_integrated
+        return simulate_integrated(coeffs, durations, start, method, dt, params, recorder=recorder, **options)
+    coeffs = np.asarray(coeffs, dtype=np.float64).reshape(-1, 3, 6)
+    durations = np.broadcast_to(np.asarray(durations, dtype=np.float64), (len(coeffs),))
+    times = step_times(durations.tolist(), dt)
+    offsets = np.concatenate(([0], np.cumsum(durations)[:-1])).tolist()
+    data = np.zeros((1 + sum(map(len, times)), TELEMETRY_WIDTH))
+
+    g, m, Ixx, Iyy, Izz = params.g, params.m, params.Ixx, params.Iyy, params.Izz
+    Kp_z, Kd_z = params.Kp_z, params.Kd_z
+    Kp_roll, Kp_pitch, Kp_yaw = params.Kp_roll, params.Kp_pitch, params.Kp_yaw
+    if start is None:
+        start = evaluate(coeffs[:1], [0]).position[0, 0] if len(coeffs) else (0, 0, 0)
+    x_pos, y_pos, z_pos = (float(value) for value in start)
+    x_vel = y_vel = z_vel = 0
+    roll = pitch = yaw = 0
+    roll_vel = pitch_vel = yaw_vel = 0
+    des_yaw = 0
+
+    telemetry = telemetry_views(data)
+    # without segments the only row is the start
+    telemetry.pos[0] = x_pos, y_pos, z_pos
+    row = 0
+    sin_des_yaw, cos_des_yaw = sin(des_yaw), cos(des_yaw)
+    for i, reference_times in enumerate(row_times(times, durations)):
+        desired = evaluate(coeffs[i], reference_times)
+        des_pos, des_vel, des_acc = desired.position[0].tolist(), desired.velocity[0].tolist(), desired.acceleration[0].tolist()
+        offset = offsets[i]
+        steps = len(times[i])
+        rows = []
+        for k, t in enumerate(reference_times):
+            des_z_pos = des_pos[k][2]
+            des_z_vel = des_vel[k][2]
+            des_x_acc, des_y_acc, des_z_acc = des_acc[k]
+
+            thrust = m * (g + des_z_acc + Kp_z * (des_z_pos - z_pos) + Kd_z * (des_z_vel - z_vel))
+
+            roll_torque = Kp_roll * (((des_x_acc * sin_des_yaw - des_y_acc * cos_des_yaw) / g) - roll)
+            pitch_torque = Kp_pitch * (((des_x_acc * cos_des_yaw - des_y_acc * sin_des_yaw) / g) - pitch)
+            yaw_torque = Kp_yaw * (des_yaw - yaw)
+
+            rows.append(((row + k) * dt, offset + t, x_pos, y_pos, z_pos, x_vel, y_vel, z_vel, roll, pitch, yaw,
+                         roll_vel, pitch_vel, yaw_vel, thrust, roll_torque, pitch_torque, yaw_torque))
+            if k == steps:
+                break
+
+            roll_vel += roll_torque * dt / Ixx
+            pitch_vel += pitch_torque * dt / Iyy
+            yaw_vel += yaw_torque * dt / Izz
+
+            roll += roll_vel * dt
+            pitch += pitch_vel * dt
+            yaw += yaw_vel * dt
+
+            # thrust along the third column of rotation_matrix, including its
+            # cos(pitch) * cos(yaw) entry, so the flight matches quad_sim
+            sin_roll, cos_roll = sin(roll), cos(roll)
+            sin_pitch, cos_pitch = sin(pitch), cos(pitch)
+            sin_yaw, cos_yaw = sin(yaw), cos(yaw)
+            x_acc = (sin_yaw * sin_roll + cos_yaw * sin_pitch * cos_roll) * thrust / m
+            y_acc = (-cos_yaw * sin_roll + sin_yaw * sin_pitch * cos_roll) * thrust / m
+            z_acc = (cos_pitch * cos_yaw * thrust - m * g) / m
+            x_vel += x_acc * dt
+            y_vel += y_acc * dt
+            z_vel += z_acc * dt
+            x_pos += x_vel * dt
+            y_pos += y_vel * dt
+            z_pos += z_vel * dt
+        # one copy per segment into the preallocated arrays
+        data[row:row + len(rows), :DESIRED_COLUMN] = rows
+        data[row:row + len(rows), DESIRED_COLUMN:] = np.concatenate([desired.position[0], desired.velocity[0], desired.acceleration[0]], axis=1)
+        if recorder is not None:
+            recorder.append(data[row:row + len(rows)])
+        row += len(rows)
+    if recorder is not None and not len(coeffs):
+        recorder.append(data)
+    return telemetry
+
+
+def rotation_matrices(roll, pitch, yaw):
+    """ZYX rotation matrices of many attitudes at once, entry by entry like rotation_matrix
+
+    Args:
+        roll, pitch, yaw: (N,) angles in radians
+
+    Returns:
+        (N, 3, 3) array
+    """
+    sin_roll, cos_roll = np.sin(roll), np.cos(roll)
+    sin_pitch, cos_pitch = np.sin(pitch), np.cos(pitch)
+    sin_yaw, cos_yaw = np.sin(yaw), np.cos(yaw)
+    return np.stack([
+        np.stack([cos_yaw * cos_pitch, -sin_yaw * cos_roll + cos_yaw * sin_pitch * sin_roll, sin_yaw * sin_roll + cos_yaw * sin_pitch * cos_roll], axis=-1),
+        np.stack([sin_yaw * cos_pitch, cos_yaw * cos_roll + sin_yaw * sin_pitch * sin_roll, -cos_yaw * sin_roll + sin_yaw * sin_pitch * cos_roll], axis=-1),
+        np.stack([-sin_pitch, cos_pitch * sin_roll, cos_pitch * cos_yaw], axis=-1)], axis=-2)
+
+
+def simulate_ensemble(coeffs, durations, starts, dt=DEFAULT_DT, params=DEFAULT_PARAMS):
+    """Fly the same trajectory with N vehicles at once, for Monte Carlo studies
+
+    The state of all vehicles is kept in (N, 3) arrays and every step advances the
+    whole ensemble with a few array operations, so the cost of a step barely depends
+    on N. The controller and dynamics are the ones of simulate.
+
+    Args:
+        coeffs: (K, 3, 6) trajectory coefficients
+        durations: duration of every segment, a float or (K,) array
+        starts: (N, 3) initial position of every vehicle
+        dt (float): step of the simulation
+        params (Params): parameters, every field a float or an (N,) array of per-vehicle values
+
+    Returns:
+        Telemetry, every field with a vehicle axis after the step axis
+    """
+    coeffs = np.asarray(coeffs, dtype=np.float64).reshape(-1, 3, 6)
+    durations = np.broadcast_to(np.asarray(durations, dtype=np.float64), (len(coeffs),))
+    pos = np.array(starts, dtype=np.float64).reshape(-1, 3)
+    n = len(pos)
+    params = Params(*(np.broadcast_to(np.asarray(value, dtype=np.float64), (n,)) for value in params))
+    times = step_times(durations.tolist(), dt)
+    offsets = np.concatenate(([0], np.cumsum(durations)[:-1]))
+    data = np.zeros((1 + sum(map(len, times)), n, TELEMETRY_WIDTH))
+    telemetry = telemetry_views(data)
+
+    vel, att, rates = np.zeros((n, 3)), np.zeros((n, 3)), np.zeros((n, 3))
+    inertia = np.stack([params.Ixx, params.Iyy, params.Izz], axis=1)
+    attitude_gains = np.stack([params.Kp_roll, params.Kp_pitch, params.Kp_yaw], axis=1)
+    weight = np.zeros((n, 3))
+    weight[:, 2] = params.m * params.g
+    thrust_vector = np.zeros((n, 3))
+    des_yaw = 0
+
+    telemetry.pos[0] = pos
+    row = 0
+    for i, reference_times in enumerate(row_times(times, durations)):
+        desired = evaluate(coeffs[i], reference_times)
+        steps = len(times[i])
+        for k, t in enumerate(reference_times):
+            des_x_acc, des_y_acc, des_z_acc = desired.acceleration[0, k]
+            thrust = params.m * (params.g + des_z_acc + params.Kp_z * (desired.position[0, k, 2] - pos[:, 2])
+                                 + params.Kd_z * (desired.velocity[0, k, 2] - vel[:, 2]))
+            # attitude references are shared, the errors are per vehicle
+            reference = np.array([(des_x_acc * sin(des_yaw) - des_y_acc * cos(des_yaw)),
+                                  (des_x_acc * cos(des_yaw) - des_y_acc * sin(des_yaw)), 0])
+            reference = reference / params.g[:, None]
+            reference[:, 2] = des_yaw
+            torques = attitude_gains * (reference - att)
+
+            telemetry.t[row], telemetry.ref_t[row] = row * dt, offsets[i] + t
+            telemetry.pos[row], telemetry.vel[row], telemetry.att[row], telemetry.rates[row] = pos, vel, att, rates
+            telemetry.thrust[row], telemetry.torques[row] = thrust, torques
+            row += 1
+            if k == steps:
+                break
+
+            rates += torques * dt / inertia
+            att += rates * dt
+            thrust_vector[:, 2] = thrust
+            acc = (np.einsum('nij,nj->ni', rotation_matrices(att[:, 0], att[:, 1], att[:, 2]), thrust_vector) - weight) / params.m[:, None]
+            vel += acc * dt
+            pos += vel * dt
+        # the desired state is the same for every vehicle
+        segment_rows = slice(row - len(reference_times), row)
+        telemetry.des_pos[segment_rows] = desired.position[0, :, None]
+        telemetry.des_vel[segment_rows] = desired.velocity[0, :, None]
+        telemetry.des_acc[segment_rows] = desired.acceleration[0, :, None]
+    return telemetry
@@ -1,10 +1,14 @@
 import copy
+import math
 
 from itertools import count
 # NOTE: using this global index means that if we solve multiple 
 #       searches consecutively the index doesn't reset to 0... this is fine
 global_index = count()
 
+SQRT2 = math.sqrt(2)
+SQRT3 = math.sqrt(3)
+
 
 # TODO: implement this method
 def manhattan(a, b):
@@ -16,6 +20,34 @@ def manhattan(a, b):
     """
     return abs(b[0] - a[0]) + abs(b[1] - a[1]) + abs(b[2] - a[2])
 
+def octile_18(a, b):
+    """
+    Computes the shortest distance on an open 18-connected grid, where a move changes
+    one coordinate (cost 1) or two coordinates (cost sqrt(2))
+    @param a: a length-3 state tuple (x, y, z)
+    @param b: a length-3 state tuple
+    @return: the 18-connected octile distance between a and b
+    """
+    d3, d2, d1 = sorted((abs(b[0] - a[0]), abs(b[1] - a[1]), abs(b[2] - a[2])))
+    if d1 >= d2 + d3:
+        return (d2 + d3) * SQRT2 + (d1 - d2 - d3)
+    total = d1 + d2 + d3
+    return (total // 2) * SQRT2 + total % 2
+
+def octile_26(a, b):
+    """
+    Computes the shortest distance on an open 26-connected grid, where a move changes
+    one, two or three coordinates at cost 1, sqrt(2) or sqrt(3)
+    @param a: a length-3 state tuple (x, y, z)
+    @param b: a length-3 state tuple
+    @return: the 3D octile distance between a and b
+    """
+    d3, d2, d1 = sorted((abs(b[0] - a[0]), abs(b[1] - a[1]), abs(b[2] - a[2])))
+    return d3 * SQRT3 + (d2 - d3) * SQRT2 + (d1 - d2)
+
+# Admissible heuristic matching each Maze connectivity
+HEURISTICS = {6: manhattan, 18: octile_18, 26: octile_26}
+
 from abc import ABC, abstractmethod
 class AbstractState(ABC):
     def __init__(self, state, goal, dist_from_start=0, use_heuristic=True):
@@ -84,8 +116,8 @@ class MazeState(AbstractState):
         self.maze = maze
         self.mst_cache = mst_cache # DO NOT USE
         self.maze_neighbors = maze.getNeighbors
+        self.distance = HEURISTICS[maze.connectivity]
         super().__init__(state, goal, dist_from_start, use_heuristic)
-        print(self.state)
         
     # TODO: implement this method
     # Unlike MP 2, we do not need to remove goals, because we only want to reach one of the goals
@@ -93,6 +125,10 @@ class MazeState(AbstractState):
 
         # We provide you with a method for getting a list of neighbors of a state
         # that uses the Maze's getNeighbors function.
+        if ispart1:
+            # diagonal moves are longer than one step, so use the cost of each move
+            return [MazeState(neighbor, self.goal, self.dist_from_start + cost, self.maze, self.mst_cache, self.use_heuristic)
+                    for neighbor, cost in self.maze.getWeightedNeighbors(*self.state)]
         neighboring_locs = self.maze_neighbors(*self.state, part1=ispart1)
         nbr_states = [MazeState(neighbor, self.goal, self.dist_from_start + 1, self.maze, self.mst_cache, self.use_heuristic) for neighbor in neighboring_locs]
         return nbr_states
@@ -107,9 +143,10 @@ class MazeState(AbstractState):
     def __eq__(self, other):
         return self.state == other.state and self.goal == other.goal
     # TODO: implement this method
-    # Our heuristic is: manhattan(self.state, nearest_goal). No need for MST.
+    # Our heuristic is: distance(self.state, nearest_goal), where distance is manhattan for the
+    # 6-connected maze and the octile distance for 18/26-connected mazes. No need for MST.
     def compute_heuristic(self):
-        return min([manhattan(self.state, goal) for goal in self.goal])
+        return min([self.distance(self.state, goal) for goal in self.goal])
     
     # TODO: implement this method. It should be similar to MP 2
     def __lt__(self, other):
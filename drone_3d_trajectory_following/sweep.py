@@ -0,0 +1,127 @@
+"""
+Sweeps controller gains on a reference trajectory, flying the gain sets in a process pool.
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+import numpy as np
+from simulation import DEFAULT_DT, DEFAULT_PARAMS, Params, simulate
+from trajectory_planning import plan_trajectory
+
+# parameters a sweep may vary: the controller gains of Params, and dt the simulation step
+GAINS = tuple(name for name in Params._fields if name.startswith('K')) + ('dt',)
+# a flight has settled once the tracking error stays below this distance
+SETTLING_TOLERANCE = 0.1
+SCORES = ('rms_error', 'max_error', 'final_error', 'settling_time')
+# waypoints flown when the sweep is run as a script
+EXAMPLE_WAYPOINTS = [[-5, -5, 5], [5, -5, 5], [5, 5, 5], [-5, 5, 5]]
+
+
+def grid(**values):
+    """Every combination of the given values, e.g. grid(Kp_z=[1, 2], Kd_z=[0.5, 1])
+
+    Returns:
+        list of dicts from gain name to value
+    """
+    names = list(values)
+    return [dict(zip(names, combination)) for combination in product(*(values[name] for name in names))]
+
+
+def random_sample(ranges, samples, seed=None):
+    """Gain sets drawn uniformly, e.g. random_sample({'Kp_roll': (10, 40)}, 100)
+
+    Args:
+        ranges (dict): gain name to (low, high)
+        samples (int): number of gain sets
+        seed (int): seed of the generator
+
+    Returns:
+        list of dicts from gain name to value
+    """
+    rng = np.random.default_rng(seed)
+    columns = {name: rng.uniform(low, high, samples) for name, (low, high) in ranges.items()}
+    return [{name: float(column[i]) for name, column in columns.items()} for i in range(samples)]
+
+
+def score(telemetry, tolerance=SETTLING_TOLERANCE):
+    """Tracking error of a flight, the distance of every row's position to the reference at the same time
+
+    Returns:
+        dict with the RMS, largest and final distance to the reference, and the time after
+        which the distance stays below tolerance (inf if it never does)
+    """
+    error = np.linalg.norm(telemetry.pos - telemetry.des_pos, axis=-1)
+    if not len(error) or not np.isfinite(error).all():
+        return dict(rms_error=np.inf, max_error=np.inf, final_error=np.inf, settling_time=np.inf)
+    outside = np.flatnonzero(error > tolerance)
+    if not len(outside):
+        settling_time = telemetry.t[0]
+    elif outside[-1] == len(error) - 1:
+        settling_time = np.inf
+    else:
+        settling_time = telemetry.t[outside[-1] + 1]
+    return dict(rms_error=np.sqrt(np.mean(error ** 2)), max_error=error.max(), final_error=error[-1],
+                settling_time=settling_time)
+
+
+def run_case(coeffs, durations, start, gains, tolerance=SETTLING_TOLERANCE):
+    """Fly one gain set and score it, runs in the worker processes"""
+    gains = dict(gains)
+    dt = gains.pop('dt', DEFAULT_DT)
+    with np.errstate(all='ignore'):
+        telemetry = simulate(coeffs, durations, start=start, dt=dt, params=DEFAULT_PARAMS._replace(**gains))
+        return score(telemetry, tolerance)
+
+
+def sweep(coeffs, durations, cases, start=None, path=None, workers=None, tolerance=SETTLING_TOLERANCE):
+    """Score every gain set on the same reference trajectory
+
+    Gains missing from a case keep their DEFAULT_PARAMS value (DEFAULT_DT for dt).
+
+    Args:
+        coeffs: (N, 3, 6) coefficients of the reference trajectory
+        durations: duration of every segment
+        cases (list): dicts from gain name to value, see grid and random_sample
+        start: (x, y, z) initial position, the start of the trajectory by default
+        path (str): .npz file the results are written to, one array per column
+        workers (int): processes of the pool, the number of CPUs by default
+        tolerance (float): settling distance, see score
+
+    Returns:
+        dict from column name to array: one column per gain in GAINS, then one per score
+    """
+    # every swept name has to change the flight, so it must be a gain the controller reads
+    unknown = {name for case in cases for name in case} - set(GAINS)
+    if unknown:
+        raise ValueError('unknown gains {0}, expected some of {1}'.format(sorted(unknown), list(GAINS)))
+    count = len(cases)
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(run_case, [coeffs] * count, [durations] * count, [start] * count, cases,
+                                    [tolerance] * count, chunksize=max(1, count // (4 * workers))))
+    defaults = dict(DEFAULT_PARAMS._asdict(), dt=DEFAULT_DT)
+    columns = {name: np.array([case.get(name, defaults[name]) for case in cases], dtype=np.float64) for name in GAINS}
+    columns.update({name: np.array([result[name] for result in results], dtype=np.float64) for name in SCORES})
+    if path is not None:
+        np.savez(path, **columns)
+    return columns
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Sweep controller gains on the example trajectory')
+    parser.add_argument('path', help='.npz file to write the results to')
+    parser.add_argument('--samples', type=int, default=64, help='number of random gain sets')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+
+    plan = plan_trajectory(EXAMPLE_WAYPOINTS, 2, 2)
+    cases = random_sample({'Kp_z': (0.5, 5), 'Kd_z': (0.5, 5), 'Kp_roll': (5, 50), 'Kp_pitch': (5, 50)},
+                          args.samples, args.seed)
+    columns = sweep(plan.coeffs, plan.durations, cases, path=args.path, workers=args.workers)
+    best = np.argmin(columns['rms_error'])
+    print('best of {0}: {1} rms error {2:.3f}'.format(
+        len(cases), {name: round(float(columns[name][best]), 3) for name in ('Kp_z', 'Kd_z', 'Kp_roll', 'Kp_pitch')},
+        columns['rms_error'][best]))
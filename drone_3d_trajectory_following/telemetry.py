@@ -0,0 +1,124 @@
+"""
+Reads and writes telemetry files, streamed to disk through a memory map.
+"""
+
+import struct
+import numpy as np
+from simulation import TELEMETRY_WIDTH, telemetry_views
+
+MAGIC = b'QUADTEL\0'
+VERSION = 1
+# magic, version, record width in float64 values and number of records, padded to HEADER_SIZE
+HEADER_FORMAT = '<8sIIQ'
+HEADER_SIZE = 64
+RECORD_SIZE = TELEMETRY_WIDTH * 8
+# records the file grows by at a time
+DEFAULT_CHUNK = 4096
+
+
+class TelemetryFileError(Exception):
+    pass
+
+
+class TelemetryRecorder:
+    def __init__(self, path, chunk=DEFAULT_CHUNK):
+        """Append-only telemetry file, written through a memory map of the current chunk
+
+        The record count in the header is updated whenever a chunk is full, on flush and
+        on close, so a reader only ever sees complete records.
+
+        Args:
+            path (str): file to create, overwritten if it exists
+            chunk (int): number of records the file grows by at a time
+        """
+        self.path = path
+        self.chunk = chunk
+        self.count = 0
+        self.__file = open(path, 'w+b')
+        self.__buffer = None
+        # index of the first record of the mapped chunk
+        self.__base = 0
+        self.__write_header()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def __write_header(self):
+        self.__file.seek(0)
+        self.__file.write(struct.pack(HEADER_FORMAT, MAGIC, VERSION, TELEMETRY_WIDTH, self.count).ljust(HEADER_SIZE, b'\0'))
+        self.__file.flush()
+
+    def __map_chunk(self):
+        # grow the file by one chunk and map only that chunk
+        self.__base = self.count
+        self.__file.truncate(HEADER_SIZE + (self.__base + self.chunk) * RECORD_SIZE)
+        self.__buffer = np.memmap(self.__file, dtype=np.float64, mode='r+', offset=HEADER_SIZE + self.__base * RECORD_SIZE,
+                                  shape=(self.chunk, TELEMETRY_WIDTH))
+
+    def append(self, records):
+        """Append (n, TELEMETRY_WIDTH) records, e.g. rows of a Telemetry array
+
+        Records are time steps of one vehicle; telemetry with a vehicle axis is rejected
+        rather than written as interleaved time steps.
+        """
+        if self.__file.closed:
+            raise TelemetryFileError('{0} is closed'.format(self.path))
+        records = np.asarray(records, dtype=np.float64)
+        if records.ndim > 2 or records.shape[-1:] != (TELEMETRY_WIDTH,):
+            raise ValueError('expected (n, {0}) records of one vehicle, got shape {1}'.format(
+                TELEMETRY_WIDTH, records.shape))
+        records = records.reshape(-1, TELEMETRY_WIDTH)
+        while len(records):
+            if self.__buffer is None or self.count == self.__base + self.chunk:
+                self.flush()
+                self.__map_chunk()
+            start = self.count - self.__base
+            n = min(len(records), self.chunk - start)
+            self.__buffer[start:start + n] = records[:n]
+            self.count += n
+            records = records[n:]
+
+    def flush(self):
+        """Write the mapped chunk to the file and publish the records in the header"""
+        if self.__buffer is not None:
+            self.__buffer.flush()
+        self.__write_header()
+
+    def close(self):
+        """Flush and cut the unused end of the last chunk off the file"""
+        if self.__file.closed:
+            return
+        self.flush()
+        self.__buffer = None
+        self.__file.truncate(HEADER_SIZE + self.count * RECORD_SIZE)
+        self.__file.close()
+
+
+def read_header(path):
+    """Returns the number of complete records of a telemetry file"""
+    with open(path, 'rb') as f:
+        header = f.read(HEADER_SIZE)
+    if len(header) < HEADER_SIZE:
+        raise TelemetryFileError('{0} is too short to be a telemetry file'.format(path))
+    magic, version, width, count = struct.unpack_from(HEADER_FORMAT, header)
+    if magic != MAGIC:
+        raise TelemetryFileError('{0} is not a telemetry file'.format(path))
+    if version != VERSION or width != TELEMETRY_WIDTH:
+        raise TelemetryFileError('{0} has version {1} with {2} columns, expected version {3} with {4}'.format(
+            path, version, width, VERSION, TELEMETRY_WIDTH))
+    return count
+
+
+def read_telemetry(path):
+    """Map a telemetry file as Telemetry, every field a view into the read-only memory map
+
+    Files that are still being recorded can be read, up to the last published record.
+    """
+    count = read_header(path)
+    if count == 0:
+        return telemetry_views(np.zeros((0, TELEMETRY_WIDTH)))
+    data = np.memmap(path, dtype=np.float64, mode='r', offset=HEADER_SIZE, shape=(count, TELEMETRY_WIDTH))
+    return telemetry_views(data)
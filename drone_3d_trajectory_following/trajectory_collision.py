@@ -0,0 +1,103 @@
+"""
+Checks quintic trajectories for collisions over their whole duration.
+"""
+
+from collections import namedtuple
+import numpy as np
+from collision import BVH, as_boxes
+from TrajectoryGenerator import derivative, polyval
+
+# first contact of a trajectory: the segment, the time within that segment, the time since
+# the start of the trajectory, the index of the obstacle hit and the drone position
+Contact = namedtuple('Contact', ['segment', 't', 'time', 'obstacle', 'position'])
+
+# number of intervals each segment starts out split into
+INITIAL_INTERVALS = 16
+# intervals are bisected until the drone position within them is known to this precision
+DEFAULT_TOLERANCE = 1e-3
+
+
+class TrajectoryChecker:
+    def __init__(self, obstacles, half_extents, tolerance=DEFAULT_TOLERANCE):
+        """Check trajectories of a box shaped drone against box obstacles
+
+        Args:
+            obstacles (list): [(x1, y1, z1, x2, y2, z2), ...] obstacles
+            half_extents (array_like): half length, width and height of the drone
+            tolerance (float): precision the drone position is bounded to before sampling it
+        """
+        self.bvh = BVH(as_boxes(obstacles))
+        self.half_extents = np.asarray(half_extents, dtype=np.float64)
+        self.tolerance = tolerance
+
+    def first_contact(self, coeffs, durations):
+        """Find the first time the drone's box touches an obstacle
+
+        Each segment is split into intervals. The position over an interval lies within half
+        the interval's length times a bound on the speed from its endpoints, where the speed
+        bound uses the maximum acceleration of the segment. The drone box swept over that
+        region is tested against the BVH, all intervals at once. Intervals that touch an
+        obstacle are bisected until the position is known to the tolerance, then the drone
+        box grown by the tolerance is tested at the interval's ends and middle. Every position
+        of the interval lies within the tolerance of one of its ends, so no contact is missed,
+        at the price of reporting obstacles closer than the tolerance as contacts, possibly a
+        little before the drone box actually touches them.
+
+        Args:
+            coeffs (ndarray): (N, 3, 6) quintic coefficients of each segment and axis
+            durations (float or array_like): duration of every segment
+
+        Returns:
+            Contact, or None if the trajectory is collision free
+        """
+        coeffs = np.asarray(coeffs, dtype=np.float64).reshape(-1, 3, 6)
+        durations = np.broadcast_to(np.asarray(durations, dtype=np.float64), (len(coeffs),))
+        starts = np.concatenate(([0], np.cumsum(durations)[:-1]))
+        velocity = derivative(coeffs)
+        acceleration = derivative(velocity)
+        # triangle inequality bound of |acceleration| over [0, T] on every axis
+        powers = np.arange(acceleration.shape[-1] - 1, -1, -1)
+        max_acceleration = (np.abs(acceleration) * durations[:, None, None] ** powers).sum(axis=-1)
+
+        fractions = np.linspace(0, 1, INITIAL_INTERVALS + 1)
+        segment = np.repeat(np.arange(len(coeffs)), INITIAL_INTERVALS)
+        t0 = (durations[:, None] * fractions[None, :-1]).ravel()
+        t1 = (durations[:, None] * fractions[None, 1:]).ravel()
+        best = None
+        while len(segment):
+            h = t1 - t0
+            p0, p1 = polyval(coeffs[segment], t0[:, None]), polyval(coeffs[segment], t1[:, None])
+            v0, v1 = polyval(velocity[segment], t0[:, None]), polyval(velocity[segment], t1[:, None])
+            speed = np.maximum(np.abs(v0), np.abs(v1)) + max_acceleration[segment] * h[:, None] / 2
+            reach = speed * h[:, None] / 2 + self.half_extents
+            center = (p0 + p1) / 2
+            hit = np.zeros(len(segment), dtype=bool)
+            hit[self.bvh.query(np.concatenate([center - reach, center + reach], axis=1))[0]] = True
+
+            precise = hit & (speed * h[:, None] / 2 <= self.tolerance).all(axis=1)
+            if precise.any():
+                times = np.stack([t0[precise], (t0[precise] + t1[precise]) / 2, t1[precise]], axis=1)
+                contact = self.sample(coeffs, np.repeat(segment[precise], 3), times.ravel(), starts, self.tolerance)
+                if contact is not None and (best is None or contact.time < best.time):
+                    best = contact
+
+            # keep bisecting the intervals that may touch an obstacle before the best contact
+            split = hit & ~precise
+            if best is not None:
+                split &= starts[segment] + t0 < best.time
+            segment, t0, t1 = segment[split], t0[split], t1[split]
+            middle = (t0 + t1) / 2
+            segment, t0, t1 = np.repeat(segment, 2), np.stack([t0, middle], 1).ravel(), np.stack([middle, t1], 1).ravel()
+        return best
+
+    def sample(self, coeffs, segments, times, starts, margin=0.0):
+        """Test the drone box, grown by margin, at the given times of the given segments, returns the first Contact or None"""
+        positions = polyval(coeffs[segments], times[:, None])
+        extents = self.half_extents + margin
+        query, obstacle = self.bvh.query(np.concatenate([positions - extents, positions + extents], axis=1))
+        if not len(query):
+            return None
+        first = np.argmin(starts[segments[query]] + times[query])
+        sample = query[first]
+        return Contact(int(segments[sample]), float(times[sample]), float(starts[segments[sample]] + times[sample]),
+                       int(obstacle[first]), tuple(positions[sample].tolist()))
@@ -0,0 +1,147 @@
+"""
+Merges collinear waypoints and allocates segment durations from the drone's limits.
+"""
+
+from collections import namedtuple
+import numpy as np
+from TrajectoryGenerator import derivative, minimum_jerk, polyval, solve_segments
+from utils import EPSILON
+
+# waypoints (N + 1, 3), durations (N,) and the (N, 3, 6) minimum jerk coefficients
+TrajectoryPlan = namedtuple('TrajectoryPlan', ['waypoints', 'durations', 'coeffs'])
+
+# a rest-to-rest quintic over distance d in time T peaks at 1.875 d / T speed and
+# 10 / sqrt(3) d / T^2 acceleration
+PEAK_VELOCITY = 1.875
+PEAK_ACCELERATION = 10 / np.sqrt(3)
+# rounds of duration refinement
+REFINE_ITERATIONS = 10
+# exponent applied to the ratios of a refinement round, durations are coupled through the
+# continuity at the waypoints so full steps can oscillate
+REFINE_DAMPING = 0.5
+
+def merge_collinear(waypoints):
+    """Remove the waypoints that lie on the straight line between their neighbors
+
+    Args:
+        waypoints: (N + 1, 3) positions
+
+    Returns:
+        (M + 1, 3) array of the waypoints where the direction changes, with both ends
+    """
+    waypoints = np.asarray(waypoints, dtype=np.float64).reshape(-1, 3)
+    # repeated waypoints would be zero length segments
+    keep = np.ones(len(waypoints), dtype=bool)
+    keep[1:] = np.linalg.norm(np.diff(waypoints, axis=0), axis=1) > EPSILON
+    waypoints = waypoints[keep]
+    if len(waypoints) <= 2:
+        return waypoints
+    incoming = waypoints[1:-1] - waypoints[:-2]
+    outgoing = waypoints[2:] - waypoints[1:-1]
+    cross = np.linalg.norm(np.cross(incoming, outgoing), axis=1)
+    scale = np.linalg.norm(incoming, axis=1) * np.linalg.norm(outgoing, axis=1)
+    # turning back on the same line is a direction change too
+    straight = (cross <= EPSILON * scale) & ((incoming * outgoing).sum(axis=1) > 0)
+    return waypoints[np.concatenate(([True], ~straight, [True]))]
+
+
+def rest_to_rest_durations(waypoints, v_max, a_max):
+    """Shortest durations of rest-to-rest quintics between consecutive waypoints within the limits"""
+    distances = np.linalg.norm(np.diff(np.asarray(waypoints, dtype=np.float64).reshape(-1, 3), axis=0), axis=1)
+    return np.maximum(PEAK_VELOCITY * distances / v_max, np.sqrt(PEAK_ACCELERATION * distances / a_max))
+
+
+def real_roots(coeffs):
+    """Real parts of the roots of many highest-power-first polynomials (N, k) at once, as the
+    eigenvalues of their companion matrices
+
+    Returns:
+        (N, k - 1) array, NaN after the roots of polynomials of lower degree
+    """
+    n, degree = coeffs.shape[0], coeffs.shape[1] - 1
+    leading = coeffs[:, 0]
+    full = np.abs(leading) > EPSILON * np.abs(coeffs).max(axis=1)
+    companion = np.zeros((n, degree, degree))
+    companion[:, 0] = -coeffs[:, 1:] / np.where(full, leading, 1)[:, None]
+    companion[:, 1:, :-1] = np.eye(degree - 1)
+    roots = np.linalg.eigvals(companion).real
+    for i in np.flatnonzero(~full):
+        found = np.roots(coeffs[i]).real
+        roots[i] = np.nan
+        roots[i, :len(found)] = found
+    return roots
+
+
+def peak_norms(coeffs, durations):
+    """Largest norm of polynomial vectors over every segment
+
+    The squared norm is a polynomial too, so its maximum is at an end of the segment or at
+    a root of its derivative. The real parts of complex roots are only extra candidates,
+    they never overshoot.
+
+    Args:
+        coeffs: (N, 3, k) highest-power-first coefficients, e.g. of the velocity
+        durations: (N,) durations of the segments
+
+    Returns:
+        (N,) array
+    """
+    k = coeffs.shape[-1]
+    # in the time scaled to [0, 1] on every segment, for well conditioned roots
+    coeffs = coeffs * np.asarray(durations, dtype=np.float64)[:, None, None] ** np.arange(k - 1, -1, -1)
+    outer = np.einsum('nai,naj->nij', coeffs, coeffs)
+    squared = np.zeros((len(coeffs), 2 * k - 1))
+    for i in range(k):
+        squared[:, i:i + k] += outer[:, i]
+    roots = real_roots(derivative(squared))
+    times = np.concatenate([np.zeros((len(coeffs), 1)), np.ones((len(coeffs), 1)),
+                            np.where(np.isfinite(roots), np.clip(roots, 0, 1), 0)], axis=1)
+    return np.sqrt(np.maximum(polyval(squared[:, None], times).max(axis=1), 0))
+
+
+def limit_ratios(coeffs, durations, v_max, a_max):
+    """Peak speed over v_max and the square root of peak acceleration over a_max of every segment
+
+    A ratio above 1 means the segment breaks the limit; scaling the durations by a ratio
+    brings a rest-to-rest segment exactly to the limit.
+    """
+    velocity = derivative(np.asarray(coeffs, dtype=np.float64))
+    speed = peak_norms(velocity, durations)
+    acceleration = peak_norms(derivative(velocity), durations)
+    return np.maximum(speed / v_max, np.sqrt(acceleration / a_max))
+
+
+def plan_trajectory(waypoints, v_max, a_max, iterations=REFINE_ITERATIONS, stop_at_waypoints=False):
+    """Merge collinear waypoints and fit a minimum jerk trajectory that respects the limits
+
+    Durations start from the rest-to-rest bound of every segment. Since the minimum jerk
+    trajectory does not stop at interior waypoints, each round moves every segment's
+    duration towards its own limit. Scaling all durations by the largest ratio scales the
+    whole trajectory in time so that it just meets the limits, and the shortest trajectory
+    found that way is returned.
+
+    Args:
+        waypoints: (N + 1, 3) positions
+        v_max (float): speed limit
+        a_max (float): acceleration limit
+        iterations (int): rounds of refinement
+        stop_at_waypoints (bool): use rest-to-rest segments at their bound instead, they follow
+            the straight lines between the waypoints exactly
+
+    Returns:
+        TrajectoryPlan
+    """
+    waypoints = merge_collinear(waypoints)
+    if len(waypoints) < 2:
+        return TrajectoryPlan(waypoints, np.zeros(0), np.zeros((0, 3, 6)))
+    durations = rest_to_rest_durations(waypoints, v_max, a_max)
+    if stop_at_waypoints:
+        return TrajectoryPlan(waypoints, durations, solve_segments(waypoints, durations))
+    best = None
+    for _ in range(iterations + 1):
+        ratios = limit_ratios(minimum_jerk(waypoints, durations), durations, v_max, a_max)
+        feasible = durations * ratios.max()
+        if best is None or feasible.sum() < best.sum():
+            best = feasible
+        durations = durations * ratios ** REFINE_DAMPING
+    return TrajectoryPlan(waypoints, best, minimum_jerk(waypoints, best))
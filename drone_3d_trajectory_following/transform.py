@@ -20,6 +20,8 @@ from geometry import *
 from utils import *
 from rtree import index
 from drone import Drone
+from collision import aabb_overlap, as_boxes, drone_box, expand_boxes
+from const import DEFAULT_CONNECTIVITY
 import os
 
 
@@ -28,10 +30,11 @@ p.dimension = 3
 p.dat_extension = 'maze_dat'
 p.idx_extension = 'maze_idx'
 
-p1 = index.Property()
-p1.dimension = 3
-p1.dat_extension = 'goal_dat'
-p1.idx_extension = 'goal_idx'
+# obstacle sets up to this size are tested with NumPy box overlaps instead of an R-tree
+RTREE_MIN_OBSTACLES = 64
+
+# half size of the box around the goal the drone has to touch
+GOAL_HALF_SIZE = 0.05
 
 
 def is_drone_within_window(drone, window):
@@ -47,32 +50,44 @@ def is_drone_within_window(drone, window):
     return True
 
 def does_drone_touch_goal(drone, goal):
-    tree = index.Index('3d_index',properties=p1)
-    tree.add(0, (goal[0] - 0.05, goal[1] - 0.05, goal[2] - 0.05, goal[0] + 0.05, goal[1] + 0.05, goal[2] + 0.05)) # make a small box around the goal
-    return len(list(tree.intersection(drone.get_coords()))) != 0
+    goal_box = expand_boxes(tuple(goal) * 2, GOAL_HALF_SIZE) # make a small box around the goal
+    return bool(aabb_overlap(drone_box(drone), goal_box).any())
+
+def obstacle_test(obstacles):
+    """Returns a function telling whether a drone touches any of the obstacles
+
+    Small obstacle sets are tested all at once with NumPy, larger ones through an R-tree.
+    """
+    if len(obstacles) <= RTREE_MIN_OBSTACLES:
+        boxes = as_boxes(obstacles)
+        return lambda drone: bool(aabb_overlap(drone_box(drone), boxes).any())
+    tree = index.Index('3d_index',properties=p)
+    for i, obstacle in enumerate(obstacles):
+        tree.add(i,obstacle)
+    return lambda drone: len(list(tree.intersection(drone.get_coords()))) != 0
 
 #Generate a maze of all the valid locations the drone can be withouth going out of bounds or interesecting with an obstacle
-def transformToMaze(drone, goal, obstacles, window,granularity):
+def transformToMaze(drone, goal, obstacles, window,granularity, connectivity=DEFAULT_CONNECTIVITY):
     """This function transforms the given 2D map to the maze in MP1.
         Args:
             drone (Drone): drone instance
             goals (list): (x, y, z) of goal
             obstacles (list): [((x1,y1,z1), (x2,y2,z2))] of obstacles
             window (tuple): (width, height, depth) of the window
+            connectivity (int): 6, 18 or 26 connected moves between maze cells
             
         Return:
             Maze: the maze instance generated based on input arguments.
 
     """
-    tree = index.Index('3d_index',properties=p)
-    for i, obstacle in enumerate(obstacles):
+    for obstacle in obstacles:
         print(obstacle)
-        tree.add(i,obstacle)
+    touches_obstacle = obstacle_test(obstacles)
     mapwidth, maplength, mapheight = window
     input_map = [[[' ' for i in range(mapheight + 1)] for j in range(maplength + 1)] for k in range(mapwidth + 1)]
     startx, starty, startz = drone.get_centroid()
 
-    if not is_drone_within_window(drone, window) or len(list(tree.intersection(drone.get_coords()))) != 0:
+    if not is_drone_within_window(drone, window) or touches_obstacle(drone):
         return None
 
     for z in range(mapheight + 1):
@@ -80,16 +95,16 @@ def transformToMaze(drone, goal, obstacles, window,granularity):
         for x in range(maplength + 1):
             for y in range(mapwidth + 1):
                 drone.set_drone_pos((x,y,z))
-                if not is_drone_within_window(drone, window) or len(list(tree.intersection(drone.get_coords()))) != 0:
+                if not is_drone_within_window(drone, window) or touches_obstacle(drone):
                     input_map[x][y][z] = '%'
-                    if len(list(tree.intersection(drone.get_coords()))) != 0:
+                    if touches_obstacle(drone):
                         print(x,y,z)
                 elif does_drone_touch_goal(drone, goal):
                     input_map[x][y][z] = '.'
     
     input_map[startx][starty][startz] = 'P'
 
-    return Maze(input_map, drone, granularity=granularity)
+    return Maze(input_map, drone, granularity=granularity, connectivity=connectivity)
 
 if __name__ == '__main__':
     import configparser
@@ -12,6 +12,12 @@
 This file contains helper functions that helps other modules, 
 """
 
+import numpy as np
+from itertools import combinations, product
+
+# slack for comparing floats that went through different rounding, e.g. path costs
+EPSILON = 1e-9
+
 # Transform between alien configs and an array index
 def configToIdx(config, offsets, granularity,alien):
     result = []
@@ -74,6 +80,36 @@ def levenshteinDistance(s1, s2):
 
 # Maze ------------------------------------------------------------------------------------------------
 
+# Offsets of the 6/18/26-connected neighborhoods. The 6 face moves come first, in the same
+# order getNeighbors has always returned them, followed by the edge and then the corner moves.
+def neighborhood(connectivity):
+    """Build the move set of a 3D grid neighborhood
+
+    Args:
+        connectivity (int): 6, 18 or 26
+
+    Returns:
+        offsets (ndarray): (K, 3) int array of cell offsets
+        costs (ndarray): (K,) euclidean length of each move (1, sqrt(2) or sqrt(3))
+        guards (ndarray): (K, 6, 3) offsets of the cells a move sweeps past. A diagonal move is
+            only allowed if every cell of the unit box it crosses is free, so the drone never
+            cuts a wall corner. Unused guard slots are (0, 0, 0), i.e. the source cell.
+    """
+    max_axes = {6: 1, 18: 2, 26: 3}[connectivity]
+    faces = [(1, 0, 0), (-1, 0, 0), (0, 1, 0), (0, -1, 0), (0, 0, -1), (0, 0, 1)]
+    others = [o for o in product((-1, 0, 1), repeat=3) if 2 <= sum(map(abs, o)) <= max_axes]
+    others.sort(key=lambda o: sum(map(abs, o)))
+    offsets = np.array(faces + others, dtype=np.int64).reshape(-1, 3)
+    costs = np.sqrt(np.abs(offsets).sum(axis=1))
+
+    guards = np.zeros((len(offsets), 6, 3), dtype=np.int64)
+    for n, offset in enumerate(offsets):
+        axes = np.flatnonzero(offset)
+        subsets = [s for r in range(1, len(axes)) for s in combinations(axes, r)]
+        for g, subset in enumerate(subsets):
+            guards[n, g, list(subset)] = offset[list(subset)]
+    return offsets, costs, guards
+
 # given a list/tuple of objectives and a distance function on those objectives
 # return the weight of the Minimum Spanning Tree among those objectives
 def compute_mst_cost(objectives, distance):
@@ -0,0 +1,32 @@
+import sys
+import pathlib
+
+import numpy as np
+import pytest
+
+# the modules import each other by name, see drone_3d_trajectory_following/__init__.py
+sys.path.insert(0, str(pathlib.Path(__file__).resolve().parents[1] / 'drone_3d_trajectory_following'))
+
+from maze import Maze
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+@pytest.fixture
+def random_maze():
+    def make(rng, shape, density=0.3, objectives=1, connectivity=6):
+        """Maze with random walls, a start and objectives on free cells"""
+        grid = np.where(rng.random(shape) < density, '%', ' ').astype(object)
+        free = np.argwhere(grid == ' ')
+        if len(free) < 1 + objectives:
+            grid[...] = ' '
+            free = np.argwhere(grid == ' ')
+        picked = rng.choice(len(free), 1 + objectives, replace=False)
+        grid[tuple(free[picked[0]])] = 'P'
+        for index in picked[1:]:
+            grid[tuple(free[index])] = '.'
+        return Maze(grid.tolist(), None, connectivity=connectivity)
+    return make
@@ -0,0 +1,145 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import async_search
+from async_search import AsyncPlanner
+from maze import Maze
+from search import SearchCancelled, SearchTimeout, astar
+
+
+def corner_maze(seed=3, shape=(60, 60, 6)):
+    """Random maze from one corner to the other, A* takes a few tenths of a second on it"""
+    grid = np.where(np.random.default_rng(seed).random(shape) < 0.25, '%', ' ').astype(object)
+    grid[0, 0, 0], grid[-1, -1, -1] = 'P', '.'
+    return Maze(grid.tolist(), None)
+
+
+def test_plan_returns_astar_path(rng, random_maze):
+    maze = random_maze(rng, (12, 12, 4))
+    expected = astar(random_maze(np.random.default_rng(0), (12, 12, 4)), ispart1=True)
+
+    async def run():
+        return await AsyncPlanner(check_every=8).plan(maze)
+
+    path = asyncio.run(run())
+    assert [state.state for state in path] == [state.state for state in expected]
+
+
+def test_deadline_raises_timeout():
+    maze = corner_maze()
+
+    async def run():
+        await AsyncPlanner(check_every=1).plan(maze, timeout=0)
+
+    with pytest.raises(SearchTimeout):
+        asyncio.run(run())
+
+
+def test_outer_cancel_stops_search():
+    maze = corner_maze()
+    full = corner_maze()
+    assert astar(full, ispart1=True)
+
+    executor = ThreadPoolExecutor(max_workers=1)
+    planner = AsyncPlanner(executor, check_every=1)
+
+    async def run():
+        job = planner.plan(maze)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(job, 0.01)
+        assert job.cancelled()
+        # the single worker only picks this up once the search has stopped
+        await asyncio.wrap_future(executor.submit(lambda: None))
+        return maze.states_explored
+
+    try:
+        expanded = asyncio.run(run())
+    finally:
+        executor.shutdown()
+    # the search stopped part way, and nothing expanded it further
+    assert 0 < expanded < full.states_explored
+    assert maze.states_explored == expanded
+
+
+def test_higher_priority_preempts():
+    maze = corner_maze()
+
+    async def run():
+        planner = AsyncPlanner(check_every=1)
+        low = planner.plan(maze, priority=0)
+        await asyncio.sleep(0.01)
+        high = planner.plan(maze, priority=1)
+        with pytest.raises(SearchCancelled):
+            await low
+        return await high
+
+    assert asyncio.run(run())
+
+
+def test_preemption_spares_other_mazes():
+    maze = corner_maze(shape=(30, 30, 4))
+    other = corner_maze(shape=(8, 8, 2))
+
+    async def run():
+        planner = AsyncPlanner(check_every=1)
+        low = planner.plan(maze, priority=0)
+        await asyncio.sleep(0.01)
+        high = planner.plan(other, priority=1)
+        assert not low.cancelled()
+        return await low, await high
+
+    low, high = asyncio.run(run())
+    assert low[-1].state == maze.getObjectives()[0]
+    assert high[-1].state == other.getObjectives()[0]
+
+
+def test_progress_updates_until_the_search_ends():
+    maze = corner_maze(shape=(30, 30, 4))
+
+    async def run():
+        job = AsyncPlanner(check_every=16).plan(maze)
+        updates = [update async for update in job]
+        return updates, await job
+
+    updates, path = asyncio.run(run())
+    assert path[-1].state == maze.getObjectives()[0]
+    assert len(updates) > 1
+    assert all(b.expansions == a.expansions + 16 for a, b in zip(updates, updates[1:]))
+    assert all(b.elapsed >= a.elapsed and b.best_state.h <= a.best_state.h for a, b in zip(updates, updates[1:]))
+
+
+def test_searches_of_one_maze_take_turns(monkeypatch):
+    mazes = [corner_maze(shape=(8, 8, 2)), corner_maze(shape=(8, 8, 3))]
+    lock = threading.Lock()
+    active, peak = {id(maze): 0 for maze in mazes}, {id(maze): 0 for maze in mazes}
+    overlapped = []
+
+    def astar(maze, **options):
+        with lock:
+            active[id(maze)] += 1
+            peak[id(maze)] = max(peak[id(maze)], active[id(maze)])
+            overlapped.append(sum(active.values()) > 1)
+        time.sleep(0.05)
+        with lock:
+            active[id(maze)] -= 1
+        return maze
+
+    monkeypatch.setattr(async_search, 'astar', astar)
+    executor = ThreadPoolExecutor(max_workers=4)
+
+    async def run():
+        planner = AsyncPlanner(executor)
+        return await asyncio.gather(*(planner.plan(maze) for maze in mazes + mazes))
+
+    try:
+        assert asyncio.run(run()) == mazes + mazes
+    finally:
+        executor.shutdown()
+    assert list(peak.values()) == [1, 1]
+    # different mazes are still searched at the same time
+    assert any(overlapped)
@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+
+from collision import BVH, aabb_overlap, capsule_aabb_distance, segment_aabb_intersect, sphere_aabb_distance
+from TrajectoryGenerator import polyval, solve_segments
+from trajectory_collision import TrajectoryChecker
+
+
+def random_boxes(rng, count, size=1.0):
+    corners = rng.uniform(0, 10, (count, 3))
+    return np.concatenate([corners, corners + rng.uniform(0.05, size, (count, 3))], axis=1)
+
+
+@pytest.mark.parametrize('leaf_size', [1, 4, 16])
+@pytest.mark.parametrize('count', [0, 1, 7, 200])
+def test_bvh_matches_brute_force(rng, leaf_size, count):
+    boxes = random_boxes(rng, count)
+    queries = random_boxes(rng, 300, size=2.0)
+    query_indices, box_indices = BVH(boxes, leaf_size).query(queries)
+    found = np.zeros((len(queries), count), dtype=bool)
+    found[query_indices, box_indices] = True
+    assert len(query_indices) == found.sum()
+    assert np.array_equal(found, aabb_overlap(queries, boxes))
+
+
+def sampled_distances(starts, ends, boxes, samples=20001):
+    """Distance from every segment to every box, the smallest over points along the segment"""
+    t = np.linspace(0, 1, samples)[:, None, None]
+    points = (starts[None] + t * (ends - starts)[None]).reshape(-1, 3)
+    return sphere_aabb_distance(points, boxes).reshape(samples, len(starts), len(boxes)).min(axis=0)
+
+
+def test_sphere_aabb_distance(rng):
+    boxes, centers = random_boxes(rng, 30, size=3.0), rng.uniform(-2, 12, (50, 3))
+    for i, center in enumerate(centers):
+        for j, box in enumerate(boxes):
+            outside = np.maximum.reduce([box[:3] - center, np.zeros(3), center - box[3:]])
+            assert sphere_aabb_distance(center, box)[0, 0] == pytest.approx(np.linalg.norm(outside), abs=1e-12)
+    assert (sphere_aabb_distance(boxes[:, :3] + 0.01, boxes).diagonal() == 0).all()
+
+
+def test_segment_and_capsule_tests_match_dense_sampling(rng):
+    boxes = random_boxes(rng, 30, size=3.0)
+    starts, ends = rng.uniform(-2, 12, (2, 60, 3))
+    hit = segment_aabb_intersect(starts, ends, boxes)
+    sampled = sampled_distances(starts, ends, boxes)
+    # a sample is at most half a sampling step from the closest point of the segment
+    step = np.linalg.norm(ends - starts, axis=1)[:, None] / 20000
+    assert hit.any() and not hit.all()
+    assert (sampled[hit] <= step.repeat(len(boxes), axis=1)[hit]).all()
+    assert (sampled[~hit] > 0).all()
+
+    capsule = capsule_aabb_distance(starts, ends, boxes)
+    assert (capsule[hit] == 0).all()
+    assert (capsule <= sampled + 1e-6).all()
+    assert (sampled - capsule <= step + 1e-6).all()
+
+
+@pytest.mark.parametrize('start, end, expected', [
+    # parallel to the x faces, through the box
+    ((-1, 0.5, 0.5), (2, 0.5, 0.5), True),
+    # parallel to the x faces, beside the box
+    ((-1, 1.5, 0.5), (2, 1.5, 0.5), False),
+    # parallel to the x faces, sliding along the y = 1 face
+    ((-1, 1.0, 0.5), (2, 1.0, 0.5), True),
+    # parallel to two faces, along an edge
+    ((0.5, 1.0, 1.0), (0.5, 1.0, 3.0), True),
+    # parallel, in the slabs of y and z, but stopping short of the box
+    ((-3, 0.5, 0.5), (-1, 0.5, 0.5), False),
+    # zero length, inside and outside
+    ((0.5, 0.5, 0.5), (0.5, 0.5, 0.5), True),
+    ((1.5, 0.5, 0.5), (1.5, 0.5, 0.5), False),
+])
+def test_segment_parallel_to_faces(start, end, expected):
+    box = [0, 0, 0, 1, 1, 1]
+    assert segment_aabb_intersect(start, end, box)[0, 0] == expected
+    assert segment_aabb_intersect(end, start, box)[0, 0] == expected
+
+
+def test_first_contact_matches_dense_sampling():
+    rng = np.random.default_rng(11)
+    half_extents = np.array([0.5, 0.5, 0.1])
+    times = np.linspace(0, 5, 20001)
+    contacts = 0
+    for _ in range(20):
+        coeffs = solve_segments(rng.uniform(0, 10, (6, 3)), 5.0)
+        obstacles = random_boxes(rng, 20)
+        contact = TrajectoryChecker(obstacles, half_extents).first_contact(coeffs, 5.0)
+        first = None
+        for segment in range(len(coeffs)):
+            positions = polyval(coeffs[segment][None], times[:, None])
+            hits = aabb_overlap(np.concatenate([positions - half_extents, positions + half_extents], axis=1), obstacles).any(axis=1)
+            if hits.any():
+                first = 5 * segment + times[np.argmax(hits)]
+                break
+        if first is None:
+            assert contact is None
+        else:
+            contacts += 1
+            assert contact is not None and contact.time == pytest.approx(first, abs=0.01)
+    assert contacts
+
+
+@pytest.mark.parametrize('depth, expected', [(1e-8, True), (-0.01, False)])
+def test_first_contact_catches_grazing_contact(depth, expected):
+    # rises to z = 0 at t = 1 / 3, between any two sample times, and falls back
+    coeffs = np.array([[[0, 0, 0, 0, 1, 0], [0, 0, 0, 0, 0, 0], [0, 0, 0, -1, 2 / 3, -1 / 9]]], dtype=np.float64)
+    half_extents = np.array([0.1, 0.1, 0.1])
+    # a ceiling the top of the drone box clips by depth at the peak
+    obstacles = [(-1, -1, 0.1 - depth, 2, 1, 1)]
+    contact = TrajectoryChecker(obstacles, half_extents).first_contact(coeffs, 1.0)
+    if expected:
+        # reported no later than the touch, while the top is within the tolerance of the ceiling
+        assert contact is not None and 1 / 3 - 0.04 <= contact.time <= 1 / 3
+    else:
+        assert contact is None
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+
+from geometry import (WallIndex, do_segments_intersect, does_drone_touch_wall, is_drone_within_window,
+                      point_segment_distance, point_segment_distances, segment_distance, segment_distances,
+                      segments_intersect, wall_test, window_walls)
+
+
+class StubDrone:
+    """The parts of Drone the wall tests read, with any width"""
+
+    def __init__(self, centroid, head_and_tail, width):
+        self.centroid, self.head_and_tail, self.width = centroid, head_and_tail, width
+
+    def is_circle(self):
+        return self.head_and_tail is None
+
+    def get_centroid(self):
+        return self.centroid
+
+    def get_head_and_tail(self):
+        return self.head_and_tail
+
+    def get_width(self):
+        return self.width
+
+
+def random_walls(rng, count=200):
+    start = rng.uniform(0, 500, (count, 2))
+    return np.concatenate([start, start + rng.uniform(-40, 40, (count, 2))], axis=1).tolist()
+
+
+@pytest.mark.parametrize('granularity', [0, 3])
+def test_wall_index_matches_wall_list(rng, granularity):
+    walls = random_walls(rng) + [(100, 100, 100, 100)]
+    for _ in range(500):
+        x, y = rng.uniform(-50, 550, 2)
+        width = rng.uniform(0, 15)
+        if rng.random() < 0.4:
+            drone = StubDrone((x, y), None, width)
+        else:
+            drone = StubDrone((x, y), ((x - 25, y), (x + 25, y)), width)
+        index = WallIndex.for_drone(walls, drone, granularity)
+        assert does_drone_touch_wall(drone, index, granularity) == does_drone_touch_wall(drone, walls, granularity)
+
+
+def test_wall_test_builds_the_index_once(rng, monkeypatch):
+    walls = random_walls(rng)
+    touches_wall = wall_test(walls, StubDrone((0, 0), None, 5), 2)
+    monkeypatch.setattr(WallIndex, '__init__', None)
+    for _ in range(200):
+        x, y = rng.uniform(-50, 550, 2)
+        drone = StubDrone((x, y), ((x - 25, y), (x + 25, y)), 5)
+        assert touches_wall(drone) == does_drone_touch_wall(drone, walls, 2)
+
+
+def test_drone_within_window(rng):
+    for _ in range(200):
+        x, y = rng.uniform(-20, 120, 2)
+        drone = StubDrone((x, y), None, rng.uniform(0, 15))
+        assert is_drone_within_window(drone, (100, 80), 1) == (not does_drone_touch_wall(drone, window_walls(100, 80), 1))
+
+
+def test_point_drone_without_granularity(rng):
+    walls = random_walls(rng)
+    drone = StubDrone(tuple(walls[0][:2]), None, 0)
+    index = WallIndex.for_drone(walls, drone, 0)
+    assert index.cell_size > 0
+    assert does_drone_touch_wall(drone, index, 0)
+
+
+@pytest.mark.parametrize('cell_size', [0, -1, np.inf])
+def test_wall_index_rejects_bad_cell_size(cell_size):
+    with pytest.raises(ValueError):
+        WallIndex([(0, 0, 1, 1)], cell_size)
+
+
+def random_segments(rng, count):
+    """Segments with small integer endpoints, so collinear, touching and zero-length ones are common"""
+    segments = rng.integers(0, 5, (count, 2, 2)).astype(np.float64)
+    segments[:count // 8, 1] = segments[:count // 8, 0]
+    return segments
+
+
+def test_segments_intersect_matches_scalar(rng):
+    segments1, segments2 = random_segments(rng, 120), random_segments(rng, 100)
+    batch = segments_intersect(segments1, segments2)
+    expected = [[do_segments_intersect(tuple(map(tuple, s1)), tuple(map(tuple, s2))) for s2 in segments2.tolist()]
+                for s1 in segments1.tolist()]
+    assert np.array_equal(batch, expected)
+    # the cases the rules treat specially all occur
+    assert batch.any() and not batch.all()
+    collinear = [((0, 0), (2, 2)), ((1, 1), (3, 3)), ((3, 3), (4, 4)), ((2, 2), (3, 3)), ((1, 1), (1, 1))]
+    assert segments_intersect(collinear[:1], collinear).tolist() == [[True, True, False, True, True]]
+
+
+def test_batched_distances_match_scalar(rng):
+    points = rng.uniform(-1, 6, (40, 2))
+    segments1, segments2 = random_segments(rng, 48), random_segments(rng, 40)
+    # the zero-length segments are points
+    assert (segments1[:, 0] == segments1[:, 1]).all(axis=1).any()
+    pairs = [tuple(map(tuple, segment)) for segment in segments2.tolist()]
+
+    expected = [[point_segment_distance(tuple(point), segment) for segment in pairs] for point in points.tolist()]
+    np.testing.assert_allclose(point_segment_distances(points, segments2), expected, rtol=0, atol=1e-12)
+    np.testing.assert_allclose(point_segment_distances(points, segments1[:6, [0, 0]]),
+                               np.linalg.norm(points[:, None] - segments1[None, :6, 0], axis=-1), rtol=0, atol=1e-12)
+
+    expected = [[segment_distance(tuple(map(tuple, s1)), s2) for s2 in pairs] for s1 in segments1.tolist()]
+    np.testing.assert_allclose(segment_distances(segments1, segments2), expected, rtol=0, atol=1e-12)
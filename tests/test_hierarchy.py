@@ -0,0 +1,120 @@
+import os
+from collections import OrderedDict
+
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from hierarchy import (BUILT_CACHE_SIZE, ContractionHierarchy, HierarchyError, benchmark, cached_hierarchy_path,
+                       maze_fingerprint)
+from search import astar, search_hierarchy
+
+
+def test_maze_without_file_reuses_stored_hierarchy(rng, random_maze, tmp_path):
+    maze = random_maze(rng, (8, 8, 4), density=0.3, connectivity=18)
+    built = ContractionHierarchy.for_maze(maze, directory=str(tmp_path))
+    path = cached_hierarchy_path(built.fingerprint, str(tmp_path))
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+    stored = os.stat(path).st_mtime_ns
+
+    loaded = ContractionHierarchy.for_maze(maze, directory=str(tmp_path))
+    assert os.stat(path).st_mtime_ns == stored
+    for name in ('cells', 'rank', 'indptr', 'tails', 'weights', 'middles'):
+        assert np.array_equal(getattr(loaded, name), getattr(built, name))
+    expected = astar(maze, ispart1=True)
+    found = search_hierarchy(maze, loaded)
+    assert (found is None) == (expected is None)
+    if found is not None:
+        assert found[-1].dist_from_start == pytest.approx(expected[-1].dist_from_start)
+
+
+def test_upward_edges_lead_up_the_order(rng, random_maze, tmp_path):
+    maze = random_maze(rng, (6, 6, 3), density=0.2, connectivity=26)
+    hierarchy = ContractionHierarchy.build(maze)
+    heads = np.repeat(np.arange(len(hierarchy.rank)), np.diff(hierarchy.indptr))
+    assert (hierarchy.rank[hierarchy.tails] > hierarchy.rank[heads]).all()
+
+    # a file whose ranks break the invariant is rejected, and for_maze rebuilds it
+    path = str(tmp_path / 'maze.ch.npz')
+    hierarchy.rank = hierarchy.rank[::-1].copy()
+    hierarchy.save(path)
+    with pytest.raises(HierarchyError):
+        ContractionHierarchy.load(path)
+    heads, tails, _ = maze.getEdges()
+    rebuilt = ContractionHierarchy.for_maze(maze, path=path)
+    assert rebuilt.fingerprint == maze_fingerprint(maze, heads, tails)
+    ContractionHierarchy.load(path)
+
+
+@pytest.mark.parametrize('contents', [b'', b'not a hierarchy', None])
+def test_corrupt_file_is_rebuilt(rng, random_maze, tmp_path, contents):
+    maze = random_maze(rng, (6, 6, 3), density=0.2)
+    path = str(tmp_path / 'maze.ch.npz')
+    ContractionHierarchy.build(maze).save(path)
+    if contents is None:
+        # an interrupted write, cut in the middle of the archive
+        with open(path, 'rb') as f:
+            contents = f.read()[:os.path.getsize(path) // 2]
+    with open(path, 'wb') as f:
+        f.write(contents)
+
+    heads, tails, _ = maze.getEdges()
+    rebuilt = ContractionHierarchy.for_maze(maze, path=path)
+    assert rebuilt.fingerprint == maze_fingerprint(maze, heads, tails)
+    assert ContractionHierarchy.load(path).fingerprint == rebuilt.fingerprint
+    assert os.listdir(tmp_path) == ['maze.ch.npz']
+
+
+def test_maze_without_file_is_not_stored_by_default(rng, random_maze, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    maze = random_maze(rng, (6, 6, 3), density=0.2)
+    search_hierarchy(maze)
+    assert os.listdir(tmp_path) == []
+
+
+def test_maze_without_file_is_built_once(rng, random_maze, monkeypatch):
+    builds = []
+    build = ContractionHierarchy.build
+
+    def counted(maze, edges=None):
+        builds.append(maze)
+        return build(maze, edges)
+
+    monkeypatch.setattr(ContractionHierarchy, 'build', counted)
+    monkeypatch.setattr('hierarchy.built_hierarchies', OrderedDict())
+    mazes = [random_maze(rng, (5, 5, 3), density=0.2) for _ in range(BUILT_CACHE_SIZE + 1)]
+    first = ContractionHierarchy.for_maze(mazes[0])
+    assert ContractionHierarchy.for_maze(mazes[0]) is first
+    assert len(builds) == 1
+    for maze in mazes[1:]:
+        ContractionHierarchy.for_maze(maze)
+    # the least recently used one was dropped
+    assert ContractionHierarchy.for_maze(mazes[0]) is not first
+    assert len(builds) == BUILT_CACHE_SIZE + 2
+
+
+@pytest.mark.parametrize('connectivity', [6, 18, 26])
+def test_queries_on_larger_mazes_are_optimal(rng, random_maze, connectivity):
+    maze = random_maze(rng, (20, 20, 4), density=0.3, connectivity=connectivity)
+    hierarchy = ContractionHierarchy.build(maze)
+    heads, tails, costs = maze.getEdges()
+    size = max(heads.max(), tails.max()) + 1
+    sources = rng.integers(0, len(heads), 20)
+    expected = dijkstra(csr_matrix((costs, (heads, tails)), shape=(size, size)), indices=heads[sources])
+    for row, source in zip(expected, sources):
+        start = maze.getCell(int(heads[source]))
+        for target in rng.integers(0, len(heads), 5):
+            found = hierarchy.query(start, [maze.getCell(int(heads[target]))])
+            if np.isinf(row[heads[target]]):
+                assert found is None
+            else:
+                assert found[1] == pytest.approx(row[heads[target]])
+
+
+def test_benchmark(random_maze):
+    # python hierarchy.py on a 40x40x6 maze of density 0.3 measured 3.4 s to build with
+    # 6-connectivity and 13 s with 26-connectivity, and about 0.7 and 1.2 ms per query
+    result = benchmark(random_maze(np.random.default_rng(1), (20, 20, 4), density=0.3, connectivity=26), queries=50)
+    assert result.nodes > 1000 and result.edges > result.nodes
+    assert result.query_seconds < result.build_seconds / 100
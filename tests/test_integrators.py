@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from integrators import INTEGRATORS, Reference, benchmark, closed_loop, initial_state, integrate_rk45
+from simulation import Telemetry, simulate
+from trajectory_planning import plan_trajectory
+
+
+@pytest.fixture(scope='module')
+def plan():
+    return plan_trajectory([[-5, -5, 5], [5, -5, 5], [5, 5, 5]], 2, 2)
+
+
+@pytest.fixture(scope='module')
+def exact(plan):
+    reference = Reference(plan.coeffs, plan.durations)
+    f = closed_loop(reference)
+    return integrate_rk45(f, initial_state(reference(0)[0]), 0, reference.ends[-1], rtol=1e-11, atol=1e-13)[1][-1][:3]
+
+
+@pytest.mark.parametrize('method', list(INTEGRATORS) + ['rk45'])
+def test_simulate_selects_integrator(plan, method):
+    telemetry = simulate(plan.coeffs, plan.durations, dt=0.1, method=method)
+    assert isinstance(telemetry, Telemetry)
+    assert telemetry.t[0] == 0 and telemetry.t[-1] == pytest.approx(plan.durations.sum())
+    np.testing.assert_allclose(telemetry.pos[0], plan.waypoints[0])
+    np.testing.assert_allclose(telemetry.des_pos[-1], plan.waypoints[-1], atol=1e-9)
+
+
+@pytest.mark.parametrize('method, order', [('semi_implicit_euler', 1), ('rk4', 4)])
+def test_fixed_step_error_shrinks_with_order(plan, exact, method, order):
+    errors = [np.linalg.norm(simulate(plan.coeffs, plan.durations, dt=h, method=method).pos[-1] - exact)
+              for h in (0.04, 0.02)]
+    # halving the step divides the error by about 2 ** order
+    assert errors[0] / errors[1] > 2 ** order * 0.7
+
+
+def test_rk45_meets_tolerance(plan, exact):
+    telemetry = simulate(plan.coeffs, plan.durations, method='rk45', rtol=1e-8, atol=1e-11)
+    assert np.linalg.norm(telemetry.pos[-1] - exact) < 1e-5
+
+
+def test_unknown_method(plan):
+    with pytest.raises(ValueError):
+        simulate(plan.coeffs, plan.durations, method='midpoint')
+
+
+@pytest.mark.parametrize('method', list(INTEGRATORS) + ['rk45'])
+def test_empty_trajectory_is_the_start(method):
+    # what plan_trajectory gives when the start is the goal
+    coeffs, durations = np.zeros((0, 3, 6)), np.zeros(0)
+    expected = simulate(coeffs, durations, start=(1, 2, 3))
+    telemetry = simulate(coeffs, durations, start=(1, 2, 3), method=method)
+    for field in Telemetry._fields:
+        np.testing.assert_array_equal(getattr(telemetry, field), getattr(expected, field))
+
+
+def test_benchmark_compares_at_the_end_of_the_flight(plan):
+    rows = benchmark(plan.coeffs, plan.durations, steps=(0.1,), tolerances=(1e-6,))
+    assert [row.method for row in rows] == ['simulate'] + list(INTEGRATORS) + ['rk45']
+    reference = Reference(plan.coeffs, plan.durations)
+    telemetry = simulate(plan.coeffs, plan.durations, dt=0.1)
+    exact = integrate_rk45(closed_loop(reference), initial_state(reference(0)[0]), 0, telemetry.t[-1],
+                           rtol=1e-11, atol=1e-13)[1][-1][:3]
+    assert rows[0].error == pytest.approx(np.linalg.norm(telemetry.pos[-1] - exact))
@@ -0,0 +1,75 @@
+import math
+
+import numpy as np
+import pytest
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import dijkstra
+
+from maze import Maze
+from state import HEURISTICS
+from utils import neighborhood
+
+
+def open_maze(shape, connectivity, walls=()):
+    grid = np.full(shape, ' ', dtype=object)
+    for cell in walls:
+        grid[cell] = '%'
+    grid[0, 0, 0], grid[-1, -1, -1] = 'P', '.'
+    return Maze(grid.tolist(), None, connectivity=connectivity)
+
+
+def neighbor_offsets(maze, cell):
+    return {tuple(np.subtract(neighbor, cell).tolist()): cost for neighbor, cost in maze.getWeightedNeighbors(*cell)}
+
+
+@pytest.mark.parametrize('connectivity, axes', [(6, 1), (18, 2), (26, 3)])
+def test_move_sets_and_costs(connectivity, axes):
+    offsets, costs, _ = neighborhood(connectivity)
+    expected = {o for o in np.ndindex(3, 3, 3) if 1 <= sum(abs(c - 1) for c in o) <= axes}
+    assert {tuple(o) for o in (offsets + 1).tolist()} == expected
+    assert len(offsets) == connectivity
+    np.testing.assert_allclose(costs, np.sqrt(np.abs(offsets).sum(axis=1)))
+
+    # in the open every move is allowed, at its euclidean length
+    moves = neighbor_offsets(open_maze((3, 3, 3), connectivity), (1, 1, 1))
+    assert moves == pytest.approx({tuple(o): math.sqrt(sum(map(abs, o))) for o in offsets.tolist()})
+
+
+@pytest.mark.parametrize('connectivity', [18, 26])
+def test_diagonal_moves_do_not_cut_corners(connectivity):
+    offsets = [tuple(o) for o in neighborhood(connectivity)[0].tolist()]
+    # a wall next to the cell blocks every move that sweeps past it
+    moves = neighbor_offsets(open_maze((3, 3, 3), connectivity, [(2, 1, 1)]), (1, 1, 1))
+    assert set(moves) == {o for o in offsets if o[0] != 1}
+
+    # a wall on an edge of the cell only blocks the moves across that edge
+    moves = neighbor_offsets(open_maze((3, 3, 3), connectivity, [(2, 2, 1)]), (1, 1, 1))
+    assert set(moves) == {o for o in offsets if o[:2] != (1, 1)}
+
+
+def graph_distances(maze, sources):
+    heads, tails, costs = maze.getEdges()
+    size = max(heads.max(), tails.max()) + 1
+    return dijkstra(csr_matrix((costs, (heads, tails)), shape=(size, size)),
+                    indices=[maze.getIndex(*cell) for cell in sources])
+
+
+@pytest.mark.parametrize('connectivity', [6, 18, 26])
+def test_heuristics_are_admissible(random_maze, connectivity):
+    heuristic = HEURISTICS[connectivity]
+    # exact on an open grid
+    maze = open_maze((6, 5, 4), connectivity)
+    cells = [tuple(cell) for cell in np.argwhere(np.ones((6, 5, 4))).tolist()]
+    for source, distances in zip(cells[::7], graph_distances(maze, cells[::7])):
+        for cell in cells:
+            assert heuristic(source, cell) == pytest.approx(distances[maze.getIndex(*cell)])
+
+    # never above the shortest path around walls
+    rng = np.random.default_rng(connectivity)
+    for _ in range(10):
+        maze = random_maze(rng, tuple(rng.integers(3, 9, 3)), density=rng.uniform(0.2, 0.5), connectivity=connectivity)
+        cells = [tuple(cell) for cell in np.argwhere(maze.getComponents() > 0).tolist()]
+        sources = cells[::5]
+        for source, distances in zip(sources, graph_distances(maze, sources)):
+            for cell in cells:
+                assert heuristic(source, cell) <= distances[maze.getIndex(*cell)] + 1e-9
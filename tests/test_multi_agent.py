@@ -0,0 +1,119 @@
+import numpy as np
+import pytest
+
+from maze import Maze
+from multi_agent import ReservationTable, SpaceTimePlanner
+
+
+def corridor_maze(length, pockets=()):
+    """Corridor of free cells (x, 0, 0), with the cells (x, 1, 0) of pockets free as well"""
+    grid = np.full((length, 2, 1), '%', dtype=object)
+    grid[:, 0, 0] = ' '
+    for x in pockets:
+        grid[x, 1, 0] = ' '
+    grid[0, 0, 0], grid[-1, 0, 0] = 'P', '.'
+    return Maze(grid.tolist(), None, connectivity=6)
+
+
+def random_agents(rng, maze, count):
+    """Distinct starts and distinct goals on free cells"""
+    cells = np.argwhere(np.ones(maze.getDimensions(), dtype=bool))
+    free = [tuple(cell) for cell in cells[maze.areFree(cells)].tolist()]
+    picked = rng.choice(len(free), 2 * count, replace=False)
+    return [(free[picked[i]], free[picked[count + i]]) for i in range(count)]
+
+
+def assert_conflict_free(maze, agents, paths):
+    length = max(map(len, paths))
+    # drones wait on their goal once they arrive
+    padded = [path + [path[-1]] * (length - len(path)) for path in paths]
+    for (start, goal), path in zip(agents, paths):
+        assert path[0] == start and path[-1] == goal
+        for a, b in zip(path, path[1:]):
+            assert a == b or b in [neighbor for neighbor, _ in maze.getWeightedNeighbors(*a)]
+    for t in range(length):
+        cells = [path[t] for path in padded]
+        assert len(set(cells)) == len(cells), 'two drones share a cell at {0}'.format(t)
+        if t:
+            moves = {(path[t - 1], path[t]) for path in padded if path[t - 1] != path[t]}
+            assert not any((b, a) in moves for a, b in moves), 'two drones swap cells at {0}'.format(t)
+
+
+def test_plans_are_conflict_free_and_cbs_is_no_worse(random_maze):
+    rng = np.random.default_rng(7)
+    compared = 0
+    for _ in range(25):
+        maze = random_maze(rng, (5, 5, 2), density=0.2)
+        agents = random_agents(rng, maze, int(rng.integers(2, 5)))
+        planner = SpaceTimePlanner(maze)
+        prioritized = planner.prioritized(agents)
+        cbs = planner.cbs(agents, max_nodes=2000)
+        for plan in (prioritized, cbs):
+            if all(path is not None for path in plan.paths):
+                assert_conflict_free(maze, agents, plan.paths)
+                assert plan.cost == sum(len(path) - 1 for path in plan.paths)
+        if all(path is not None for path in prioritized.paths) and all(path is not None for path in cbs.paths):
+            assert cbs.cost <= prioritized.cost
+            compared += 1
+    assert compared >= 10
+
+
+def test_cbs_resolves_a_swap_through_a_pocket():
+    maze = corridor_maze(5, pockets=[2])
+    agents = [((0, 0, 0), (4, 0, 0)), ((4, 0, 0), (0, 0, 0))]
+    plan = SpaceTimePlanner(maze).cbs(agents)
+    assert_conflict_free(maze, agents, plan.paths)
+    # one drone steps into the pocket and back out, the other waits one step for it
+    assert plan.cost == 4 + 1 + 4 + 2
+
+
+def test_cbs_gives_up_after_max_nodes():
+    planner = SpaceTimePlanner(corridor_maze(5, pockets=[2]))
+    agents = [((0, 0, 0), (4, 0, 0)), ((4, 0, 0), (0, 0, 0))]
+    assert planner.cbs(agents, max_nodes=1).paths == [None, None]
+    # without a pocket the drones can never pass each other
+    planner = SpaceTimePlanner(corridor_maze(5))
+    plan = planner.cbs(agents, horizon=12, max_nodes=50)
+    assert plan.paths == [None, None] and plan.cost == 0
+
+
+def test_drone_only_parks_on_its_goal_after_the_last_reservation():
+    maze = corridor_maze(7, pockets=[3])
+    # the second drone could reach its goal in one move, but the first one crosses it at t = 3
+    agents = [((0, 0, 0), (6, 0, 0)), ((3, 1, 0), (3, 0, 0))]
+    plan = SpaceTimePlanner(maze).prioritized(agents)
+    assert_conflict_free(maze, agents, plan.paths)
+    # it may pass its goal earlier, but only stops there once the first drone has gone by
+    assert len(plan.paths[1]) - 1 == 4
+
+
+def test_parked_drone_blocks_the_drones_planned_after_it():
+    maze = corridor_maze(7, pockets=[3])
+    agents = [((3, 1, 0), (3, 0, 0)), ((0, 0, 0), (6, 0, 0))]
+    plan = SpaceTimePlanner(maze).prioritized(agents)
+    assert plan.paths[0] == [(3, 1, 0), (3, 0, 0)]
+    assert plan.paths[1] is None
+
+
+def test_reservation_table():
+    table = ReservationTable(10)
+    table.reserve_path([1, 2, 3])
+    assert not table.is_free(0, 2, 0)   # 2 is taken at t = 1
+    assert table.is_free(0, 2, 1)
+    assert not table.is_free(2, 1, 0)   # swaps with the move 1 -> 2
+    assert not table.is_free(4, 3, 5)   # parked on 3 from t = 2 on
+    assert table.is_free(4, 3, 0)
+    copy = table.copy()
+    copy.reserve_cell(5, 1)
+    assert table.is_free(4, 5, 0) and not copy.is_free(4, 5, 0)
+
+
+@pytest.mark.parametrize('paths, expected', [
+    ([[0, 1, 2], [4, 3, 2]], [(0, (2, 2), 1), (1, (2, 2), 1)]),
+    ([[0, 1, 2], [3, 2, 1]], [(0, (1, 2), 1), (1, (2, 1), 1)]),
+    # the first drone waits on its goal
+    ([[0, 1], [3, 2, 1]], [(0, (1, 1), 1), (1, (1, 1), 1)]),
+    ([[0, 1, 2], [5, 4, 3]], None),
+])
+def test_first_conflict(paths, expected):
+    assert SpaceTimePlanner.first_conflict(paths) == expected
@@ -0,0 +1,91 @@
+from types import SimpleNamespace
+
+import matplotlib
+import numpy as np
+import pytest
+
+# the animated tests draw offscreen
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+
+import Quadrotor as quadrotor_module
+from Quadrotor import Quadrotor
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A fake time.perf_counter for Quadrotor, advanced by hand"""
+    clock = SimpleNamespace(now=0.0)
+    monkeypatch.setattr(quadrotor_module, 'time', SimpleNamespace(perf_counter=lambda: clock.now))
+    yield clock
+    plt.close('all')
+
+
+def fly(quadrotor, count):
+    for i in range(1, count + 1):
+        quadrotor.update_pose(i, 2 * i, 3 * i, 0, 0, 0)
+
+
+def test_history_is_preallocated_then_wraps():
+    quadrotor = Quadrotor(show_animation=False, history=1000)
+    history = quadrotor.history
+    assert history.shape == (1000, 3)
+    fly(quadrotor, 500)
+    assert np.array_equal(quadrotor.path()[:, 0], np.arange(501))
+
+    fly(quadrotor, 3000)
+    assert quadrotor.history is history
+    assert np.array_equal(quadrotor.path(3), [[2998, 5996, 8994], [2999, 5998, 8997], [3000, 6000, 9000]])
+
+
+def test_decimation_records_every_nth_pose():
+    quadrotor = Quadrotor(show_animation=False, decimation=10)
+    fly(quadrotor, 100)
+    assert np.array_equal(quadrotor.path()[:, 0], np.arange(0, 101, 10))
+
+
+def test_coordinate_lists_are_read_only_arrays():
+    quadrotor = Quadrotor(show_animation=False)
+    fly(quadrotor, 4)
+    assert np.array_equal(quadrotor.y_data, [0, 2, 4, 6, 8])
+    with pytest.raises(AttributeError):
+        quadrotor.z_data = np.zeros(5)
+
+
+def test_frames_blit_onto_the_cached_background(clock):
+    quadrotor = Quadrotor(history=50, tail=None, fps=None, obstacles=[(1, 1, 1, 2, 2, 2)])
+    background, artists = quadrotor.background, quadrotor.artists
+    assert background is not None
+    lines, collections = len(quadrotor.ax.lines), len(quadrotor.ax.collections)
+    fly(quadrotor, 200)
+    # the same artists are updated, nothing is added and the background is kept
+    assert quadrotor.background is background and quadrotor.artists == artists
+    assert (len(quadrotor.ax.lines), len(quadrotor.ax.collections)) == (lines, collections)
+    # the ring buffer caps the trail
+    xs, ys, zs = quadrotor.trail.get_data_3d()
+    assert np.array_equal(xs, np.arange(151, 201))
+    assert np.array_equal(quadrotor.rotors.get_data_3d()[2], [600] * 4)
+
+
+def test_trail_is_the_tail_of_the_history(clock):
+    quadrotor = Quadrotor(history=50, tail=20, fps=None)
+    fly(quadrotor, 200)
+    assert np.array_equal(quadrotor.trail.get_data_3d()[0], np.arange(181, 201))
+
+
+def test_frames_are_skipped_to_meet_the_fps(clock, monkeypatch):
+    quadrotor = Quadrotor(fps=8)
+    frames, plot = [], quadrotor.plot
+
+    def counted():
+        frames.append(clock.now)
+        plot()
+
+    monkeypatch.setattr(quadrotor, 'plot', counted)
+    # poses every 1/64 s for two seconds, exact in binary
+    for i in range(1, 129):
+        clock.now = i / 64
+        quadrotor.update_pose(i, 0, 0, 0, 0, 0)
+    # one pose in eight is drawn, the history still has every pose
+    assert frames == [k / 8 for k in range(1, 17)]
+    assert quadrotor.recorded == 129
@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+from maze import Maze
+from reduction import ReducedGraph
+from search import astar, astar_reduced
+
+# two corridors between junctions at (0, 2) and (2, 4), and a dead end hanging off (2, 2)
+LAYOUT = ['P    ',
+          '%% % ',
+          '%%   ',
+          '%% % ',
+          '%% %.']
+
+
+def layout_maze(layout):
+    grid = [[[char] for char in row] for row in layout]
+    return Maze(grid, None)
+
+
+def test_dead_ends_and_corridors():
+    maze = layout_maze(LAYOUT)
+    graph = ReducedGraph(maze)
+    # (4, 2), then (3, 2) once (4, 2) is gone
+    assert graph.pruned == 2
+    assert sorted(maze.getCell(v) for v in graph.junctions) == [(0, 0, 0), (0, 2, 0), (2, 4, 0), (4, 4, 0)]
+    assert graph.contracted == 8
+    start, left, right, goal = (maze.getIndex(*cell) for cell in [(0, 0, 0), (0, 2, 0), (2, 4, 0), (4, 4, 0)])
+    assert set(graph.edges[left]) == {start, right}
+    assert graph.edges[left][right][0] == pytest.approx(4)
+    assert len(graph.edges[left][right][1]) == 3
+    assert graph.edges[right][goal] == (pytest.approx(2), (maze.getIndex(3, 4, 0),))
+
+    path = astar_reduced(maze, graph)
+    assert path[-1].dist_from_start == pytest.approx(8)
+    # the path runs through the corridor the graph kept between the junctions
+    corridor = [maze.getCell(v) for v in graph.edges[left][right][1]]
+    assert [state.state for state in path] == [(0, 0, 0), (0, 1, 0), (0, 2, 0)] + corridor + [(2, 4, 0), (3, 4, 0), (4, 4, 0)]
+
+
+@pytest.mark.parametrize('connectivity', [6, 18, 26])
+def test_reduced_search_matches_astar(random_maze, connectivity):
+    rng = np.random.default_rng(connectivity + 2)
+    for _ in range(30):
+        maze = random_maze(rng, tuple(rng.integers(3, 10, 3)), density=rng.uniform(0.3, 0.6),
+                           objectives=int(rng.integers(1, 3)), connectivity=connectivity)
+        expected = astar(maze, ispart1=True)
+        path = astar_reduced(maze)
+        assert (path is None) == (expected is None)
+        if path is None:
+            continue
+        assert path[-1].dist_from_start == pytest.approx(expected[-1].dist_from_start)
+        assert path[0].state == maze.getStart().state and path[-1].state in maze.getObjectives()
+        # every step of the expanded path is a single move of the maze
+        for a, b in zip(path, path[1:]):
+            assert b.state in dict(maze.getWeightedNeighbors(*a.state))
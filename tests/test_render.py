@@ -0,0 +1,53 @@
+import os
+
+import numpy as np
+import pytest
+from matplotlib.image import imread
+
+from render import export, frame_indices
+from simulation import simulate
+from telemetry import TelemetryRecorder, read_telemetry
+from trajectory_planning import plan_trajectory
+
+
+@pytest.mark.parametrize('dt, fps', [(0.2, 10), (0.1, 25), (0.04, 25), (0.3, 7)])
+def test_frame_indices_show_the_last_row_before_the_frame(dt, fps):
+    t = np.arange(40) * dt
+    indices = frame_indices(t, fps)
+    assert len(indices) == int(round(t[-1] * fps, 6)) + 1
+    assert indices[0] == 0
+    frame_times = np.arange(len(indices)) / fps
+    assert (t[indices] <= frame_times + 1e-9).all()
+    # the next row is recorded after the frame
+    later = indices + 1 < len(t)
+    assert (t[indices[later] + 1] > frame_times[later] + 1e-9).all()
+
+
+def test_frame_indices_of_uneven_rows():
+    t = np.array([0, 0.05, 0.3, 0.31, 1.0])
+    assert frame_indices(t, 10).tolist() == [0, 1, 1, 2, 3, 3, 3, 3, 3, 3, 4]
+
+
+def test_empty_telemetry_has_no_frames(tmp_path):
+    path = str(tmp_path / 'empty.tel')
+    with TelemetryRecorder(path):
+        pass
+    telemetry = read_telemetry(path)
+    assert len(telemetry.t) == 0
+    indices = frame_indices(telemetry.t)
+    assert indices.shape == (0,) and indices.dtype == np.int64
+    assert export(telemetry, str(tmp_path / 'frame_{:05d}.png')) == 0
+    assert os.listdir(tmp_path) == ['empty.tel']
+
+
+def test_export_png_frames_across_workers(tmp_path):
+    plan = plan_trajectory([[2, 2, 2], [4, 2, 3], [4, 4, 3]], 2, 2)
+    telemetry = simulate(plan.coeffs, plan.durations, dt=0.2)
+    fps = 5
+    pattern = str(tmp_path / 'frame_{:04d}.png')
+    frames = export(telemetry, pattern, obstacles=[(5, 5, 0, 6, 6, 2)], fps=fps, workers=2, size=(2, 1.5), dpi=40)
+    assert frames == len(frame_indices(telemetry.t, fps))
+    assert sorted(os.listdir(tmp_path)) == [os.path.basename(pattern.format(k)) for k in range(frames)]
+    first, last = imread(pattern.format(0)), imread(pattern.format(frames - 1))
+    assert first.shape == last.shape == (60, 80, 4)
+    assert not np.array_equal(first, last)
@@ -0,0 +1,105 @@
+from collections import deque
+
+import numpy as np
+import pytest
+from scipy import ndimage
+
+from hierarchy import ContractionHierarchy
+from maze import Maze
+from reduction import ReducedGraph
+from search import astar, astar_reduced, ida_star, search_hierarchy
+
+
+def assert_valid(maze, path):
+    assert path[0].state == maze.getStart().state
+    assert path[-1].state in maze.getObjectives()
+    for a, b in zip(path, path[1:]):
+        assert b.state in [neighbor for neighbor, _ in maze.getWeightedNeighbors(*a.state)]
+
+
+@pytest.mark.parametrize('connectivity', [6, 18, 26])
+def test_optimal_searches_agree(random_maze, connectivity):
+    rng = np.random.default_rng(connectivity)
+    for _ in range(40):
+        maze = random_maze(rng, tuple(rng.integers(3, 9, 3)), density=rng.uniform(0.2, 0.6),
+                           objectives=int(rng.integers(1, 3)), connectivity=connectivity)
+        expected = astar(maze, ispart1=True)
+        paths = [astar_reduced(maze, ReducedGraph(maze)),
+                 search_hierarchy(maze, ContractionHierarchy.build(maze)),
+                 ida_star(maze),
+                 # a budget this small only keeps the transposition table from helping
+                 ida_star(maze, node_budget=8)]
+        for path in paths:
+            assert (path is None) == (expected is None)
+            if path is not None:
+                assert_valid(maze, path)
+                assert path[-1].dist_from_start == pytest.approx(expected[-1].dist_from_start, abs=1e-9)
+
+
+def same_partition(labels, expected):
+    """Whether two labelings split the cells into the same components, whatever the label values"""
+    pairs = np.unique(np.stack([labels.ravel(), expected.ravel()]), axis=1)
+    return len(np.unique(pairs[0])) == len(np.unique(pairs[1])) == pairs.shape[1]
+
+
+@pytest.mark.parametrize('connectivity', [6, 18, 26])
+def test_components_match_search(random_maze, connectivity):
+    rng = np.random.default_rng(connectivity + 1)
+    for _ in range(20):
+        maze = random_maze(rng, tuple(rng.integers(2, 10, 3)), density=rng.uniform(0.2, 0.7), connectivity=connectivity)
+        labels = maze.getComponents()
+        free = labels > 0
+        assert np.array_equal(free, maze.areFree(np.argwhere(np.ones_like(free))).reshape(free.shape))
+
+        # breadth-first search over the moves of the maze itself
+        expected = np.zeros_like(labels)
+        for count, cell in enumerate(map(tuple, np.argwhere(free).tolist()), 1):
+            if expected[cell]:
+                continue
+            expected[cell] = count
+            queue = deque([cell])
+            while queue:
+                for neighbor, _ in maze.getWeightedNeighbors(*queue.popleft()):
+                    if not expected[neighbor]:
+                        expected[neighbor] = count
+                        queue.append(neighbor)
+        assert same_partition(labels, expected)
+        for cell in map(tuple, np.argwhere(free)[:5].tolist()):
+            assert maze.getComponent(*cell) == labels[cell]
+
+        # moves may not cut corners, so every connectivity has the face-connected components
+        assert same_partition(labels, ndimage.label(free, ndimage.generate_binary_structure(3, 1))[0])
+
+
+def test_ida_star_peak_counts_pending_successors(random_maze):
+    maze = random_maze(np.random.default_rng(4), (10, 10, 3), density=0.2, connectivity=26)
+    path = ida_star(maze)
+    # every frame on the path holds the successors it has not tried yet
+    assert maze.peak_states > len(path)
+
+
+@pytest.mark.parametrize('connectivity, shape', [(26, (25, 25, 5)), (18, (40, 40, 5))])
+def test_ida_star_iterations_on_diagonal_mazes(connectivity, shape):
+    grid = np.where(np.random.default_rng(0).random(shape) < 0.3, '%', ' ').astype(object)
+    grid[0, 0, 0], grid[-1, -1, -1] = 'P', '.'
+    maze = Maze(grid.tolist(), None, connectivity=connectivity)
+    expected = astar(maze, ispart1=True)
+    astar_explored = maze.states_explored
+    maze.states_explored = 0
+    path = ida_star(maze)
+    assert_valid(maze, path)
+    assert path[-1].dist_from_start == pytest.approx(expected[-1].dist_from_start, abs=1e-9)
+    # raising the bound to the next distinct f re-searched the maze about a hundred times
+    assert maze.states_explored < 30 * astar_explored
+
+
+@pytest.mark.parametrize('bound_step', [0, 0.5, 10])
+def test_ida_star_bound_step_keeps_the_path_optimal(random_maze, bound_step):
+    rng = np.random.default_rng(7)
+    for _ in range(20):
+        maze = random_maze(rng, (8, 8, 3), density=0.3, connectivity=26)
+        expected = astar(maze, ispart1=True)
+        path = ida_star(maze, bound_step=bound_step)
+        assert (path is None) == (expected is None)
+        if path is not None:
+            assert path[-1].dist_from_start == pytest.approx(expected[-1].dist_from_start, abs=1e-9)
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from maze import Maze
+from search import astar
+from shortcut import line_of_sight, shortcut_path, traversed_cells
+
+
+def cell_set(cells):
+    return {tuple(cell) for cell in np.asarray(cells).tolist()}
+
+
+@pytest.mark.parametrize('a, b, expected', [
+    ((0, 0, 0), (2, 0, 0), [(0, 0, 0), (1, 0, 0), (2, 0, 0)]),
+    # through the edge shared by four cells
+    ((0, 0, 0), (1, 1, 0), [(0, 0, 0), (1, 0, 0), (0, 1, 0), (1, 1, 0)]),
+    # through the corner shared by eight cells
+    ((0, 0, 0), (1, 1, 1), [(x, y, z) for x in (0, 1) for y in (0, 1) for z in (0, 1)]),
+    # through the middle of the face between (1, 0, 0) and (1, 1, 0)
+    ((0, 0, 0), (2, 1, 0), [(0, 0, 0), (1, 0, 0), (1, 1, 0), (2, 1, 0)]),
+    ((3, 1, 2), (3, 1, 2), [(3, 1, 2)]),
+])
+def test_traversed_cells_on_edges_and_corners(a, b, expected):
+    assert cell_set(traversed_cells(a, b)) == set(expected)
+    assert cell_set(traversed_cells(b, a)) == set(expected)
+
+
+def test_traversed_cells_cover_the_segment(rng):
+    for _ in range(200):
+        a, b = rng.integers(-4, 5, (2, 3))
+        cells = cell_set(traversed_cells(a, b))
+        t = np.linspace(0, 1, 2001)[:, None]
+        sampled = cell_set(np.round(a + t * (b - a)).astype(int))
+        assert sampled <= cells
+        # and nothing further than half a cell from the segment, up to the sampling step
+        for cell in cells:
+            d = np.abs(a + t * (b - a) - cell).max(axis=1).min()
+            assert d <= 0.5 + 1e-2
+
+
+def assert_waypoints(maze, path, waypoints, removed):
+    cells = [path_cell.state for path_cell in path]
+    assert waypoints[0] == cells[0] and waypoints[-1] == cells[-1]
+    assert removed == len(cells) - len(waypoints)
+    indices = [cells.index(waypoint) for waypoint in waypoints]
+    assert indices == sorted(indices)
+    for a, b in zip(waypoints, waypoints[1:]):
+        assert line_of_sight(maze, a, b)
+
+
+@pytest.mark.parametrize('connectivity', [6, 26])
+def test_shortcut_keeps_line_of_sight(random_maze, connectivity):
+    rng = np.random.default_rng(connectivity)
+    shortened = 0
+    for _ in range(30):
+        maze = random_maze(rng, (8, 8, 3), density=0.25, connectivity=connectivity)
+        path = astar(maze, ispart1=True)
+        if path is None:
+            continue
+        greedy, greedy_removed = shortcut_path(maze, path)
+        optimal, optimal_removed = shortcut_path(maze, path, optimal=True)
+        assert_waypoints(maze, path, greedy, greedy_removed)
+        assert_waypoints(maze, path, optimal, optimal_removed)
+        assert len(optimal) <= len(greedy)
+        shortened += greedy_removed > 0
+    assert shortened > 0
+
+
+def test_short_paths_are_kept():
+    assert shortcut_path(None, [(0, 0, 0), (1, 0, 0)]) == ([(0, 0, 0), (1, 0, 0)], 0)
+    assert shortcut_path(None, []) == ([], 0)
+
+
+def test_shortcut_avoids_boxes():
+    grid = np.full((5, 5, 1), ' ', dtype=object)
+    grid[0, 0, 0], grid[4, 4, 0] = 'P', '.'
+    maze = Maze(grid.tolist(), None, connectivity=6)
+    path = [(x, 0, 0) for x in range(5)] + [(4, y, 0) for y in range(1, 5)]
+    assert shortcut_path(maze, path) == ([(0, 0, 0), (4, 4, 0)], 7)
+
+    # a box on the diagonal, clear of the path along the edges
+    boxes = np.array([[1.5, 1.5, -1, 2.5, 2.5, 1]])
+    assert not line_of_sight(maze, (0, 0, 0), (4, 4, 0), boxes)
+    waypoints, removed = shortcut_path(maze, path, boxes=boxes)
+    assert waypoints[0] == (0, 0, 0) and waypoints[-1] == (4, 4, 0) and len(waypoints) > 2
+    assert removed == len(path) - len(waypoints)
+    for a, b in zip(waypoints, waypoints[1:]):
+        assert line_of_sight(maze, a, b, boxes)
@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+import drone_3d_trajectory_following as app
+from simulation import DEFAULT_PARAMS, Telemetry, simulate, simulate_ensemble
+from TrajectoryGenerator import evaluate
+from trajectory_planning import plan_trajectory
+
+
+@pytest.fixture
+def plan(rng):
+    waypoints = np.cumsum(rng.uniform(-2, 2, (6, 3)), axis=0) + 2
+    return plan_trajectory(waypoints, 2, 2)
+
+
+# the quintic polynomials the original quad_sim evaluated term by term
+def position(c, t):
+    return c[0] * t**5 + c[1] * t**4 + c[2] * t**3 + c[3] * t**2 + c[4] * t + c[5]
+
+
+def velocity(c, t):
+    return 5 * c[0] * t**4 + 4 * c[1] * t**3 + 3 * c[2] * t**2 + 2 * c[3] * t + c[4]
+
+
+def acceleration(c, t):
+    return 20 * c[0] * t**3 + 12 * c[1] * t**2 + 6 * c[2] * t + 2 * c[3]
+
+
+def quad_sim_poses(x_c, y_c, z_c, durations, dt=0.2):
+    """The loop of the original quad_sim, returning the pose after every step"""
+    p = DEFAULT_PARAMS
+    x_pos, y_pos, z_pos = 2, 2, 2
+    x_vel = y_vel = z_vel = 0
+    roll = pitch = yaw = 0
+    roll_vel = pitch_vel = yaw_vel = 0
+    des_yaw = 0
+    poses = [(x_pos, y_pos, z_pos, roll, pitch, yaw)]
+    for i, T in enumerate(durations):
+        t = 0
+        while t <= T:
+            des_z_pos = position(z_c[i], t)
+            des_z_vel = velocity(z_c[i], t)
+            des_x_acc = acceleration(x_c[i], t)
+            des_y_acc = acceleration(y_c[i], t)
+            des_z_acc = acceleration(z_c[i], t)
+
+            thrust = p.m * (p.g + des_z_acc + p.Kp_z * (des_z_pos - z_pos) + p.Kd_z * (des_z_vel - z_vel))
+            roll_torque = p.Kp_roll * (((des_x_acc * np.sin(des_yaw) - des_y_acc * np.cos(des_yaw)) / p.g) - roll)
+            pitch_torque = p.Kp_pitch * (((des_x_acc * np.cos(des_yaw) - des_y_acc * np.sin(des_yaw)) / p.g) - pitch)
+            yaw_torque = p.Kp_yaw * (des_yaw - yaw)
+
+            roll_vel += roll_torque * dt / p.Ixx
+            pitch_vel += pitch_torque * dt / p.Iyy
+            yaw_vel += yaw_torque * dt / p.Izz
+            roll += roll_vel * dt
+            pitch += pitch_vel * dt
+            yaw += yaw_vel * dt
+
+            R = app.rotation_matrix(roll, pitch, yaw)
+            acc = (np.matmul(R, np.array([0, 0, thrust])) - np.array([0, 0, p.m * p.g])) / p.m
+            x_vel += acc[0] * dt
+            y_vel += acc[1] * dt
+            z_vel += acc[2] * dt
+            x_pos += x_vel * dt
+            y_pos += y_vel * dt
+            z_pos += z_vel * dt
+            poses.append((x_pos, y_pos, z_pos, roll, pitch, yaw))
+            t += dt
+    return np.array(poses)
+
+
+def test_simulate_matches_original_quad_sim(plan):
+    expected = quad_sim_poses(plan.coeffs[:, 0], plan.coeffs[:, 1], plan.coeffs[:, 2], plan.durations)
+    telemetry = simulate(plan.coeffs, plan.durations, start=(2, 2, 2))
+    poses = np.concatenate([telemetry.pos, telemetry.att], axis=1)
+    np.testing.assert_allclose(poses, expected, rtol=0, atol=1e-12)
+
+
+def test_telemetry_rows_share_one_time(plan):
+    telemetry = simulate(plan.coeffs, plan.durations)
+    ends = np.cumsum(plan.durations)
+    assert telemetry.ref_t[0] == 0 and np.all(np.diff(telemetry.ref_t) > 0)
+    np.testing.assert_allclose(telemetry.pos[0], plan.waypoints[0])
+    for row in range(0, len(telemetry.t) - 1, 7):
+        segment = int(np.searchsorted(ends, telemetry.ref_t[row], side='right'))
+        local = telemetry.ref_t[row] - (ends[segment] - plan.durations[segment])
+        np.testing.assert_allclose(telemetry.des_pos[row], evaluate(plan.coeffs[segment], [local]).position[0, 0], atol=1e-9)
+    # the final row is held at the end of the trajectory
+    assert telemetry.ref_t[-1] == pytest.approx(ends[-1])
+    np.testing.assert_allclose(telemetry.des_pos[-1], plan.waypoints[-1], atol=1e-9)
+    # every row's thrust is computed from that row's state and reference
+    p = DEFAULT_PARAMS
+    thrust = p.m * (p.g + telemetry.des_acc[:, 2] + p.Kp_z * (telemetry.des_pos[:, 2] - telemetry.pos[:, 2])
+                    + p.Kd_z * (telemetry.des_vel[:, 2] - telemetry.vel[:, 2]))
+    np.testing.assert_allclose(telemetry.thrust, thrust, atol=1e-9)
+
+
+def test_telemetry_time_is_the_physical_time(plan):
+    dt = 0.2
+    telemetry = simulate(plan.coeffs, plan.durations, dt=dt)
+    np.testing.assert_allclose(np.diff(telemetry.t), dt)
+    assert telemetry.t[-1] == pytest.approx((len(telemetry.t) - 1) * dt)
+    # every segment is flown in whole steps, so the reference clock falls behind
+    assert np.all(telemetry.ref_t <= telemetry.t + 1e-9)
+
+
+def test_ensemble_matches_single_vehicles(plan, rng):
+    starts = plan.waypoints[0] + rng.normal(0, 0.1, (4, 3))
+    masses, gains = rng.uniform(0.15, 0.25, 4), rng.uniform(10, 40, 4)
+    ensemble = simulate_ensemble(plan.coeffs, plan.durations, starts, params=DEFAULT_PARAMS._replace(m=masses, Kp_roll=gains))
+    for vehicle in range(4):
+        single = simulate(plan.coeffs, plan.durations, start=starts[vehicle],
+                          params=DEFAULT_PARAMS._replace(m=masses[vehicle], Kp_roll=gains[vehicle]))
+        for field in Telemetry._fields:
+            np.testing.assert_allclose(getattr(ensemble, field)[:, vehicle], getattr(single, field), rtol=1e-9, atol=1e-9)
@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+from simulation import DEFAULT_PARAMS, TELEMETRY_WIDTH, simulate, telemetry_views
+from sweep import GAINS, SCORES, grid, random_sample, run_case, score, sweep
+from trajectory_planning import plan_trajectory
+
+
+def flight(errors, dt=0.5):
+    """Telemetry with the given distance to the reference on every row"""
+    telemetry = telemetry_views(np.zeros((len(errors), TELEMETRY_WIDTH)))
+    telemetry.t[:] = np.arange(len(errors)) * dt
+    telemetry.pos[:, 0] = errors
+    return telemetry
+
+
+def test_grid_and_random_sample():
+    assert grid(Kp_z=[1, 2], Kd_z=[3]) == [{'Kp_z': 1, 'Kd_z': 3}, {'Kp_z': 2, 'Kd_z': 3}]
+    assert len(grid(Kp_z=[1, 2], Kd_z=[3, 4, 5])) == 6
+    cases = random_sample({'Kp_roll': (10, 40), 'dt': (0.05, 0.1)}, 50, seed=1)
+    assert len(cases) == 50 and cases == random_sample({'Kp_roll': (10, 40), 'dt': (0.05, 0.1)}, 50, seed=1)
+    assert all(10 <= case['Kp_roll'] <= 40 and 0.05 <= case['dt'] <= 0.1 for case in cases)
+
+
+@pytest.mark.parametrize('errors, settling_time', [
+    ([0.5, 0.3, 0.05, 0.02, 0.01], 1.0),
+    # back outside the tolerance once before settling
+    ([0.5, 0.05, 0.3, 0.05, 0.01], 1.5),
+    ([0.05, 0.02, 0.01], 0.0),
+    ([0.05, 0.02, 0.3], np.inf),
+])
+def test_score_settling_time(errors, settling_time):
+    result = score(flight(errors))
+    assert result['settling_time'] == settling_time
+    assert result['max_error'] == max(errors) and result['final_error'] == errors[-1]
+    assert result['rms_error'] == pytest.approx(np.sqrt(np.mean(np.square(errors))))
+
+
+@pytest.mark.parametrize('errors', [[0.1, np.nan, 0.1], [0.1, np.inf], []])
+def test_score_of_diverged_flight(errors):
+    assert score(flight(errors)) == {name: np.inf for name in SCORES}
+
+
+def test_sweep_writes_columns(tmp_path):
+    plan = plan_trajectory([[0, 0, 0], [2, 0, 1], [2, 2, 1]], 2, 2)
+    cases = grid(Kp_z=[1, 3], dt=[0.1, 0.2])
+    path = str(tmp_path / 'sweep.npz')
+    columns = sweep(plan.coeffs, plan.durations, cases, path=path, workers=1)
+    assert list(columns) == list(GAINS) + list(SCORES)
+    with np.load(path) as stored:
+        assert sorted(stored.files) == sorted(columns)
+        for name in columns:
+            np.testing.assert_array_equal(stored[name], columns[name])
+    np.testing.assert_array_equal(columns['Kp_z'], [1, 1, 3, 3])
+    np.testing.assert_array_equal(columns['dt'], [0.1, 0.2, 0.1, 0.2])
+    # gains missing from the cases keep their default
+    assert (columns['Kd_z'] == DEFAULT_PARAMS.Kd_z).all()
+    expected = score(simulate(plan.coeffs, plan.durations, dt=0.2, params=DEFAULT_PARAMS._replace(Kp_z=3)))
+    for name in SCORES:
+        assert columns[name][3] == expected[name]
+    assert run_case(plan.coeffs, plan.durations, None, cases[3]) == expected
+
+
+def test_sweep_rejects_unknown_gains():
+    plan = plan_trajectory([[0, 0, 0], [2, 0, 1]], 2, 2)
+    with pytest.raises(ValueError, match='Kp_x'):
+        sweep(plan.coeffs, plan.durations, grid(Kp_x=[1]), workers=1)
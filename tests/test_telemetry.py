@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+import pytest
+
+from simulation import TELEMETRY_WIDTH, Telemetry, simulate
+from telemetry import HEADER_SIZE, RECORD_SIZE, TelemetryFileError, TelemetryRecorder, read_header, read_telemetry
+from trajectory_planning import plan_trajectory
+
+
+@pytest.mark.parametrize('chunk', [1, 7, 4096])
+def test_recorder_round_trip(tmp_path, chunk):
+    plan = plan_trajectory([[0, 0, 0], [4, 0, 2], [4, 4, 2]], 2, 2)
+    path = str(tmp_path / 'flight.tel')
+    with TelemetryRecorder(path, chunk) as recorder:
+        telemetry = simulate(plan.coeffs, plan.durations, dt=0.05, recorder=recorder)
+    rows = len(telemetry.t)
+    assert os.path.getsize(path) == HEADER_SIZE + rows * RECORD_SIZE
+    stored = read_telemetry(path)
+    for field in Telemetry._fields:
+        assert np.array_equal(getattr(stored, field), getattr(telemetry, field))
+    assert isinstance(stored.pos.base, np.memmap)
+
+
+def test_readers_see_published_chunks(tmp_path):
+    path = str(tmp_path / 'live.tel')
+    records = np.arange(10 * TELEMETRY_WIDTH, dtype=np.float64).reshape(10, TELEMETRY_WIDTH)
+    with TelemetryRecorder(path, chunk=4) as recorder:
+        recorder.append(records[:6])
+        # the first chunk is full, the second only half
+        assert read_header(path) == 4
+        assert np.array_equal(read_telemetry(path).t, records[:4, 0])
+        recorder.flush()
+        assert read_header(path) == 6
+        recorder.append(records[6:])
+    assert read_header(path) == 10
+    with pytest.raises(TelemetryFileError):
+        recorder.append(records)
+
+
+def test_empty_and_foreign_files(tmp_path):
+    path = str(tmp_path / 'empty.tel')
+    TelemetryRecorder(path).close()
+    assert len(read_telemetry(path).t) == 0
+    foreign = tmp_path / 'foreign.tel'
+    foreign.write_bytes(b'x' * 100)
+    with pytest.raises(TelemetryFileError):
+        read_telemetry(str(foreign))
+    foreign.write_bytes(b'x')
+    with pytest.raises(TelemetryFileError):
+        read_header(str(foreign))
+
+
+def test_vehicle_axis_is_rejected(tmp_path):
+    path = str(tmp_path / 'fleet.tel')
+    plan = plan_trajectory([[0, 0, 0], [4, 0, 2]], 2, 2)
+    with TelemetryRecorder(path) as recorder:
+        with pytest.raises(ValueError):
+            recorder.append(np.zeros((5, 2, TELEMETRY_WIDTH)))
+        with pytest.raises(ValueError):
+            recorder.append(np.zeros((5, TELEMETRY_WIDTH + 1)))
+        with pytest.raises(ValueError):
+            simulate(plan.coeffs, plan.durations, start=np.zeros((2, 3)), method='rk4', recorder=recorder)
+        recorder.append(np.zeros(TELEMETRY_WIDTH))
+    assert read_header(path) == 1
@@ -0,0 +1,89 @@
+from math import factorial
+
+import numpy as np
+import pytest
+
+from TrajectoryGenerator import (TrajectoryGenerator, constraint_matrix, derivative, evaluate, minimum_jerk, polyval,
+                                 solve_segments)
+
+
+def test_batched_solve_matches_per_segment_solve(rng):
+    waypoints = rng.uniform(-5, 5, (30, 3))
+    velocities, accelerations = rng.normal(size=(30, 3)), rng.normal(size=(30, 3))
+    durations = rng.choice([2.0, 3.5, 5.0], 29)
+    coeffs = solve_segments(waypoints, durations, velocities, accelerations)
+    assert coeffs.shape == (29, 3, 6) and coeffs.flags.c_contiguous
+    for i in range(29):
+        generator = TrajectoryGenerator(waypoints[i], waypoints[i + 1], durations[i], velocities[i], velocities[i + 1],
+                                        accelerations[i], accelerations[i + 1])
+        generator.solve()
+        for axis, per_axis in enumerate((generator.x_c, generator.y_c, generator.z_c)):
+            b = [waypoints[i, axis], waypoints[i + 1, axis], velocities[i, axis], velocities[i + 1, axis],
+                 accelerations[i, axis], accelerations[i + 1, axis]]
+            expected = np.linalg.solve(constraint_matrix(durations[i]), b)
+            assert per_axis.shape == (6, 1)
+            np.testing.assert_allclose(per_axis[:, 0], expected, atol=1e-9)
+            np.testing.assert_allclose(coeffs[i, axis], expected, atol=1e-9)
+
+
+
+def dense_minimum_jerk(waypoints, durations):
+    """The equations of minimum_jerk written out one by one and solved densely"""
+    n = len(waypoints) - 1
+
+    def row(t, k):
+        # k-th derivative of t^p for the powers 5 down to 0
+        return [factorial(p) // factorial(p - k) * t ** (p - k) if p >= k else 0 for p in range(5, -1, -1)]
+
+    A, b = np.zeros((6 * n, 6 * n)), np.zeros((6 * n, 3))
+    equations = []
+    for i in range(n):
+        equations.append(({i: row(0, 0)}, waypoints[i]))
+        equations.append(({i: row(durations[i], 0)}, waypoints[i + 1]))
+    for i in range(n - 1):
+        for k in range(1, 5):
+            equations.append(({i: row(durations[i], k), i + 1: [-value for value in row(0, k)]}, 0))
+    for k in (1, 2):
+        equations.append(({0: row(0, k)}, 0))
+        equations.append(({n - 1: row(durations[-1], k)}, 0))
+    for e, (terms, value) in enumerate(equations):
+        for segment, coefficients in terms.items():
+            A[e, 6 * segment:6 * segment + 6] = coefficients
+        b[e] = value
+    return np.linalg.solve(A, b).reshape(n, 6, 3).transpose(0, 2, 1)
+
+
+@pytest.mark.parametrize('segments', [1, 2, 5, 12])
+def test_sparse_minimum_jerk_matches_dense(rng, segments):
+    waypoints = rng.uniform(-5, 5, (segments + 1, 3))
+    durations = rng.uniform(1, 4, segments)
+    coeffs = minimum_jerk(waypoints, durations)
+    assert coeffs.shape == (segments, 3, 6) and coeffs.flags.c_contiguous
+    np.testing.assert_allclose(coeffs, dense_minimum_jerk(waypoints, durations), atol=1e-8)
+
+    # through the waypoints, continuous up to the fourth derivative in between
+    np.testing.assert_allclose(polyval(coeffs, np.zeros((segments, 1))), waypoints[:-1], atol=1e-9)
+    np.testing.assert_allclose(polyval(coeffs, durations[:, None]), waypoints[1:], atol=1e-9)
+    current = coeffs
+    for _ in range(4):
+        current = derivative(current)
+        np.testing.assert_allclose(polyval(current[:-1], durations[:-1, None]),
+                                   polyval(current[1:], np.zeros((segments - 1, 1))), atol=1e-8)
+
+
+def test_single_minimum_jerk_segment_is_rest_to_rest(rng):
+    waypoints = rng.uniform(-5, 5, (2, 3))
+    np.testing.assert_allclose(minimum_jerk(waypoints, 3.0), solve_segments(waypoints, 3.0), atol=1e-12)
+
+
+def test_evaluate_matches_polyval_and_derivative(rng):
+    coeffs = solve_segments(rng.uniform(-5, 5, (5, 3)), rng.uniform(1, 4, 4))
+    t = np.linspace(0, 1, 7)
+    state = evaluate(coeffs, t)
+    current = coeffs
+    for field in state:
+        assert field.shape == (4, 7, 3)
+        np.testing.assert_allclose(field, polyval(current[:, None], t[None, :, None]))
+        current = derivative(current)
+    # a scalar polynomial, highest power first
+    assert polyval(np.array([1.0, 0, -2]), 3.0) == pytest.approx(7)
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from TrajectoryGenerator import derivative, evaluate
+from trajectory_planning import merge_collinear, peak_norms, plan_trajectory
+
+
+@pytest.mark.parametrize('waypoints, expected', [
+    ([[0, 0, 0], [1, 0, 0], [2, 0, 0], [2, 1, 0]], [[0, 0, 0], [2, 0, 0], [2, 1, 0]]),
+    # turning back on the same line keeps the turning point
+    ([[0, 0, 0], [2, 0, 0], [1, 0, 0]], [[0, 0, 0], [2, 0, 0], [1, 0, 0]]),
+    ([[0, 0, 0], [1, 1, 1], [2, 2, 2], [1, 1, 1]], [[0, 0, 0], [2, 2, 2], [1, 1, 1]]),
+    # repeated points are dropped before looking at directions
+    ([[0, 0, 0], [0, 0, 0], [1, 0, 0], [1, 0, 0], [2, 0, 0]], [[0, 0, 0], [2, 0, 0]]),
+    ([[0, 0, 0], [1, 0, 0], [1, 0, 0], [1, 1, 0]], [[0, 0, 0], [1, 0, 0], [1, 1, 0]]),
+    ([[3, 3, 3], [3, 3, 3]], [[3, 3, 3]]),
+    ([[1, 2, 3]], [[1, 2, 3]]),
+])
+def test_merge_collinear(waypoints, expected):
+    np.testing.assert_array_equal(merge_collinear(waypoints), expected)
+
+
+def test_peak_norms_match_dense_sampling(rng):
+    coeffs = rng.normal(size=(20, 3, 6))
+    durations = rng.uniform(0.1, 5, 20)
+    times = durations[:, None] * np.linspace(0, 1, 100001)
+    derivatives = [coeffs, derivative(coeffs), derivative(derivative(coeffs))]
+    for values, polynomials in zip(evaluate(coeffs, times)[:3], derivatives):
+        sampled = np.linalg.norm(values, axis=-1).max(axis=1)
+        exact = peak_norms(polynomials, durations)
+        assert (exact >= sampled * (1 - 1e-9)).all()
+        np.testing.assert_allclose(exact, sampled, rtol=1e-6)
+
+
+@pytest.mark.parametrize('stop_at_waypoints', [False, True])
+def test_plans_respect_the_limits(stop_at_waypoints):
+    rng = np.random.default_rng(5)
+    v_max, a_max = 2.0, 3.0
+    for _ in range(50):
+        waypoints = np.cumsum(rng.uniform(-3, 3, (int(rng.integers(2, 9)), 3)), axis=0)
+        plan = plan_trajectory(waypoints, v_max, a_max, stop_at_waypoints=stop_at_waypoints)
+        state = evaluate(plan.coeffs, plan.durations[:, None] * np.linspace(0, 1, 20001))
+        speed = np.linalg.norm(state.velocity, axis=-1).max()
+        acceleration = np.linalg.norm(state.acceleration, axis=-1).max()
+        assert speed <= v_max * (1 + 1e-9) and acceleration <= a_max * (1 + 1e-9)
+        # and one of them is reached, the trajectory is no slower than it has to be
+        assert max(speed / v_max, acceleration / a_max) > 1 - 1e-3
+
+
+def test_plan_of_a_single_point():
+    plan = plan_trajectory([[1, 2, 3], [1, 2, 3]], 2, 2)
+    assert plan.coeffs.shape == (0, 3, 6) and len(plan.durations) == 0
+    np.testing.assert_array_equal(plan.waypoints, [[1, 2, 3]])